@@ -5,33 +5,91 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
+import threading
+from typing import Dict, Optional
+
 from flask import Flask
+import compression
+import database
+import instrumentation
 from database import init_database, add_sample_data
-from routes import register_blueprints
+from routes import register_blueprints, fragment_cache
+from services import fee_sweeper, payment_outbox
 
 
-def create_app():
+def create_app(config: Optional[Dict] = None):
     """
     Application factory function to create and configure Flask app.
+
+    Args:
+        config: settings to override, e.g. DB_POOL_SIZE, DB_STORAGE_PROFILE ('wal' or 'default'),
+            BOOK_CACHE_SIZE, BOOK_CACHE_TTL, FRAGMENT_CACHE_SIZE, FRAGMENT_CACHE_TTL, SEED_SAMPLE_DATA
+            (default: the LIBRARY_SEED_SAMPLE_DATA environment variable is '1'), WARM_UP (warm up
+            in a background thread after startup), INSTRUMENTATION (default: the
+            LIBRARY_INSTRUMENTATION environment variable is '1'), FEE_SWEEPER (keep late fee
+            tiers current in a background thread; default: the LIBRARY_FEE_SWEEPER environment
+            variable is '1'), FEE_SWEEP_MAX_INTERVAL, PAYMENT_WORKERS (threads charging queued
+            late fee payments; default: the LIBRARY_PAYMENT_WORKERS environment variable, or 0)
     
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    app.config['SEED_SAMPLE_DATA'] = os.environ.get('LIBRARY_SEED_SAMPLE_DATA') == '1'
+    app.config['WARM_UP'] = False
+    app.config['INSTRUMENTATION'] = os.environ.get('LIBRARY_INSTRUMENTATION') == '1'
+    app.config['FEE_SWEEPER'] = os.environ.get('LIBRARY_FEE_SWEEPER') == '1'
+    app.config['PAYMENT_WORKERS'] = int(os.environ.get('LIBRARY_PAYMENT_WORKERS', '0'))
+    if config:
+        app.config.update(config)
+
+    # Time requests and SQL statements, when INSTRUMENTATION is set
+    instrumentation.init_app(app)
+
+    # Share one pooled database connection per request
+    database.init_app(app)
     
-    # Initialize the database
+    # Initialize the database (a single version check when the schema is current)
     init_database()
     
     # Add sample data for testing and demonstration
-    add_sample_data()
+    if app.config['SEED_SAMPLE_DATA']:
+        add_sample_data()
     
     # Register all route blueprints
     register_blueprints(app)
+    fragment_cache.init_app(app)
+
+    # Compress text and JSON responses for clients that accept gzip/brotli
+    compression.init_app(app)
+
+    # Move open loans into their next late fee tier as they cross it, when FEE_SWEEPER is set
+    fee_sweeper.init_app(app)
+
+    # Charge queued late fee payments in the background, when PAYMENT_WORKERS is set
+    payment_outbox.init_app(app)
+
+    if app.config['WARM_UP']:
+        threading.Thread(target=warm_up, args=(app,), name='app-warm-up', daemon=True).start()
     
     return app
 
 
+def warm_up(app: Flask):
+    """
+    Compile every template and open a pooled database connection ahead of the first request.
+
+    Nothing here is needed to serve requests (templates compile and connections open on first
+    use), so create_app leaves it out of startup; pass WARM_UP=True to run it in the background.
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    with database.db_connection():
+        pass
+
+
 if __name__ == '__main__':
-    app = create_app()
+    app = create_app({'SEED_SAMPLE_DATA': True, 'PAYMENT_WORKERS': 2})
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,5 @@
+"""
+Benchmarks Package - Performance measurements for the Library Management System
+
+Each module can be run on its own, e.g. ``python -m benchmarks.bench_connections``.
+"""
@@ -0,0 +1,70 @@
+"""
+Benchmark: SQLite connections opened per borrow/return request.
+
+Sends borrow and return requests through the Flask app, where init_app checks out one pooled
+connection per request, and counts the connections opened next to the database helper calls
+made. Before pooling every helper call opened (and closed) its own connection, so the helper
+calls per request are what the old code would have opened. That design can't be rerun for a
+timed comparison any more: borrow and return now run in one BEGIN IMMEDIATE transaction, which a
+second connection per helper would deadlock against.
+"""
+
+import time
+
+import database
+from app import create_app
+from benchmarks.common import temporary_database
+
+NUM_PATRONS = 200
+
+
+def _seed_book() -> int:
+    database.insert_book("Benchmark Book", "Benchmark Author", "9999999999999", NUM_PATRONS, NUM_PATRONS)
+    return database.get_book_by_isbn("9999999999999")['id']
+
+
+def run() -> dict:
+    with temporary_database():
+        book_id = _seed_book()
+        app = create_app()
+        client = app.test_client()
+        pool = database.get_pool()
+        baseline, checkouts = pool.connects, pool.checkouts
+
+        # count every checkout, nested ones included: each is a helper call
+        helper_calls = 0
+        acquire = pool.acquire
+
+        def counting_acquire():
+            nonlocal helper_calls
+            helper_calls += 1
+            return acquire()
+
+        pool.acquire = counting_acquire
+        try:
+            start = time.perf_counter()
+            for i in range(NUM_PATRONS):
+                patron_id = f"{100000 + i}"
+                client.post('/borrow', data={'patron_id': patron_id, 'book_id': book_id})
+                client.post('/return', data={'patron_id': patron_id, 'book_id': book_id})
+            elapsed = time.perf_counter() - start
+        finally:
+            del pool.acquire
+
+        return {'connects': pool.connects - baseline, 'checkouts': pool.checkouts - checkouts,
+                'helper_calls': helper_calls,
+                'requests': 2 * NUM_PATRONS, 'elapsed': elapsed}
+
+
+def main():
+    result = run()
+    requests = result['requests']
+    print(f"helper calls/request={result['helper_calls'] / requests:.2f} "
+          f"(a connection each before pooling)")
+    print(f"pooled checkouts/request={result['checkouts'] / requests:.2f} "
+          f"connects/request={result['connects'] / requests:.2f} "
+          f"connects={result['connects']} elapsed={result['elapsed']:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: get_patron_status_report for patrons with long histories.
+
+"before" rebuilds the report the way it used to be built (open loans, one late fee
+calculation per open loan, then a separate history query); "after" is the current single
+query implementation.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import database
+from benchmarks.common import temporary_database
+from services.library_service import calculate_late_fee_for_book, get_patron_status_report
+
+PATRON_ID = "424242"
+HISTORY_SIZES = (100, 1000, 10000)
+OPEN_LOANS = 5
+REPEAT = 20
+
+
+def _seed(history_size: int):
+    with database.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(f"Book {i}", "Author", f"{5000000000000 + i}", 1, 1) for i in range(OPEN_LOANS)])
+        book_ids = [row['id'] for row in conn.execute('SELECT id FROM books ORDER BY id')]
+
+        start = datetime.now() - timedelta(days=history_size + 60)
+        returned = []
+        for i in range(history_size):
+            borrow_date = start + timedelta(days=i)
+            returned.append((PATRON_ID, book_ids[i % OPEN_LOANS], database.to_timestamp(borrow_date),
+                             database.to_timestamp(borrow_date + timedelta(days=14)),
+                             database.to_timestamp(borrow_date + timedelta(days=7))))
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', returned)
+
+        for i, book_id in enumerate(book_ids):
+            due_date = datetime.now() - timedelta(days=3 * i)
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (PATRON_ID, book_id, database.to_timestamp(due_date - timedelta(days=14)),
+                  database.to_timestamp(due_date)))
+
+
+def legacy_status_report(patron_id: str) -> dict:
+    outstanding_books = database.get_patron_borrowed_books(patron_id)
+    late_fee = 0.0
+    for outstanding_book in outstanding_books:
+        late_fee += calculate_late_fee_for_book(patron_id, outstanding_book['book_id'])['fee_amount']
+    records = database.get_borrow_records_by_patron(patron_id)
+    return {'outstanding_books': outstanding_books, 'num_outstanding': len(outstanding_books),
+            'late_fee': late_fee, 'records': records}
+
+
+def _measure(report) -> tuple:
+    pool = database.get_pool()
+    checkouts = pool.checkouts
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        report(PATRON_ID)
+    elapsed = (time.perf_counter() - start) / REPEAT
+    return elapsed, (pool.checkouts - checkouts) / REPEAT
+
+
+def main():
+    for history_size in HISTORY_SIZES:
+        with temporary_database():
+            _seed(history_size)
+            assert legacy_status_report(PATRON_ID) == get_patron_status_report(PATRON_ID)
+
+            for label, report in (('before', legacy_status_report), ('after', get_patron_status_report)):
+                elapsed, queries = _measure(report)
+                print(f"history={history_size:6d} open={OPEN_LOANS} {label:6s} "
+                      f"{elapsed * 1000:8.2f} ms/report  {queries:4.1f} checkouts/report")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark: throughput of 1,000 concurrent late fee payments.
+
+The gateway's network latency is simulated (see PaymentGateway.PROCESS_DELAY), so this
+compares how each client waits on it: the blocking client from a pool of worker threads,
+as a multi-threaded Flask worker would, versus the asyncio client with all payments in
+flight at once.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.payment_service import AsyncPaymentGateway, PaymentGateway
+
+NUM_PAYMENTS = 1000
+WORKER_THREADS = 8
+LATENCY = 0.05  # seconds per simulated call, scaled down from 0.5 to keep the run short
+
+
+def _payments():
+    return [{'patron_id': f"{100000 + i}", 'amount': 5.0, 'description': "Late fees"} for i in range(NUM_PAYMENTS)]
+
+
+def run_blocking() -> float:
+    gateway = PaymentGateway()
+    gateway.PROCESS_DELAY = LATENCY
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS) as executor:
+        results = list(executor.map(lambda payment: gateway.process_payment(**payment), _payments()))
+    elapsed = time.perf_counter() - start
+
+    assert all(success for success, _, _ in results)
+    return elapsed
+
+
+def run_async(max_concurrency: int) -> float:
+    gateway = AsyncPaymentGateway(max_concurrency=max_concurrency)
+    gateway.PROCESS_DELAY = LATENCY
+
+    start = time.perf_counter()
+    results = asyncio.run(gateway.process_payments(_payments()))
+    elapsed = time.perf_counter() - start
+
+    assert all(success for success, _, _ in results)
+    return elapsed
+
+
+def main():
+    print(f"{NUM_PAYMENTS} payments, {LATENCY * 1000:.0f} ms simulated latency each")
+    for label, elapsed in ((f"blocking, {WORKER_THREADS} threads", run_blocking()),
+                           ("asyncio, 100 in flight", run_async(100)),
+                           ("asyncio, 1000 in flight", run_async(1000))):
+        print(f"{label:26s} {elapsed:7.2f}s  {NUM_PAYMENTS / elapsed:8.1f} payments/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: /catalog response time against the number of rows on the page.
+
+"uncached" renders every row on every request (fragment cache disabled). "one row changed"
+updates one book's availability before each request, so the page fragment misses but all the
+other rows come from the row cache. "unchanged" serves the whole page fragment from the cache.
+"""
+
+import time
+
+import database
+from app import create_app
+from benchmarks.common import temporary_database
+from routes.fragment_cache import FRAGMENT_CACHE_SIZE
+
+PAGE_SIZES = (10, 50, 100, 200)
+REQUESTS = 200
+
+
+def _seed(count: int):
+    with database.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(f"Title {i:05d}", f"Author {i % 100}", f"{6000000000000 + i}", 5, 5) for i in range(count)])
+
+
+def _get_catalog(client, page_size: int):
+    """GET /catalog and read the body: the page streams, so it is only rendered as it is read."""
+    response = client.get(f"/catalog?page_size={page_size}")
+    response.get_data()
+    response.close()
+    return response
+
+
+def _time_requests(client, page_size: int, before_request=None) -> float:
+    """Average milliseconds per GET /catalog."""
+    elapsed = 0.0
+    for i in range(REQUESTS):
+        if before_request:
+            before_request(i)
+        start = time.perf_counter()
+        response = _get_catalog(client, page_size)
+        elapsed += time.perf_counter() - start
+        assert response.status_code == 200
+    return elapsed / REQUESTS * 1000
+
+
+def run(page_size: int) -> dict:
+    with temporary_database():
+        _seed(max(PAGE_SIZES))
+        first_id = database.get_all_books()[0]['id']
+
+        def change_one_row(i):
+            database.update_book_availability(first_id, 1 if i % 2 == 0 else -1)
+
+        results = {}
+        for label, cache_size, before_request in (
+            ('uncached', 0, None),
+            ('one row changed', FRAGMENT_CACHE_SIZE, change_one_row),
+            ('unchanged', FRAGMENT_CACHE_SIZE, None),
+        ):
+            client = create_app({'FRAGMENT_CACHE_SIZE': cache_size}).test_client()
+            _get_catalog(client, page_size)  # compile templates, fill the cache
+            results[label] = _time_requests(client, page_size, before_request)
+        return results
+
+
+def main():
+    for page_size in PAGE_SIZES:
+        results = run(page_size)
+        print(f"rows={page_size:4d} " + " ".join(f"{label}={ms:6.2f}ms" for label, ms in results.items()))
+
+
+if __name__ == '__main__':
+    main()
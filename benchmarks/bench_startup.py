@@ -0,0 +1,49 @@
+"""
+Benchmark: time spent starting a worker against an existing, up-to-date database.
+
+"before" reproduces the old startup database work: the migrations in a write transaction and
+the sample-data COUNT(*) on every start. "after" is what create_app now does: one schema-version
+read, with seeding left to the SEED_SAMPLE_DATA dev flag. Full create_app time is reported too;
+most of it is Flask building the URL map when the blueprints are registered.
+"""
+
+import time
+
+import database
+from app import create_app
+from benchmarks.common import temporary_database
+
+NUM_STARTS = 200
+
+
+def _time_starts(start) -> float:
+    """Average seconds per call of start(), each beginning with an empty connection pool."""
+    elapsed = 0.0
+    for _ in range(NUM_STARTS):
+        # a new worker process starts with no pooled connections
+        database.get_pool().close_all()
+        began = time.perf_counter()
+        start()
+        elapsed += time.perf_counter() - began
+    return elapsed / NUM_STARTS
+
+
+def _old_database_startup():
+    database.migrate_database()
+    database.add_sample_data()
+
+
+def main():
+    with temporary_database():
+        results = (
+            ('database work, before', _time_starts(_old_database_startup)),
+            ('database work, after', _time_starts(database.init_database)),
+            ('create_app, after', _time_starts(create_app)),
+        )
+
+    for label, per_start in results:
+        print(f"{label:24s} starts={NUM_STARTS} per start={per_start * 1000:.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
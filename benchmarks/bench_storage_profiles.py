@@ -0,0 +1,86 @@
+"""
+Benchmark: mixed read/write throughput for each storage profile.
+
+Reader threads page through the catalog and search it while writer threads borrow and
+return books. Each profile runs for the same wall time against a fresh database file.
+"""
+
+import threading
+import time
+
+import database
+from benchmarks.common import temporary_database
+from services.library_service import (
+    borrow_book_by_patron, get_catalog_page, return_book_by_patron, search_books_in_catalog
+)
+
+NUM_BOOKS = 2000
+READERS = 4
+WRITERS = 2
+DURATION = 3.0  # seconds per profile
+
+
+def _seed():
+    with database.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(f"Title {i:05d}", f"Author {i % 100}", f"{6000000000000 + i}", 5, 5) for i in range(NUM_BOOKS)])
+
+
+def _run(stop: threading.Event, counts: dict, key: str, operation):
+    while not stop.is_set():
+        try:
+            operation()
+            counts[key] += 1
+        except Exception:
+            counts['errors'] += 1
+
+
+def run_profile(profile: str) -> dict:
+    with temporary_database():
+        database.configure_pool(storage_profile=profile)
+        _seed()
+
+        stop = threading.Event()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+
+        def reader():
+            page = get_catalog_page("", 50)
+            get_catalog_page(page['next_cursor'], 50)
+            search_books_in_catalog("Title 01", "title")
+
+        def writer_for(index: int):
+            patron_id = f"{300000 + index}"
+
+            def writer():
+                book_id = 1 + (counts['writes'] % NUM_BOOKS)
+                if borrow_book_by_patron(patron_id, book_id)[0]:
+                    return_book_by_patron(patron_id, book_id)
+
+            return writer
+
+        threads = [threading.Thread(target=_run, args=(stop, counts, 'reads', reader)) for _ in range(READERS)]
+        threads += [threading.Thread(target=_run, args=(stop, counts, 'writes', writer_for(i))) for i in range(WRITERS)]
+        for thread in threads:
+            thread.start()
+        time.sleep(DURATION)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    return counts
+
+
+def main():
+    try:
+        for profile in database.STORAGE_PROFILES:
+            counts = run_profile(profile)
+            print(f"{profile:8s} reads/s={counts['reads'] / DURATION:8.1f} "
+                  f"writes/s={counts['writes'] / DURATION:8.1f} errors={counts['errors']}")
+    finally:
+        database.configure_pool(storage_profile='default')
+
+
+if __name__ == '__main__':
+    main()
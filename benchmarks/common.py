@@ -0,0 +1,35 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import database
+
+
+@contextmanager
+def temporary_database():
+    """Point the database module at a fresh, empty SQLite file for the duration of a benchmark."""
+    original = database.DATABASE
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, "bench.db")
+        try:
+            database.init_database()
+            yield database.DATABASE
+        finally:
+            database.get_pool().close_all()
+            database.DATABASE = original
+
+
+@contextmanager
+def timer():
+    """Yield a dict whose 'elapsed' key holds the wall time of the with-block in seconds."""
+    result = {'elapsed': 0.0}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['elapsed'] = time.perf_counter() - start
@@ -0,0 +1,106 @@
+"""
+Synthetic catalogs and borrow histories for the benchmark suite.
+
+generate_dataset fills an empty (migrated) database with `num_books` books and `num_loans`
+borrow records, spread over one patron per LOANS_PER_PATRON records. About OPEN_LOAN_RATE of
+the records are still open, a third of those overdue, within the borrow limit and the copies
+of each book. Titles and authors are built from a fixed vocabulary of made-up words, so every
+word matches a predictable share of the catalog when searched. The same seed gives the same data.
+"""
+
+import itertools
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+import database
+
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+LOANS_PER_PATRON = 10
+OPEN_LOAN_RATE = 0.2
+MAX_OPEN_LOANS = 5
+LOAN_DAYS = 14
+INSERT_CHUNK = 10_000
+
+_SYLLABLES = ['bar', 'cel', 'dor', 'fen', 'gal', 'hov', 'jin', 'kes', 'lum', 'mir',
+              'nox', 'pel', 'quo', 'ras', 'sil', 'tav', 'umb', 'ver', 'wyn', 'zed']
+# 400 three-syllable words, no one a substring of another
+VOCABULARY = [a + b + c for a, b, c in itertools.product(_SYLLABLES[:10], _SYLLABLES[10:], _SYLLABLES[:4])]
+
+
+def patron_id(index: int) -> str:
+    """The 6-digit ID of the index-th generated patron."""
+    return f"{100000 + index}"
+
+
+def _chunks(rows: Iterator[Tuple], size: int) -> Iterator[List[Tuple]]:
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def generate_dataset(num_books: int, num_loans: int, seed: int = 327) -> Dict[str, int]:
+    """
+    Fill the current database with synthetic books and borrow records.
+
+    Returns:
+        Dict: counts of books, loans, open_loans and patrons generated
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    num_patrons = max(1, num_loans // LOANS_PER_PATRON)
+
+    total_copies = [rng.randint(1, 5) for _ in range(num_books)]
+    open_by_book = [0] * num_books
+    open_by_patron = [0] * num_patrons
+    open_loans = 0
+
+    def books() -> Iterator[Tuple]:
+        for i in range(num_books):
+            title = f"{rng.choice(VOCABULARY).title()} {rng.choice(VOCABULARY)} {i}"
+            author = f"{rng.choice(VOCABULARY).title()} {rng.choice(VOCABULARY).title()}"
+            yield title, author, f"{9780000000000 + i}", total_copies[i], total_copies[i]
+
+    def loans() -> Iterator[Tuple]:
+        nonlocal open_loans
+        for i in range(num_loans):
+            patron = i % num_patrons
+            book = rng.randrange(num_books)
+            if (rng.random() < OPEN_LOAN_RATE and open_by_patron[patron] < MAX_OPEN_LOANS
+                    and open_by_book[book] < total_copies[book]):
+                open_by_patron[patron] += 1
+                open_by_book[book] += 1
+                open_loans += 1
+                # up to 40 days ago, so about a third are past their due date
+                borrow_date = now - timedelta(days=rng.uniform(0, 40))
+                return_date = None
+            else:
+                borrow_date = now - timedelta(days=rng.uniform(LOAN_DAYS + 7, 730))
+                return_date = database.to_timestamp(borrow_date + timedelta(days=rng.uniform(1, LOAN_DAYS + 7)))
+            yield (patron_id(patron), book + 1, database.to_timestamp(borrow_date),
+                   database.to_timestamp(borrow_date + timedelta(days=LOAN_DAYS)), return_date)
+
+    with database.transaction() as conn:
+        for chunk in _chunks(books(), INSERT_CHUNK):
+            conn.executemany('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+            ''', chunk)
+        for chunk in _chunks(loans(), INSERT_CHUNK):
+            conn.executemany('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+                VALUES (?, ?, ?, ?, ?)
+            ''', chunk)
+        conn.executemany('''
+            UPDATE books SET available_copies = total_copies - ? WHERE id = ?
+        ''', ((count, book + 1) for book, count in enumerate(open_by_book) if count))
+    database.book_cache.clear()
+
+    return {'books': num_books, 'loans': num_loans, 'open_loans': open_loans, 'patrons': num_patrons}
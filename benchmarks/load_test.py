@@ -0,0 +1,107 @@
+"""
+Load test: requests/sec and latency percentiles for /catalog, /search and /borrow.
+
+Point it at a running server, e.g. one started with
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+and run
+
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --clients 32 --duration 10
+
+Each client thread keeps its own HTTP session and loops over the endpoint until the duration
+runs out. Borrow requests use a fresh patron ID each time so they exercise the write path
+(they succeed until copies run out, then take the "not available" path).
+"""
+
+import argparse
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List
+
+import requests
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of samples (which must be sorted)."""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(pct / 100.0 * len(samples))) - 1))
+    return samples[index]
+
+
+def _scenarios(base_url: str, book_id: int) -> Dict[str, Callable[[requests.Session], requests.Response]]:
+    patron_ids = itertools.count(100000)
+    lock = threading.Lock()
+
+    def next_patron() -> str:
+        with lock:
+            return f"{next(patron_ids) % 1000000:06d}"
+
+    return {
+        'catalog': lambda session: session.get(f"{base_url}/catalog"),
+        'search': lambda session: session.get(f"{base_url}/search", params={'q': 'the', 'type': 'title'}),
+        'borrow': lambda session: session.post(f"{base_url}/borrow",
+                                               data={'patron_id': next_patron(), 'book_id': book_id},
+                                               allow_redirects=False),
+    }
+
+
+def run_scenario(send: Callable[[requests.Session], requests.Response], clients: int, duration: float) -> dict:
+    """Drive one endpoint from `clients` threads for `duration` seconds and summarise the latencies."""
+    latencies: List[List[float]] = [[] for _ in range(clients)]
+    errors = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def client(index: int):
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = send(session)
+                    if response.status_code >= 500:
+                        errors[index] += 1
+                except requests.RequestException:
+                    errors[index] += 1
+                latencies[index].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    samples = sorted(itertools.chain.from_iterable(latencies))
+    return {
+        'requests': len(samples),
+        'errors': sum(errors),
+        'rps': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(samples, 50) * 1000,
+        'p99_ms': _percentile(samples, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='base URL of the running server')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client threads')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run each endpoint')
+    parser.add_argument('--book-id', type=int, default=1, help='book ID used by the borrow scenario')
+    parser.add_argument('--only', choices=('catalog', 'search', 'borrow'), action='append',
+                        help='run only the named endpoint (may be repeated)')
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    for name, send in _scenarios(base_url, args.book_id).items():
+        if args.only and name not in args.only:
+            continue
+        result = run_scenario(send, args.clients, args.duration)
+        print(f"{name:8s} requests={result['requests']:7d} errors={result['errors']:5d} "
+              f"req/s={result['rps']:8.1f} p50={result['p50_ms']:7.1f}ms p99={result['p99_ms']:7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
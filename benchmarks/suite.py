@@ -0,0 +1,153 @@
+"""
+Benchmark suite for the service and database layers, with a saved baseline to compare against.
+
+    python -m benchmarks.suite --scale 10k --save          # measure and record the baseline
+    python -m benchmarks.suite --scale 10k                 # measure and compare with it
+
+Each run generates a fresh database of the given scale (see benchmarks.datasets; 1m takes a
+few minutes to build), then times each operation over --iterations calls. The median latency
+of every operation is compared with the baseline for the same scale; the run exits with
+status 1 if any is more than --threshold slower. Baselines depend on the machine, so record
+one on the machine that runs the comparison.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import database
+from benchmarks.common import temporary_database
+from benchmarks.datasets import LOANS_PER_PATRON, SCALES, VOCABULARY, generate_dataset, patron_id
+from services.library_service import (
+    borrow_book_by_patron,
+    calculate_late_fee_for_book,
+    get_patron_status_report,
+    return_book_by_patron,
+    search_books_in_catalog,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+ITERATIONS = 200
+THRESHOLD = 0.25
+
+
+def _time_calls(calls: List[Callable[[], object]]) -> Dict[str, float]:
+    """Run each call once, returning latency statistics in milliseconds."""
+    samples = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'mean_ms': statistics.fmean(samples),
+    }
+
+
+def _call(function, *args) -> Callable[[], object]:
+    return lambda: function(*args)
+
+
+def run_suite(num_books: int, num_loans: int, iterations: int = ITERATIONS, seed: int = 327) -> Dict[str, Dict]:
+    """Generate a dataset in a temporary database and time each operation against it."""
+    rng = random.Random(seed)
+    with temporary_database():
+        generate_dataset(num_books, num_loans, seed)
+        num_patrons = max(1, num_loans // LOANS_PER_PATRON)
+
+        with database.db_connection() as conn:
+            available = [row['id'] for row in conn.execute('''
+                SELECT id FROM books WHERE available_copies > 0 LIMIT ?
+            ''', (iterations,))]
+            open_loans = [(row['patron_id'], row['book_id']) for row in conn.execute('''
+                SELECT patron_id, book_id FROM borrow_records WHERE return_date IS NULL LIMIT ?
+            ''', (iterations,))]
+
+        # new patrons, so the borrow limit never gets in the way
+        borrows = [(f"{900000 + i}", available[i % len(available)]) for i in range(iterations)]
+        searches = [(rng.choice(VOCABULARY), rng.choice(('title', 'author'))) for _ in range(iterations)]
+        patrons = [patron_id(rng.randrange(num_patrons)) for _ in range(iterations)]
+
+        return {
+            'borrow_book_by_patron': _time_calls([_call(borrow_book_by_patron, *args) for args in borrows]),
+            'return_book_by_patron': _time_calls([_call(return_book_by_patron, *args) for args in borrows]),
+            'search_books_in_catalog': _time_calls([_call(search_books_in_catalog, *args) for args in searches]),
+            'get_patron_status_report': _time_calls([_call(get_patron_status_report, p) for p in patrons]),
+            'calculate_late_fee_for_book': _time_calls([_call(calculate_late_fee_for_book, *args)
+                                                        for args in open_loans]),
+        }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float = THRESHOLD) -> List[str]:
+    """Names of the operations whose median latency is more than `threshold` above the baseline."""
+    return [name for name, stats in results.items()
+            if name in baseline and stats['p50_ms'] > baseline[name]['p50_ms'] * (1 + threshold)]
+
+
+def load_baseline(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, scale: str, results: Dict[str, Dict]):
+    """Record results as the baseline for one scale, keeping the other scales' baselines."""
+    baseline = load_baseline(path)
+    baseline[scale] = {
+        'recorded': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the service and database layers.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k',
+                        help='number of books and of borrow records to generate')
+    parser.add_argument('--iterations', type=int, default=ITERATIONS, help='calls timed per operation')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='allowed slowdown of the median before it counts as a regression (0.25 = 25%%)')
+    parser.add_argument('--save', action='store_true', help='record this run as the baseline for the scale')
+    args = parser.parse_args(argv)
+
+    size = SCALES[args.scale]
+    results = run_suite(size, size, args.iterations)
+    baseline = load_baseline(args.baseline).get(args.scale, {}).get('results', {})
+    regressions = compare(results, baseline, args.threshold)
+
+    print(f"scale={args.scale} iterations={args.iterations}")
+    for name, stats in results.items():
+        line = f"  {name:28s} p50={stats['p50_ms']:8.3f}ms p95={stats['p95_ms']:8.3f}ms"
+        if name in baseline:
+            change = stats['p50_ms'] / baseline[name]['p50_ms'] - 1
+            line += f"  baseline p50={baseline[name]['p50_ms']:8.3f}ms ({change:+.0%})"
+            if name in regressions:
+                line += '  REGRESSION'
+        print(line)
+
+    if args.save:
+        save_baseline(args.baseline, args.scale, results)
+        print(f"baseline for {args.scale} saved to {args.baseline}")
+        return 0
+    if not baseline:
+        print(f"no baseline for {args.scale} in {args.baseline}; run with --save to record one")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
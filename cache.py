@@ -0,0 +1,94 @@
+"""
+Cache module for Library Management System
+In-process LRU cache with expiry, used in front of hot database lookups
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache whose entries expire after a time-to-live.
+
+    Writers call delete/clear to invalidate. Readers that fill the cache from the database
+    take a token() before querying and pass it to set(), which drops the value if anything
+    was invalidated in between, so a read that raced with a write can't cache stale data.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        """
+        Args:
+            max_size: maximum number of entries; 0 disables caching
+            ttl: seconds an entry stays valid
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_size: int, ttl: float):
+        """Change the size bound and time-to-live, dropping all entries."""
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            self._entries.clear()
+            self._generation += 1
+
+    def token(self) -> int:
+        """Get the current invalidation generation, to pass to set()."""
+        return self._generation
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Look up a key, returning (found, value)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key: Hashable, value: Any, token: int):
+        """Cache a value read from the database, unless something was invalidated since token()."""
+        with self._lock:
+            if token != self._generation or self.max_size <= 0:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys: Hashable):
+        """Invalidate the given keys."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """Invalidate every entry."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the hit/miss/eviction counters and current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+            }
@@ -0,0 +1,118 @@
+"""
+Compression module for Library Management System
+gzip (and brotli, when the brotli package is installed) encoding of responses
+"""
+
+import zlib
+from typing import Iterable, Iterator
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = frozenset({
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'application/json',
+    'application/javascript',
+    'application/x-ndjson',
+})
+COMPRESS_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
+
+
+class _Gzip:
+    """Incremental gzip encoder; flush() ends the output so far on a byte boundary."""
+
+    def __init__(self, level: int):
+        self._encoder = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._encoder.compress(data)
+
+    def flush(self) -> bytes:
+        return self._encoder.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._encoder.flush()
+
+
+class _Brotli:
+    """Incremental brotli encoder with the same interface as _Gzip."""
+
+    def __init__(self, quality: int):
+        self._encoder = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._encoder.process(data)
+
+    def flush(self) -> bytes:
+        return self._encoder.flush()
+
+    def finish(self) -> bytes:
+        return self._encoder.finish()
+
+
+def _compress_stream(chunks: Iterable[bytes], encoder) -> Iterator[bytes]:
+    """Encode a streamed body chunk by chunk, flushing each so the client isn't kept waiting."""
+    for chunk in chunks:
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+def init_app(app):
+    """
+    Compress responses whose client accepts it, with settings from the app config.
+
+    Settings (module defaults in brackets):
+        COMPRESS_ENABLED: [True]
+        COMPRESS_MIN_SIZE: smallest buffered body in bytes worth compressing [500]; streamed
+            bodies have no known size and are always compressed
+        COMPRESS_MIMETYPES: content types to compress [text and JSON types]
+        COMPRESS_LEVEL: gzip level [6]
+        COMPRESS_BROTLI_QUALITY: brotli quality [5]
+    """
+    from flask import request
+
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    min_size = app.config.get('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE)
+    mimetypes = frozenset(app.config.get('COMPRESS_MIMETYPES', COMPRESS_MIMETYPES))
+    level = app.config.get('COMPRESS_LEVEL', COMPRESS_LEVEL)
+    quality = app.config.get('COMPRESS_BROTLI_QUALITY', COMPRESS_BROTLI_QUALITY)
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in mimetypes):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        if brotli is not None and request.accept_encodings['br']:
+            encoding, encoder = 'br', _Brotli(quality)
+        elif request.accept_encodings['gzip']:
+            encoding, encoder = 'gzip', _Gzip(level)
+        else:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.iter_encoded(), encoder)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(encoder.compress(data) + encoder.finish())
+
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -4,29 +4,411 @@ Handles all database operations and connections
 """
 
 import sqlite3
+import json
 import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import instrumentation
+from cache import LRUCache
 
 # Database configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE = os.path.join(BASE_DIR, "library.db")
+DATABASE = os.environ.get("LIBRARY_DATABASE", os.path.join(BASE_DIR, "library.db"))
+
+# Connection pool configuration
+POOL_SIZE = 8  # maximum number of connections checked out at once
+POOL_TIMEOUT = 30.0  # seconds to wait for a free connection
+
+# Connection pragmas for each storage profile, selected with configure_pool / DB_STORAGE_PROFILE
+STORAGE_PROFILES = {
+    # SQLite's defaults: rollback journal, fsync on every commit, readers block behind writers.
+    # busy_timeout is not an SQLite default (that is 0, fail at once) but the 5 seconds
+    # sqlite3.connect applies, spelled out so every profile states how long it waits for locks.
+    'default': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,  # milliseconds
+    },
+    # Write-ahead log: readers don't block on writers, one fsync per checkpoint instead of per commit
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 10000,  # milliseconds to wait for a lock before "database is locked"
+        'cache_size': -20000,  # negative means KiB, so 20 MB of page cache per connection
+        'mmap_size': 268435456,  # map up to 256 MB of the file instead of read() calls
+        'temp_store': 'MEMORY',
+    },
+}
+STORAGE_PROFILE = 'default'
+
+# Book lookup cache configuration
+BOOK_CACHE_SIZE = 1024
+BOOK_CACHE_TTL = 60.0  # seconds
+
+# get_book_by_id / get_book_by_isbn cache. Keys are ('id', book_id) -> book dict and
+# ('isbn', isbn) -> book_id, so a change to a book only invalidates its id entry. Misses are not
+# cached: writes only invalidate in their own process, and a book another worker inserts must
+# be found at once (add_book_to_catalog checks the ISBN before inserting).
+book_cache = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
 
 
-def get_db_connection():
+def get_db_connection(storage_profile: Optional[str] = None):
     """Get a database connection."""
     global DATABASE
-    conn = sqlite3.connect(DATABASE)
+    conn = sqlite3.connect(DATABASE, check_same_thread=False, factory=instrumentation.connection_factory())
     conn.row_factory = sqlite3.Row  # This enables column access by name
+    for pragma, value in STORAGE_PROFILES[storage_profile or STORAGE_PROFILE].items():
+        conn.execute(f'PRAGMA {pragma} = {value}')
     return conn
 
 
-def init_database():
-    """Initialize the database with required tables."""
-    conn = get_db_connection()
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections with per-thread reuse.
+
+    A thread checks out one connection and keeps it for as long as it holds at least one
+    checkout, so nested helpers (and a whole Flask request, see init_app) share a single
+    handle. When the outermost checkout is released the connection goes back to the idle
+    list instead of being closed.
+    """
+
+    def __init__(self, database: str, max_size: int = POOL_SIZE, max_idle: Optional[int] = None,
+                 timeout: float = POOL_TIMEOUT, storage_profile: Optional[str] = None):
+        self.database = database
+        self.storage_profile = storage_profile or STORAGE_PROFILE
+        self.max_size = max_size
+        self.max_idle = max_size if max_idle is None else max_idle
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.connects = 0  # new sqlite3 connections opened
+        self.checkouts = 0  # outermost acquisitions, i.e. connections the old code would have opened
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out this thread's connection, opening or reusing one if needed."""
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            if not self._slots.acquire(timeout=self.timeout):
+                raise TimeoutError(f"No database connection available after {self.timeout} seconds.")
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                try:
+                    conn = get_db_connection(self.storage_profile)
+                except Exception:
+                    self._slots.release()
+                    raise
+                with self._lock:
+                    self.connects += 1
+            with self._lock:
+                self.checkouts += 1
+            self._local.conn = conn
+        self._local.depth = depth + 1
+        return self._local.conn
+
+    def release(self):
+        """Release one checkout; the outermost release returns the connection to the pool."""
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            return
+        self._local.depth = depth - 1
+        if depth > 1:
+            return
+
+        conn = self._local.conn
+        self._local.conn = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()  # never hand a half-finished transaction to the next thread
+            if self._idle.qsize() < self.max_idle:
+                self._idle.put(conn)
+            else:
+                conn.close()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager wrapping acquire/release."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release()
+
+    @contextmanager
+    @instrumentation.attribute_to_caller
+    def transaction(self, immediate: bool = True):
+        """
+        Run a with-block as a single transaction on this thread's connection.
+
+        The outermost block issues BEGIN IMMEDIATE (taking the write lock up front, so reads
+        inside the block cannot be invalidated by a concurrent writer) and commits once at the
+        end. Nested blocks join the outer transaction; an exception escaping any of them marks
+        the whole unit of work for rollback, even if an outer caller catches it.
+        """
+        conn = self.acquire()
+        depth = getattr(self._local, 'tx_depth', 0)
+        try:
+            if depth == 0:
+                conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+                self._local.rollback_only = False
+                self._local.on_finish = []
+            self._local.tx_depth = depth + 1
+            try:
+                yield conn
+            except BaseException:
+                self._local.rollback_only = True
+                raise
+            finally:
+                self._local.tx_depth = depth
+                if depth == 0:
+                    callbacks, self._local.on_finish = self._local.on_finish, []
+                    try:
+                        if self._local.rollback_only:
+                            conn.rollback()
+                        else:
+                            conn.commit()
+                    finally:
+                        for callback in callbacks:
+                            callback()
+        finally:
+            self.release()
+
+    def in_transaction(self) -> bool:
+        """Whether this thread is inside a transaction() block."""
+        return getattr(self._local, 'tx_depth', 0) > 0
+
+    def on_transaction_end(self, callback: Callable[[], None]):
+        """Run a callback once this thread's transaction commits or rolls back (now, if there is none)."""
+        if self.in_transaction():
+            self._local.on_finish.append(callback)
+        else:
+            callback()
+
+    def close_all(self):
+        """Close every idle connection (checked out connections are closed on release)."""
+        self.max_idle = 0
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Get the process-wide connection pool, rebuilding it if DATABASE has changed."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE:
+            if _pool is not None:
+                _pool.close_all()
+                book_cache.clear()  # cached rows belong to the old database
+            _pool = ConnectionPool(DATABASE)
+        return _pool
+
+
+def configure_pool(max_size: int = POOL_SIZE, max_idle: Optional[int] = None,
+                   timeout: float = POOL_TIMEOUT, storage_profile: Optional[str] = None) -> ConnectionPool:
+    """Replace the connection pool with one using the given limits and storage profile."""
+    global _pool, STORAGE_PROFILE
+    if storage_profile is not None:
+        if storage_profile not in STORAGE_PROFILES:
+            raise ValueError(f"Unknown storage profile: {storage_profile}")
+        STORAGE_PROFILE = storage_profile
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = ConnectionPool(DATABASE, max_size=max_size, max_idle=max_idle, timeout=timeout)
+        return _pool
+
+
+@contextmanager
+def db_connection():
+    """Borrow the current thread's pooled connection for the duration of a with-block."""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release()
+
+
+@contextmanager
+@instrumentation.attribute_to_caller
+def transaction(immediate: bool = True):
+    """Run a with-block as one atomic unit of work, see ConnectionPool.transaction."""
+    with get_pool().transaction(immediate) as conn:
+        yield conn
+
+
+def invalidate_books(*keys):
+    """
+    Drop book cache entries, e.g. ('id', 1) or ('isbn', '9780743273565'), after a write.
+
+    Invalidates now and again when the current transaction ends, so a concurrent reader
+    can't re-cache the old row while the write is still uncommitted.
+    """
+    book_cache.delete(*keys)
+    get_pool().on_transaction_end(lambda: book_cache.delete(*keys))
+
+
+def init_app(app):
+    """
+    Hook the connection pool into a Flask app so every request reuses one connection.
 
-    # Create books table
+    The connection is checked out before the request is handled and returned to the pool
+    when the app context is torn down.
+    """
+    from flask import g
+
+    configure_pool(max_size=app.config.get('DB_POOL_SIZE', POOL_SIZE),
+                   timeout=app.config.get('DB_POOL_TIMEOUT', POOL_TIMEOUT),
+                   storage_profile=app.config.get('DB_STORAGE_PROFILE', 'wal'))
+    book_cache.configure(max_size=app.config.get('BOOK_CACHE_SIZE', BOOK_CACHE_SIZE),
+                         ttl=app.config.get('BOOK_CACHE_TTL', BOOK_CACHE_TTL))
+
+    @app.before_request
+    def _checkout_db_connection():
+        get_pool().acquire()
+        g._db_checked_out = True
+
+    @app.teardown_appcontext
+    def _release_db_connection(exception=None):
+        if g.pop('_db_checked_out', False):
+            get_pool().release()
+
+
+# Search terms shorter than this can't use the trigram index and fall back to LIKE
+FTS_MIN_TERM_LENGTH = 3
+
+
+def _create_books_fts(conn):
+    """
+    Create the books_fts full-text index over books.title/author, kept in sync by triggers.
+
+    Uses the FTS5 trigram tokenizer, which indexes substrings, so MATCH gives the same results
+    as the LIKE '%term%' search it replaces. Skipped if this SQLite build lacks FTS5.
+    """
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                title, author, content='books', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return  # no FTS5 module, searches use LIKE
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
     conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+
+def _rebuild_patron_counters(conn):
+    """Recompute patrons and patron_open_books from borrow_records."""
+    conn.execute('DELETE FROM patrons')
+    conn.execute('DELETE FROM patron_open_books')
+    conn.execute('''
+        INSERT INTO patrons (patron_id, open_loans)
+        SELECT patron_id, COUNT(*) FROM borrow_records
+        WHERE return_date IS NULL
+        GROUP BY patron_id
+    ''')
+    conn.execute('''
+        INSERT INTO patron_open_books (patron_id, book_id, open_loans)
+        SELECT patron_id, book_id, COUNT(*) FROM borrow_records
+        WHERE return_date IS NULL
+        GROUP BY patron_id, book_id
+    ''')
+
+
+def _rebuild_table(conn, table: str, create_sql: str, select_sql: str):
+    """
+    Replace a table with a new definition, following SQLite's procedure for schema changes
+    ALTER TABLE can't make: copy the rows into a new table, drop the old one, rename the new
+    one, then recreate the old table's indexes and triggers (dropping the table dropped them).
+
+    Args:
+        create_sql: CREATE TABLE statement for the new definition, named {table}_new
+        select_sql: SELECT over the old table giving the new table's columns, in order
+    """
+    dependents = [row[0] for row in conn.execute('''
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    ''', (table,))]
+    conn.execute(create_sql)
+    conn.execute(f'INSERT INTO {table}_new {select_sql}')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    for sql in dependents:
+        conn.execute(sql)
+
+
+def _store_loan_dates_as_epoch_seconds(conn):
+    """
+    Convert borrow_records dates from ISO text in local time to INTEGER Unix seconds, so
+    comparisons and ranges are plain integer index lookups and rows need no parsing.
+    """
+    # strftime('%s', ..., 'utc') reads the text as local time, like datetime.timestamp();
+    # values that are already numbers (written by a newer worker mid-deploy) are kept
+    def to_epoch(column):
+        return f"CASE typeof({column}) WHEN 'text' THEN CAST(strftime('%s', {column}, 'utc') AS INTEGER) ELSE {column} END"
+
+    _rebuild_table(conn, 'borrow_records', '''
+        CREATE TABLE borrow_records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date INTEGER NOT NULL,
+            due_date INTEGER NOT NULL,
+            return_date INTEGER,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''', f'''
+        SELECT id, patron_id, book_id, {to_epoch('borrow_date')}, {to_epoch('due_date')}, {to_epoch('return_date')}
+        FROM borrow_records
+    ''')
+
+
+# Data sets whose version is bumped by triggers whenever their table changes
+DATA_VERSION_TABLES = {
+    'catalog': 'books',
+    'loans': 'borrow_records',
+}
+
+# Schema migrations, applied in order by init_database. Each entry is (version, steps), where a
+# step is either an SQL statement or a callable taking the connection. PRAGMA user_version
+# records the last version applied to the database file.
+MIGRATIONS = [
+    (1, [
+        # Create books table
+        '''
         CREATE TABLE IF NOT EXISTS books (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title TEXT NOT NULL,
@@ -35,10 +417,9 @@ def init_database():
             total_copies INTEGER NOT NULL,
             available_copies INTEGER NOT NULL
         )
-    ''')
-
-    # Create borrow_records table
-    conn.execute('''
+        ''',
+        # Create borrow_records table
+        '''
         CREATE TABLE IF NOT EXISTS borrow_records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             patron_id TEXT NOT NULL,
@@ -48,28 +429,359 @@ def init_database():
             return_date TEXT,
             FOREIGN KEY (book_id) REFERENCES books (id)
         )
-    ''')
+        ''',
+    ]),
+    (2, [
+        # Open loans: borrow limit count, duplicate-borrow check and fee lookups
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_loans
+        ON borrow_records (patron_id, book_id) WHERE return_date IS NULL
+        ''',
+        # Patron history, already in display order
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron
+        ON borrow_records (patron_id, borrow_date)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_book
+        ON borrow_records (book_id)
+        ''',
+        # Catalog ordering and search
+        '''
+        CREATE INDEX IF NOT EXISTS idx_books_title
+        ON books (title)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_books_author
+        ON books (author)
+        ''',
+    ]),
+    (3, [
+        _create_books_fts,
+    ]),
+    (4, [
+        # Open loans per patron, so the borrow limit check is a primary key lookup
+        '''
+        CREATE TABLE IF NOT EXISTS patrons (
+            patron_id TEXT PRIMARY KEY,
+            open_loans INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+        # Open loans per patron and book, so the duplicate borrow check is too
+        '''
+        CREATE TABLE IF NOT EXISTS patron_open_books (
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            open_loans INTEGER NOT NULL,
+            PRIMARY KEY (patron_id, book_id)
+        ) WITHOUT ROWID
+        ''',
+        # Triggers keep both in step with borrow_records, in the same transaction as the change
+        '''
+        CREATE TRIGGER IF NOT EXISTS patron_counters_open AFTER INSERT ON borrow_records
+        WHEN new.return_date IS NULL BEGIN
+            INSERT INTO patrons (patron_id, open_loans) VALUES (new.patron_id, 1)
+                ON CONFLICT (patron_id) DO UPDATE SET open_loans = open_loans + 1;
+            INSERT INTO patron_open_books (patron_id, book_id, open_loans) VALUES (new.patron_id, new.book_id, 1)
+                ON CONFLICT (patron_id, book_id) DO UPDATE SET open_loans = open_loans + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS patron_counters_return AFTER UPDATE OF return_date ON borrow_records
+        WHEN old.return_date IS NULL AND new.return_date IS NOT NULL BEGIN
+            UPDATE patrons SET open_loans = open_loans - 1 WHERE patron_id = old.patron_id;
+            UPDATE patron_open_books SET open_loans = open_loans - 1
+                WHERE patron_id = old.patron_id AND book_id = old.book_id;
+            DELETE FROM patron_open_books
+                WHERE patron_id = old.patron_id AND book_id = old.book_id AND open_loans <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS patron_counters_delete AFTER DELETE ON borrow_records
+        WHEN old.return_date IS NULL BEGIN
+            UPDATE patrons SET open_loans = open_loans - 1 WHERE patron_id = old.patron_id;
+            UPDATE patron_open_books SET open_loans = open_loans - 1
+                WHERE patron_id = old.patron_id AND book_id = old.book_id;
+            DELETE FROM patron_open_books
+                WHERE patron_id = old.patron_id AND book_id = old.book_id AND open_loans <= 0;
+        END
+        ''',
+        _rebuild_patron_counters,
+    ]),
+    (5, [
+        # Change counters for HTTP caching, one row per data set
+        '''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        # Versions start from the current time in milliseconds, so a rebuilt database doesn't
+        # hand out the same versions (and ETags) as the one it replaced
+        '''
+        INSERT OR IGNORE INTO data_versions (name, version, updated_at)
+        SELECT name, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER)
+        FROM (SELECT 'catalog' AS name UNION ALL SELECT 'loans')
+        ''',
+    ] + [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {name}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+            UPDATE data_versions SET version = version + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+                WHERE name = '{name}';
+        END
+        '''
+        for name, table in DATA_VERSION_TABLES.items()
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ]),
+    (6, [
+        _store_loan_dates_as_epoch_seconds,
+        # Open loans by due date, so finding overdue loans is a range scan
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_due
+        ON borrow_records (due_date) WHERE return_date IS NULL
+        ''',
+    ]),
+    (7, [
+        # Late fee state of each open loan: the fee is fee_base + fee_rate * (days overdue -
+        # tier_start + 1) until next_change, the start of the local day it enters its next fee
+        # tier (NULL once the fee is capped). New loans owe nothing until their first day overdue.
+        '''
+        CREATE TABLE IF NOT EXISTS loan_fees (
+            borrow_id INTEGER PRIMARY KEY REFERENCES borrow_records (id),
+            tier_start INTEGER NOT NULL,
+            fee_base REAL NOT NULL,
+            fee_rate REAL NOT NULL,
+            next_change INTEGER
+        )
+        ''',
+        # Loans in the order they change tier, so the sweeper finds the next one with one seek
+        '''
+        CREATE INDEX IF NOT EXISTS idx_loan_fees_next_change
+        ON loan_fees (next_change) WHERE next_change IS NOT NULL
+        ''',
+        '''
+        INSERT OR IGNORE INTO loan_fees (borrow_id, tier_start, fee_base, fee_rate, next_change)
+        SELECT id, 0, 0.0, 0.0,
+               CAST(strftime('%s', due_date, 'unixepoch', 'localtime', 'start of day', '+1 day', 'utc') AS INTEGER)
+        FROM borrow_records WHERE return_date IS NULL
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loan_fees_open AFTER INSERT ON borrow_records
+        WHEN new.return_date IS NULL BEGIN
+            INSERT OR REPLACE INTO loan_fees (borrow_id, tier_start, fee_base, fee_rate, next_change)
+            VALUES (new.id, 0, 0.0, 0.0,
+                    CAST(strftime('%s', new.due_date, 'unixepoch', 'localtime', 'start of day', '+1 day', 'utc') AS INTEGER));
+        END
+        ''',
+        # A changed due date leaves the stored tier stale until the next sweep
+        '''
+        CREATE TRIGGER IF NOT EXISTS loan_fees_due AFTER UPDATE OF due_date ON borrow_records BEGIN
+            UPDATE loan_fees SET next_change = 0 WHERE borrow_id = new.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loan_fees_return AFTER UPDATE OF return_date ON borrow_records
+        WHEN new.return_date IS NOT NULL BEGIN
+            DELETE FROM loan_fees WHERE borrow_id = new.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loan_fees_delete AFTER DELETE ON borrow_records BEGIN
+            DELETE FROM loan_fees WHERE borrow_id = old.id;
+        END
+        ''',
+    ]),
+    (8, [
+        # Late fee ledger: accruals and refunds add to what a patron owes, payments subtract.
+        # Rows are only ever inserted, so the table is also the audit trail of fee payments.
+        '''
+        CREATE TABLE IF NOT EXISTS fee_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT,
+            book_id INTEGER,
+            borrow_id INTEGER,
+            kind TEXT NOT NULL CHECK (kind IN ('accrual', 'payment', 'refund')),
+            amount REAL NOT NULL,
+            transaction_id TEXT,
+            created_at INTEGER NOT NULL
+        )
+        ''',
+        # A patron's balance is a sum over this index alone
+        '''
+        CREATE INDEX IF NOT EXISTS idx_fee_ledger_patron
+        ON fee_ledger (patron_id, amount)
+        ''',
+        # So is what has already accrued on a loan
+        '''
+        CREATE INDEX IF NOT EXISTS idx_fee_ledger_accruals
+        ON fee_ledger (borrow_id, amount) WHERE kind = 'accrual'
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_fee_ledger_transaction
+        ON fee_ledger (transaction_id) WHERE transaction_id IS NOT NULL
+        ''',
+    ]),
+    (9, [
+        # Late fee payments waiting for (or done by) the payment workers. A pending payment is
+        # due at next_attempt_at; claiming it pushes that out by a lease, so a payment whose
+        # worker died is picked up again once the lease runs out. book_fees is a JSON list of
+        # [book_id, amount] pairs for the fee ledger.
+        '''
+        CREATE TABLE IF NOT EXISTS payment_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT UNIQUE NOT NULL,
+            patron_id TEXT NOT NULL,
+            book_fees TEXT NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'succeeded', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            transaction_id TEXT,
+            last_error TEXT,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+        ''',
+        # Pending payments in the order they are due, so claiming the next one is a single seek
+        '''
+        CREATE INDEX IF NOT EXISTS idx_payment_outbox_due
+        ON payment_outbox (next_attempt_at) WHERE status = 'pending'
+        ''',
+    ]),
+    (10, [
+        # Payments and refunds name the loan they paid for, so what is still owed on a loan is
+        # its fee less what the ledger shows paid. Earlier payments get the patron's loan of the
+        # book that was open when they were made (the earliest, which is the one charged).
+        '''
+        UPDATE fee_ledger SET borrow_id = (
+            SELECT br.id FROM borrow_records br
+            WHERE br.patron_id = fee_ledger.patron_id AND br.book_id = fee_ledger.book_id
+              AND br.borrow_date <= fee_ledger.created_at
+              AND (br.return_date IS NULL OR br.return_date >= fee_ledger.created_at)
+            ORDER BY br.borrow_date, br.id
+            LIMIT 1
+        )
+        WHERE kind = 'payment' AND borrow_id IS NULL AND book_id IS NOT NULL
+        ''',
+        '''
+        UPDATE fee_ledger SET borrow_id = (
+            SELECT MIN(payment.borrow_id) FROM fee_ledger payment
+            WHERE payment.transaction_id = fee_ledger.transaction_id AND payment.kind = 'payment'
+        )
+        WHERE kind = 'refund' AND borrow_id IS NULL AND book_id IS NOT NULL
+        ''',
+        # What has been paid on a loan is a sum over this index alone
+        '''
+        CREATE INDEX IF NOT EXISTS idx_fee_ledger_payments
+        ON fee_ledger (borrow_id, amount) WHERE kind IN ('payment', 'refund')
+        ''',
+    ]),
+    (11, [
+        # A patron's outbox entries, to leave what they already charge out of a new payment
+        '''
+        CREATE INDEX IF NOT EXISTS idx_payment_outbox_patron
+        ON payment_outbox (patron_id, status)
+        ''',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version() -> int:
+    """Get the schema version recorded in the database file."""
+    with db_connection() as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate_database() -> int:
+    """
+    Apply any migrations newer than the database's schema version.
+
+    Runs in a single BEGIN IMMEDIATE transaction, so concurrent callers wait for each other and
+    a failed migration leaves the schema untouched.
 
-    conn.commit()
-    conn.close()
+    Returns:
+        int: the schema version after migrating
+    """
+    with transaction() as conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for migration_version, steps in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version = {migration_version}')
+            version = migration_version
+    return version
+
+
+def init_database():
+    """
+    Initialize the database with required tables.
+
+    Reads the schema version first and only takes the write lock to migrate when the file is
+    behind, so starting a worker against an up-to-date database runs no DDL.
+    """
+    if get_schema_version() < SCHEMA_VERSION:
+        migrate_database()
 
 
 def clear_database():
     """remove all entries from DB, for testing"""
-    conn = get_db_connection()
+    with db_connection() as conn:
+        # Delete books table
+        conn.execute('''
+                DROP TABLE IF EXISTS books
+            ''')
 
-    # Delete books table
-    conn.execute('''
-            DROP TABLE IF EXISTS books
-        ''')
+        # Delete borrow_records table
+        conn.execute('''
+                DROP TABLE IF EXISTS borrow_records
+            ''')
 
-    # Delete borrow_records table
-    conn.execute('''
-            DROP TABLE IF EXISTS borrow_records
-        ''')
+        # Delete the full-text index over books
+        conn.execute('''
+                DROP TABLE IF EXISTS books_fts
+            ''')
 
-    conn.commit()
-    conn.close()
+        # Delete the open loan counters
+        conn.execute('''
+                DROP TABLE IF EXISTS patrons
+            ''')
+        conn.execute('''
+                DROP TABLE IF EXISTS patron_open_books
+            ''')
+
+        # Delete the change counters
+        conn.execute('''
+                DROP TABLE IF EXISTS data_versions
+            ''')
+
+        # Delete the late fee state and ledger
+        conn.execute('''
+                DROP TABLE IF EXISTS loan_fees
+            ''')
+        conn.execute('''
+                DROP TABLE IF EXISTS fee_ledger
+            ''')
+
+        # Delete the payment outbox
+        conn.execute('''
+                DROP TABLE IF EXISTS payment_outbox
+            ''')
+
+        # Dropping the tables dropped their indexes, so every migration must run again
+        conn.execute('PRAGMA user_version = 0')
+
+        conn.commit()
+
+    book_cache.clear()
 
 
 def reset_database():
@@ -83,113 +795,202 @@ def reset_database():
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
-    conn = get_db_connection()
-    book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
-
-    if book_count == 0:
-        # Add sample books
-        sample_books = [
-            ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
-            ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
-            ('1984', 'George Orwell', '9780451524935', 1)
-        ]
-
-        for title, author, isbn, copies in sample_books:
-            conn.execute('''
-                INSERT INTO books (title, author, isbn, total_copies, available_copies)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
+    # one transaction, so workers starting together can't both see an empty catalog
+    with transaction() as conn:
+        book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
 
-        # Make 1984 unavailable by adding a borrow record
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', ('123456', 3,
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
+        if book_count == 0:
+            # Add sample books
+            sample_books = [
+                ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
+                ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
+                ('1984', 'George Orwell', '9780451524935', 1)
+            ]
 
-        # Update available copies for 1984
-        conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
+            for title, author, isbn, copies in sample_books:
+                conn.execute('''
+                    INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (title, author, isbn, copies, copies))
 
-        conn.commit()
+            # Make 1984 unavailable by adding a borrow record
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', ('123456', 3,
+                  to_timestamp(datetime.now() - timedelta(days=5)),
+                  to_timestamp(datetime.now() + timedelta(days=9))))
+
+            # Update available copies for 1984
+            conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
 
-    conn.close()
+            get_pool().on_transaction_end(book_cache.clear)
 
 
 # Helper Functions for Database Operations
 
 def get_all_books() -> List[Dict]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
+    with db_connection() as conn:
+        books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
     return [dict(book) for book in books]
 
-def get_books_by_isbn(search_term: str) -> List[Dict]:
-    """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('''
-        SELECT * FROM books 
-        WHERE isbn = ?
-    ''', (search_term,)).fetchall()
-    conn.close()
+def get_books_page(after: Optional[Tuple[str, int]], limit: int) -> List[Dict]:
+    """
+    Get one page of books in (title, id) order using keyset pagination.
+
+    Args:
+        after: (title, id) of the last book on the previous page, or None for the first page
+        limit: maximum number of books to return
+    """
+    with db_connection() as conn:
+        if after is None:
+            books = conn.execute('''
+                SELECT * FROM books
+                ORDER BY title, id
+                LIMIT ?
+            ''', (limit,)).fetchall()
+        else:
+            books = conn.execute('''
+                SELECT * FROM books
+                WHERE (title, id) > (?, ?)
+                ORDER BY title, id
+                LIMIT ?
+            ''', (after[0], after[1], limit)).fetchall()
     return [dict(book) for book in books]
 
-def get_books_by_author(search_term: str) -> List[Dict]:
+def get_books_by_isbn(search_term: str) -> List[Dict]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('''
+    with db_connection() as conn:
+        books = conn.execute('''
             SELECT * FROM books 
-            WHERE author LIKE ?
-        ''', ("%" + search_term + "%",)).fetchall()
-    conn.close()
+            WHERE isbn = ?
+        ''', (search_term,)).fetchall()
     return [dict(book) for book in books]
 
-def get_books_by_title(search_term: str) -> List[Dict]:
-    """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('''
+def _search_books(column: str, search_term: str) -> List[Dict]:
+    """
+    Substring search on one books column, best match first.
+
+    Goes through the books_fts trigram index when the term is long enough, and falls back to
+    a LIKE scan for short terms or when the index doesn't exist.
+    """
+    with db_connection() as conn:
+        if len(search_term) >= FTS_MIN_TERM_LENGTH:
+            phrase = '"' + search_term.replace('"', '""') + '"'
+            try:
+                books = conn.execute(f'''
+                    SELECT b.* FROM books_fts f
+                    JOIN books b ON b.id = f.rowid
+                    WHERE books_fts MATCH ?
+                    ORDER BY bm25(books_fts)
+                ''', (f"{column} : {phrase}",)).fetchall()
+                return [dict(book) for book in books]
+            except sqlite3.OperationalError:
+                pass  # no FTS5 index, use LIKE below
+
+        books = conn.execute(f'''
                 SELECT * FROM books 
-                WHERE title LIKE ?
+                WHERE {column} LIKE ?
             ''', ("%" + search_term + "%",)).fetchall()
-    conn.close()
     return [dict(book) for book in books]
 
+def get_books_by_author(search_term: str) -> List[Dict]:
+    """Get books whose author contains the search term."""
+    return _search_books('author', search_term)
+
+def get_books_by_title(search_term: str) -> List[Dict]:
+    """Get books whose title contains the search term."""
+    return _search_books('title', search_term)
+
 
 
 def get_book_by_id(book_id: int) -> Optional[Dict]:
     """Get a specific book by ID."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    pool = get_pool()
+    # inside a transaction, always read the database: the caller is about to act on the row
+    use_cache = not pool.in_transaction()
+
+    if use_cache:
+        found, book = book_cache.get(('id', book_id))
+        if found:
+            return dict(book)
+        token = book_cache.token()
+
+    with db_connection() as conn:
+        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    if book is None:
+        return None
+    book = dict(book)
+
+    if use_cache:
+        book_cache.set(('id', book_id), book, token)
+    return dict(book)
 
 
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
     """Get a specific book by ISBN."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    pool = get_pool()
+    use_cache = not pool.in_transaction()
+
+    if use_cache:
+        found, book_id = book_cache.get(('isbn', isbn))
+        if found:
+            return get_book_by_id(book_id)
+        token = book_cache.token()
+
+    with db_connection() as conn:
+        book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    if book is None:
+        return None
+    book = dict(book)
+
+    if use_cache:
+        book_cache.set(('isbn', isbn), book['id'], token)
+        book_cache.set(('id', book['id']), book, token)
+    return dict(book)
+
+# borrow_records dates are Unix seconds. These SQL expressions turn a date column into the
+# local calendar date (YYYY-MM-DD) and into whole days between that date and a :today parameter.
+def _sql_local_date(column: str) -> str:
+    return f"date({column}, 'unixepoch', 'localtime')"
+
+
+def _sql_local_datetime(column: str) -> str:
+    return f"strftime('%Y-%m-%dT%H:%M:%S', {column}, 'unixepoch', 'localtime')"
+
+
+def _sql_days_since(column: str) -> str:
+    return f"CAST(julianday(:today) - julianday({column}, 'unixepoch', 'localtime', 'start of day') AS INTEGER)"
+
+
+def to_timestamp(value: datetime) -> int:
+    """Unix seconds for a local datetime, as stored in borrow_records."""
+    return int(value.timestamp())
+
+
+def day_start(day: date) -> int:
+    """Unix seconds at local midnight starting a day; a loan due before it is overdue that day."""
+    return to_timestamp(datetime.combine(day, datetime.min.time()))
+
 
 def get_patron_borrowed_book(patron_id: str, book_id: int) -> List[Dict]:
     """Get currently borrowed books for a patron."""
-    conn = get_db_connection()
-    records = conn.execute('''
-        SELECT * FROM borrow_records
-        WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ORDER BY borrow_date
-    ''', (patron_id, book_id)).fetchall()
-    conn.close()
+    with db_connection() as conn:
+        access_time = datetime.now()
+        records = conn.execute('''
+            SELECT id, due_date, due_date < ? AS is_overdue FROM borrow_records
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ORDER BY borrow_date, id
+        ''', (access_time.timestamp(), patron_id, book_id)).fetchall()
 
     borrowed_books = []
     for record in records:
-        access_time = datetime.now()
         borrowed_books.append({
             'borrow_id': record['id'],
             'access_time': access_time,
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': access_time > datetime.fromisoformat(record['due_date'])
+            'due_date': datetime.fromtimestamp(record['due_date']),
+            'is_overdue': bool(record['is_overdue'])
         })
 
     return borrowed_books
@@ -197,15 +998,17 @@ def get_patron_borrowed_book(patron_id: str, book_id: int) -> List[Dict]:
 
 def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     """Get currently borrowed books for a patron."""
-    conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
-        FROM borrow_records br 
-        JOIN books b ON br.book_id = b.id 
-        WHERE br.patron_id = ? AND br.return_date IS NULL
-        ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
-    conn.close()
+    with db_connection() as conn:
+        records = conn.execute(f'''
+            SELECT br.book_id, b.title, b.author,
+                   {_sql_local_date('br.borrow_date')} AS borrow_date,
+                   {_sql_local_date('br.due_date')} AS due_date,
+                   br.due_date < :today_start AS is_overdue
+            FROM borrow_records br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE br.patron_id = :patron_id AND br.return_date IS NULL
+            ORDER BY br.borrow_date, br.id
+        ''', {'patron_id': patron_id, 'today_start': day_start(date.today())}).fetchall()
 
     borrowed_books = []
     for record in records:
@@ -213,9 +1016,9 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
             'book_id': record['book_id'],
             'title': record['title'],
             'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']).strftime("%Y-%m-%d"),
-            'due_date': datetime.fromisoformat(record['due_date']).strftime("%Y-%m-%d"),
-            'is_overdue': datetime.now().date() > datetime.fromisoformat(record['due_date']).date()
+            'borrow_date': record['borrow_date'],
+            'due_date': record['due_date'],
+            'is_overdue': bool(record['is_overdue'])
         })
 
     return borrowed_books
@@ -223,15 +1026,16 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
 
 def get_borrow_records_by_patron(patron_id: str) -> List[Dict]:
     """Get all records by patron id."""
-    conn = get_db_connection()
-    records = conn.execute('''
-            SELECT br.*, b.title, b.author 
-            FROM borrow_records br 
-            JOIN books b ON br.book_id = b.id 
-            WHERE br.patron_id = ?
-            ORDER BY br.borrow_date
-        ''', (patron_id,)).fetchall()
-    conn.close()
+    with db_connection() as conn:
+        records = conn.execute(f'''
+                SELECT br.book_id, b.title, b.author,
+                       {_sql_local_date('br.borrow_date')} AS borrow_date,
+                       {_sql_local_date('br.return_date')} AS return_date
+                FROM borrow_records br 
+                JOIN books b ON br.book_id = b.id 
+                WHERE br.patron_id = ?
+                ORDER BY br.borrow_date, br.id
+            ''', (patron_id,)).fetchall()
 
     borrowed_books = []
     for record in records:
@@ -239,83 +1043,571 @@ def get_borrow_records_by_patron(patron_id: str) -> List[Dict]:
             'book_id': record['book_id'],
             'title': record['title'],
             'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']).strftime("%Y-%m-%d"),
-            'return_date': datetime.fromisoformat(record['return_date']).strftime("%Y-%m-%d") if record['return_date'] else "Outstanding",
-            'not_returned': not record['return_date']
+            'borrow_date': record['borrow_date'],
+            'return_date': record['return_date'] or "Outstanding",
+            'not_returned': record['return_date'] is None
         })
 
     return borrowed_books
 
+def get_patron_loans(patron_id: str, open_only: bool = False, today: Optional[date] = None) -> List[Dict]:
+    """
+    Get every borrow record for a patron (or only the open ones) with book details, in borrow order.
+
+    Dates come back as local YYYY-MM-DD strings (return_date None while open). Open loans
+    also get days_overdue, counted from the due date to today (negative before it is due).
+    """
+    with db_connection() as conn:
+        records = conn.execute(f'''
+            SELECT br.id, br.book_id, b.title, b.author,
+                   {_sql_local_date('br.borrow_date')} AS borrow_date,
+                   {_sql_local_date('br.due_date')} AS due_date,
+                   {_sql_local_date('br.return_date')} AS return_date,
+                   CASE WHEN br.return_date IS NULL THEN {_sql_days_since('br.due_date')} END AS days_overdue
+            FROM borrow_records br
+            JOIN books b ON br.book_id = b.id
+            WHERE br.patron_id = :patron_id {"AND br.return_date IS NULL" if open_only else ""}
+            ORDER BY br.borrow_date, br.id
+        ''', {'patron_id': patron_id, 'today': (today or date.today()).isoformat()}).fetchall()
+    return [dict(record) for record in records]
+
+def iter_overdue_loans(today: Optional[date] = None, chunk_size: int = 10000) -> Iterator[List[sqlite3.Row]]:
+    """
+    Stream the open loans overdue on a day as chunks of (patron_id, book_id, days_overdue, borrow_id) rows.
+
+    A patron holding several open records for the same book is charged on the earliest one,
+    as in get_patron_borrowed_book, so each (patron_id, book_id) pair appears once. The loans
+    come from a range scan of the due date index, so the cost follows the number overdue
+    rather than the number open.
+    """
+    today = today or date.today()
+    with db_connection() as conn:
+        cursor = conn.execute(f'''
+            SELECT patron_id, book_id, {_sql_days_since('due_date')} AS days_overdue, id AS borrow_id
+            FROM borrow_records br
+            WHERE return_date IS NULL AND due_date < :today_start AND NOT EXISTS (
+                SELECT 1 FROM borrow_records earlier
+                WHERE earlier.patron_id = br.patron_id AND earlier.book_id = br.book_id
+                  AND earlier.return_date IS NULL
+                  AND (earlier.borrow_date < br.borrow_date
+                       OR (earlier.borrow_date = br.borrow_date AND earlier.id < br.id))
+            )
+        ''', {'today': today.isoformat(), 'today_start': day_start(today)})
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+def get_open_loan_fee(patron_id: str, book_id: int, now: Optional[datetime] = None) -> Optional[Dict]:
+    """
+    Get the late fee state of a patron's earliest open loan of a book, or None if there is none.
+
+    Returns:
+        Dict: days_overdue, the loan's tier_start, fee_base and fee_rate, and fee_current,
+        which is false while the stored tier is out of date (the sweeper hasn't reached it)
+    """
+    now = now or datetime.now()
+    with db_connection() as conn:
+        record = conn.execute(f'''
+            SELECT {_sql_days_since('br.due_date')} AS days_overdue,
+                   lf.tier_start, lf.fee_base, lf.fee_rate,
+                   lf.borrow_id IS NOT NULL AND IFNULL(lf.next_change > :now, 1) AS fee_current
+            FROM borrow_records br
+            LEFT JOIN loan_fees lf ON lf.borrow_id = br.id
+            WHERE br.patron_id = :patron_id AND br.book_id = :book_id AND br.return_date IS NULL
+            ORDER BY br.borrow_date, br.id
+            LIMIT 1
+        ''', {'patron_id': patron_id, 'book_id': book_id, 'today': now.date().isoformat(),
+              'now': now.timestamp()}).fetchone()
+    if record is None:
+        return None
+    loan_fee = dict(record)
+    loan_fee['fee_current'] = bool(loan_fee['fee_current'])
+    return loan_fee
+
+
+def sweep_loan_fees(fee_tier: Callable[[int], Tuple[int, float, float, Optional[int]]],
+                    now: Optional[datetime] = None, chunk_size: int = 1000) -> int:
+    """
+    Move every loan whose fee tier has changed by `now` into its current tier.
+
+    Each chunk is its own short transaction, so a large backlog doesn't hold the write lock.
+
+    Args:
+        fee_tier: days overdue -> (tier_start, fee_base, fee_rate, first day of the next tier or None)
+        now: when to sweep as of (default now)
+        chunk_size: loans updated per transaction
+
+    Returns:
+        int: number of loans updated
+    """
+    now = now or datetime.now()
+    today = now.date()
+    swept = 0
+    while True:
+        with transaction() as conn:
+            records = conn.execute(f'''
+                SELECT lf.borrow_id, br.due_date, {_sql_days_since('br.due_date')} AS days_overdue
+                FROM loan_fees lf
+                JOIN borrow_records br ON br.id = lf.borrow_id
+                WHERE lf.next_change <= :now
+                LIMIT :limit
+            ''', {'today': today.isoformat(), 'now': now.timestamp(), 'limit': chunk_size}).fetchall()
+
+            updates = []
+            for record in records:
+                tier_start, fee_base, fee_rate, next_tier = fee_tier(record['days_overdue'])
+                due_day = datetime.fromtimestamp(record['due_date']).date()
+                next_change = day_start(due_day + timedelta(days=next_tier)) if next_tier is not None else None
+                updates.append((tier_start, fee_base, fee_rate, next_change, record['borrow_id']))
+            conn.executemany('''
+                UPDATE loan_fees SET tier_start = ?, fee_base = ?, fee_rate = ?, next_change = ?
+                WHERE borrow_id = ?
+            ''', updates)
+        swept += len(updates)
+        if len(records) < chunk_size:
+            return swept
+
+
+def get_next_loan_fee_change() -> Optional[int]:
+    """When the next loan changes fee tier, in Unix seconds, or None if no loan will."""
+    with db_connection() as conn:
+        return conn.execute('SELECT MIN(next_change) FROM loan_fees WHERE next_change IS NOT NULL').fetchone()[0]
+
+
+def post_fee_accruals(accruals: Iterable[Tuple[int, str, int, float]], now: Optional[datetime] = None) -> int:
+    """
+    Bring the fees accrued on loans up to date in the ledger.
+
+    Args:
+        accruals: (borrow_id, patron_id, book_id, fee owed on the loan so far) for each loan;
+            an accrual entry is added for the part of the fee not already in the ledger
+
+    Returns:
+        int: number of accrual entries added
+    """
+    now = now or datetime.now()
+    with transaction() as conn:
+        before = conn.total_changes
+        conn.executemany('''
+            INSERT INTO fee_ledger (patron_id, book_id, borrow_id, kind, amount, created_at)
+            SELECT ?2, ?3, ?1, 'accrual', ?4 - accrued, ?5
+            FROM (SELECT IFNULL(SUM(amount), 0) AS accrued FROM fee_ledger WHERE borrow_id = ?1 AND kind = 'accrual')
+            WHERE ?4 > accrued
+        ''', ((borrow_id, patron_id, book_id, fee, to_timestamp(now))
+              for borrow_id, patron_id, book_id, fee in accruals))
+        return conn.total_changes - before
+
+
+def insert_fee_payment(patron_id: str, book_id: int, amount: float, transaction_id: str,
+                       borrow_id: Optional[int] = None) -> bool:
+    """Record a late fee payment in the ledger, against the loan it paid for when there is one."""
+    try:
+        with transaction() as conn:
+            conn.execute('''
+                INSERT INTO fee_ledger (patron_id, book_id, borrow_id, kind, amount, transaction_id, created_at)
+                VALUES (?, ?, ?, 'payment', ?, ?, ?)
+            ''', (patron_id, book_id, borrow_id, -amount, transaction_id, to_timestamp(datetime.now())))
+        return True
+    except Exception as e:
+        return False
+
+
+def get_refundable_amount(transaction_id: str) -> Optional[float]:
+    """
+    How much of a late fee payment has not been refunded yet, or None if the ledger has no
+    payment with that transaction id.
+    """
+    with db_connection() as conn:
+        row = conn.execute('''
+            SELECT -SUM(amount) AS refundable, SUM(kind = 'payment') AS payments
+            FROM fee_ledger WHERE transaction_id = ?
+        ''', (transaction_id,)).fetchone()
+    return row['refundable'] if row['payments'] else None
+
+
+def insert_fee_refund(transaction_id: str, amount: float) -> bool:
+    """
+    Record a refund of a late fee payment in the ledger, against the patron (and book and loan,
+    if the payment was for a single book) the payment was recorded for.
+
+    Returns False, recording nothing, when the ledger has no payment with that transaction id
+    or the refund is more than what is left of it.
+    """
+    try:
+        with transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO fee_ledger (patron_id, book_id, borrow_id, kind, amount, transaction_id, created_at)
+                SELECT MIN(patron_id),
+                       CASE WHEN COUNT(DISTINCT book_id) = 1 THEN MIN(book_id) END,
+                       CASE WHEN COUNT(DISTINCT book_id) = 1 THEN MIN(borrow_id) END,
+                       'refund', ?2, ?1, ?3
+                FROM fee_ledger WHERE transaction_id = ?1 AND kind = 'payment'
+                HAVING COUNT(*) > 0 AND ROUND(?2, 2) <= ROUND(-SUM(amount) - (
+                    SELECT IFNULL(SUM(amount), 0) FROM fee_ledger WHERE transaction_id = ?1 AND kind = 'refund'
+                ), 2)
+            ''', (transaction_id, amount, to_timestamp(datetime.now())))
+        return cursor.rowcount == 1
+    except Exception as e:
+        return False
+
+
+def get_loan_fees_paid(borrow_ids: Iterable[int]) -> Dict[int, float]:
+    """What has been paid (less refunds) towards the late fees of each of some loans; loans with no payments are left out."""
+    borrow_ids = list(borrow_ids)
+    if not borrow_ids:
+        return {}
+    with db_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT borrow_id, -SUM(amount) AS paid FROM fee_ledger
+            WHERE kind IN ('payment', 'refund') AND borrow_id IN ({', '.join('?' * len(borrow_ids))})
+            GROUP BY borrow_id
+        ''', borrow_ids).fetchall()
+    return {row['borrow_id']: row['paid'] for row in rows}
+
+
+def get_patron_fee_balance(patron_id: str) -> float:
+    """What a patron owes according to the ledger (negative if they have paid more)."""
+    with db_connection() as conn:
+        return conn.execute('''
+            SELECT IFNULL(SUM(amount), 0.0) FROM fee_ledger WHERE patron_id = ?
+        ''', (patron_id,)).fetchone()[0]
+
+
+def get_fee_ledger(patron_id: str) -> List[Dict]:
+    """Get a patron's ledger entries, oldest first, with created_at as a local ISO datetime."""
+    with db_connection() as conn:
+        records = conn.execute(f'''
+            SELECT id, patron_id, book_id, borrow_id, kind, amount, transaction_id,
+                   {_sql_local_datetime('created_at')} AS created_at
+            FROM fee_ledger WHERE patron_id = ?
+            ORDER BY id
+        ''', (patron_id,)).fetchall()
+    return [dict(record) for record in records]
+
+
+def _payment_from_row(record: sqlite3.Row) -> Dict:
+    payment = dict(record)
+    payment['book_fees'] = [tuple(book_fee) for book_fee in json.loads(payment['book_fees'])]
+    return payment
+
+
+def enqueue_payment(idempotency_key: str, patron_id: str, book_fees: List[Tuple[int, float]],
+                    amount: float, description: str) -> Dict:
+    """
+    Add a payment to the outbox, due now, unless one with the same idempotency key is already
+    pending or has succeeded; either way return the outbox entry for the key.
+
+    A payment that failed is tried again as a new entry, keyed idempotency_key#2 (then #3 and so
+    on), since the gateway answers a key it has seen with the same outcome. One that failed after
+    the gateway charged it (it has a transaction_id) is returned instead: charging again would
+    take the money twice.
+    """
+    now = datetime.now()
+    with transaction() as conn:
+        # the key itself, then its retries: '#' sorts just before '$', so they form one range of the index
+        tries = conn.execute('''
+            SELECT * FROM payment_outbox
+            WHERE idempotency_key = ?1 OR (idempotency_key > ?1 || '#' AND idempotency_key < ?1 || '$')
+            ORDER BY id DESC
+        ''', (idempotency_key,)).fetchall()
+        if tries and (tries[0]['status'] != 'failed' or tries[0]['transaction_id']):
+            return _payment_from_row(tries[0])
+
+        key = f"{idempotency_key}#{len(tries) + 1}" if tries else idempotency_key
+        cursor = conn.execute('''
+            INSERT INTO payment_outbox (idempotency_key, patron_id, book_fees, amount, description,
+                                        next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (key, patron_id, json.dumps(book_fees), amount, description,
+              now.timestamp(), to_timestamp(now), to_timestamp(now)))
+        record = conn.execute('SELECT * FROM payment_outbox WHERE id = ?', (cursor.lastrowid,)).fetchone()
+    return _payment_from_row(record)
+
+
+def get_open_payments(patron_id: str) -> List[Dict]:
+    """
+    Get a patron's outbox entries that charge (or have charged) fees the ledger doesn't show
+    paid yet: the pending ones, and those that failed after the gateway charged them.
+    """
+    with db_connection() as conn:
+        records = conn.execute('''
+            SELECT * FROM payment_outbox
+            WHERE patron_id = ? AND (status = 'pending' OR (status = 'failed' AND transaction_id IS NOT NULL))
+            ORDER BY id
+        ''', (patron_id,)).fetchall()
+    return [_payment_from_row(record) for record in records]
+
+
+def get_payment(payment_id: int) -> Optional[Dict]:
+    """Get an outbox entry by id."""
+    with db_connection() as conn:
+        record = conn.execute('SELECT * FROM payment_outbox WHERE id = ?', (payment_id,)).fetchone()
+    return _payment_from_row(record) if record else None
+
+
+def claim_payment(lease: float, now: Optional[float] = None) -> Optional[Dict]:
+    """
+    Claim the pending payment that has been due longest, or return None if none is due.
+
+    The claim counts an attempt and moves the payment's next attempt `lease` seconds ahead, so
+    other workers leave it alone while this one calls the gateway.
+    """
+    now = time.time() if now is None else now
+    with transaction() as conn:
+        record = conn.execute('''
+            SELECT * FROM payment_outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at
+            LIMIT 1
+        ''', (now,)).fetchone()
+        if record is None:
+            return None
+        conn.execute('''
+            UPDATE payment_outbox SET attempts = attempts + 1, next_attempt_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', (now + lease, int(now), record['id']))
+    payment = _payment_from_row(record)
+    payment['attempts'] += 1
+    return payment
+
+
+def update_payment(payment_id: int, status: str, next_attempt_at: Optional[float] = None,
+                   transaction_id: Optional[str] = None, last_error: Optional[str] = None) -> bool:
+    """Record the outcome of a payment attempt (next_attempt_at is only used while still pending)."""
+    try:
+        with transaction() as conn:
+            conn.execute('''
+                UPDATE payment_outbox
+                SET status = ?, next_attempt_at = IFNULL(?, next_attempt_at), transaction_id = ?,
+                    last_error = ?, updated_at = ?
+                WHERE id = ?
+            ''', (status, next_attempt_at, transaction_id, last_error, int(time.time()), payment_id))
+        return True
+    except Exception as e:
+        return False
+
+
+def get_next_payment_attempt() -> Optional[float]:
+    """When the next pending payment is due, in Unix seconds, or None if none is pending."""
+    with db_connection() as conn:
+        return conn.execute("SELECT MIN(next_attempt_at) FROM payment_outbox WHERE status = 'pending'").fetchone()[0]
+
+
+def iter_borrow_records(patron_id: Optional[str] = None, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None, chunk_size: int = 1000) -> Iterator[List[Dict]]:
+    """
+    Stream borrow records in id order as chunks of dicts, without loading them all.
+
+    Args:
+        patron_id: only this patron's records
+        start: only records borrowed at or after this time
+        end: only records borrowed before this time
+        chunk_size: rows fetched from the cursor at a time
+    """
+    conditions = []
+    params = []
+    if patron_id is not None:
+        conditions.append('patron_id = ?')
+        params.append(patron_id)
+    if start is not None:
+        conditions.append('borrow_date >= ?')
+        params.append(start.timestamp())
+    if end is not None:
+        conditions.append('borrow_date < ?')
+        params.append(end.timestamp())
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+    with db_connection() as conn:
+        cursor = conn.execute(f'''
+            SELECT id, patron_id, book_id,
+                   {_sql_local_datetime('borrow_date')} AS borrow_date,
+                   {_sql_local_datetime('due_date')} AS due_date,
+                   {_sql_local_datetime('return_date')} AS return_date
+            FROM borrow_records
+            {where}
+            ORDER BY id
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [dict(row) for row in rows]
+
+def iter_books(chunk_size: int = 1000) -> Iterator[List[Dict]]:
+    """Stream every book in id order as chunks of dicts, without loading them all."""
+    with db_connection() as conn:
+        cursor = conn.execute('SELECT * FROM books ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [dict(row) for row in rows]
+
+def get_data_versions(*names: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Get the change counters for data sets in DATA_VERSION_TABLES.
+
+    Returns:
+        Dict: name -> (version, updated_at as Unix seconds); every change to the underlying
+            table bumps the version
+    """
+    with db_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT name, version, updated_at FROM data_versions
+            WHERE name IN ({', '.join('?' * len(names))})
+        ''', names).fetchall()
+    return {row['name']: (row['version'], row['updated_at']) for row in rows}
+
+
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
-    conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
-    conn.close()
-    return count
+    with db_connection() as conn:
+        row = conn.execute('''
+            SELECT open_loans FROM patrons
+            WHERE patron_id = ?
+        ''', (patron_id,)).fetchone()
+    return row['open_loans'] if row else 0
+
+
+def patron_has_open_loan(patron_id: str, book_id: int) -> bool:
+    """Check whether a patron currently has a copy of a book."""
+    with db_connection() as conn:
+        row = conn.execute('''
+            SELECT 1 FROM patron_open_books
+            WHERE patron_id = ? AND book_id = ?
+        ''', (patron_id, book_id)).fetchone()
+    return row is not None
+
+
+def check_patron_counters() -> List[Dict]:
+    """
+    Compare the open loan counters with borrow_records.
+
+    Returns:
+        list: one dict per mismatch with patron_id, book_id (None for the patron total),
+        the counter value and the actual number of open loans; empty if consistent
+    """
+    with db_connection() as conn:
+        actual_patrons = {row['patron_id']: row['count'] for row in conn.execute('''
+            SELECT patron_id, COUNT(*) AS count FROM borrow_records
+            WHERE return_date IS NULL
+            GROUP BY patron_id
+        ''')}
+        counted_patrons = {row['patron_id']: row['open_loans'] for row in conn.execute('''
+            SELECT patron_id, open_loans FROM patrons WHERE open_loans != 0
+        ''')}
+        actual_books = {(row['patron_id'], row['book_id']): row['count'] for row in conn.execute('''
+            SELECT patron_id, book_id, COUNT(*) AS count FROM borrow_records
+            WHERE return_date IS NULL
+            GROUP BY patron_id, book_id
+        ''')}
+        counted_books = {(row['patron_id'], row['book_id']): row['open_loans'] for row in conn.execute('''
+            SELECT patron_id, book_id, open_loans FROM patron_open_books
+        ''')}
+
+    mismatches = []
+    for patron_id in sorted(actual_patrons.keys() | counted_patrons.keys()):
+        counter, actual = counted_patrons.get(patron_id, 0), actual_patrons.get(patron_id, 0)
+        if counter != actual:
+            mismatches.append({'patron_id': patron_id, 'book_id': None, 'counter': counter, 'actual': actual})
+    for patron_id, book_id in sorted(actual_books.keys() | counted_books.keys()):
+        counter, actual = counted_books.get((patron_id, book_id), 0), actual_books.get((patron_id, book_id), 0)
+        if counter != actual:
+            mismatches.append({'patron_id': patron_id, 'book_id': book_id, 'counter': counter, 'actual': actual})
+    return mismatches
+
+
+def rebuild_patron_counters() -> List[Dict]:
+    """
+    Rebuild the open loan counters from borrow_records.
+
+    Returns:
+        list: the mismatches that were found and repaired, see check_patron_counters
+    """
+    with transaction() as conn:
+        mismatches = check_patron_counters()
+        _rebuild_patron_counters(conn)
+    return mismatches
 
 
 def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
     """Insert a new book into the database."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            INSERT INTO books (title, author, isbn, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (title, author, isbn, total_copies, available_copies))
+            # the ISBN and new id may have been cached as missing
+            invalidate_books(('isbn', isbn), ('id', cursor.lastrowid))
+        return True
+    except Exception as e:
+        return False
+
+
+def get_existing_isbns(isbns: List[str]) -> set:
+    """Get which of the given ISBNs are already in the catalog, in one query."""
+    with db_connection() as conn:
+        rows = conn.execute('''
+            SELECT isbn FROM books
+            WHERE isbn IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(isbns),)).fetchall()
+    return {row['isbn'] for row in rows}
+
+
+def insert_books(books: List[Tuple[str, str, str, int, int]]) -> bool:
+    """Insert many (title, author, isbn, total_copies, available_copies) rows in one transaction."""
+    try:
+        with transaction() as conn:
+            conn.executemany('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+            ''', books)
+            # new ids and ISBNs may have been cached as missing
+            get_pool().on_transaction_end(book_cache.clear)
         return True
     except Exception as e:
-        conn.close()
         return False
 
 
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, to_timestamp(borrow_date), to_timestamp(due_date)))
         return True
     except Exception as e:
-        conn.close()
         return False
 
 
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute('''
+                UPDATE books SET available_copies = available_copies + ? WHERE id = ?
+            ''', (change, book_id))
+            invalidate_books(('id', book_id))
         return True
     except Exception as e:
-        conn.close()
         return False
 
 
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            UPDATE borrow_records 
-            SET return_date = ? 
-            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute('''
+                UPDATE borrow_records 
+                SET return_date = ? 
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ''', (to_timestamp(return_date), patron_id, book_id))
         return True
     except Exception as e:
-        conn.close()
         return False
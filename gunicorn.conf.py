@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for serving the Library Management System in production.
+
+Every setting can be overridden from the environment:
+    PORT               port to listen on (default 5000)
+    WEB_CONCURRENCY    worker processes (default 2 per CPU + 1)
+    WEB_THREADS        threads per worker (default 4)
+    WEB_TIMEOUT        seconds before a stuck worker is restarted (default 30)
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Multiple processes, each handling requests on a pool of threads
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Each worker imports wsgi.py and opens its own connection pool. SQLite connections must not be
+# shared across fork, so the app is not preloaded in the master. Startup is safe to run in all
+# workers at once: migrations and sample data each run in one BEGIN IMMEDIATE transaction.
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,248 @@
+"""
+Instrumentation module for Library Management System
+Opt-in request and SQL timing, exported in Prometheus text format
+"""
+
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import sqlite3
+
+SLOWEST_QUERIES = 10
+
+# Set by init_app. While False, database connections are plain sqlite3 connections and no
+# request hooks are installed, so there is nothing to pay for.
+enabled = False
+
+
+class RequestStats:
+    """What one request spent, filled in as it runs."""
+
+    __slots__ = ('start', 'connections', 'statements', 'sql_time', 'slowest')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.connections = 0
+        self.statements = 0
+        self.sql_time = 0.0
+        self.slowest: Optional[Tuple[float, str]] = None  # (seconds, helper)
+
+
+class Metrics:
+    """
+    Process-wide totals. Each gunicorn worker has its own, so scrape every worker (or add
+    them up) to see the whole server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests: Dict[str, List[float]] = {}  # endpoint -> [count, seconds]
+            self.connections = 0
+            self.statements: Dict[str, List[float]] = {}  # helper -> [count, seconds, slowest]
+            self.slowest_queries: List[Tuple[float, str, str]] = []  # (seconds, helper, sql)
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def record_statement(self, helper: str, sql: str, seconds: float):
+        with self._lock:
+            totals = self.statements.setdefault(helper, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+            if len(self.slowest_queries) < SLOWEST_QUERIES or seconds > self.slowest_queries[-1][0]:
+                self.slowest_queries.append((seconds, helper, ' '.join(sql.split())))
+                self.slowest_queries.sort(key=lambda query: query[0], reverse=True)
+                del self.slowest_queries[SLOWEST_QUERIES:]
+
+    def record_request(self, endpoint: str, seconds: float):
+        with self._lock:
+            totals = self.requests.setdefault(endpoint, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def render_prometheus(self) -> str:
+        """The totals in Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                '# HELP library_requests_total Requests handled, by endpoint.',
+                '# TYPE library_requests_total counter',
+            ]
+            lines += [f'library_requests_total{{endpoint="{_label(endpoint)}"}} {count}'
+                      for endpoint, (count, _) in sorted(self.requests.items())]
+            lines += [
+                '# HELP library_request_duration_seconds_total Wall time spent handling requests, by endpoint.',
+                '# TYPE library_request_duration_seconds_total counter',
+            ]
+            lines += [f'library_request_duration_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds:.6f}'
+                      for endpoint, (_, seconds) in sorted(self.requests.items())]
+            lines += [
+                '# HELP library_db_connections_opened_total SQLite connections opened.',
+                '# TYPE library_db_connections_opened_total counter',
+                f'library_db_connections_opened_total {self.connections}',
+                '# HELP library_sql_statements_total SQL statements executed, by the function that issued them.',
+                '# TYPE library_sql_statements_total counter',
+            ]
+            lines += [f'library_sql_statements_total{{helper="{_label(helper)}"}} {count}'
+                      for helper, (count, _, _) in sorted(self.statements.items())]
+            lines += [
+                '# HELP library_sql_duration_seconds_total Time spent executing SQL, by the function that issued it.',
+                '# TYPE library_sql_duration_seconds_total counter',
+            ]
+            lines += [f'library_sql_duration_seconds_total{{helper="{_label(helper)}"}} {seconds:.6f}'
+                      for helper, (_, seconds, _) in sorted(self.statements.items())]
+            lines += [
+                '# HELP library_sql_max_duration_seconds Slowest single statement, by the function that issued it.',
+                '# TYPE library_sql_max_duration_seconds gauge',
+            ]
+            lines += [f'library_sql_max_duration_seconds{{helper="{_label(helper)}"}} {slowest:.6f}'
+                      for helper, (_, _, slowest) in sorted(self.statements.items())]
+            lines += [
+                '# HELP library_sql_slowest_query_seconds The slowest statements seen, with their text.',
+                '# TYPE library_sql_slowest_query_seconds gauge',
+            ]
+            lines += [f'library_sql_slowest_query_seconds{{rank="{rank}",helper="{_label(helper)}",'
+                      f'query="{_label(sql[:200])}"}} {seconds:.6f}'
+                      for rank, (seconds, helper, sql) in enumerate(self.slowest_queries, start=1)]
+            return '\n'.join(lines) + '\n'
+
+
+def _label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return re.sub(r'(["\\])', r'\\\1', value).replace('\n', '\\n')
+
+
+metrics = Metrics()
+_local = threading.local()
+
+
+def current_request() -> Optional[RequestStats]:
+    """The stats of the request this thread is handling, if any."""
+    return getattr(_local, 'request', None)
+
+
+def _record(helper: str, sql: str, seconds: float):
+    metrics.record_statement(helper, sql, seconds)
+    stats = current_request()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_time += seconds
+        if stats.slowest is None or seconds > stats.slowest[0]:
+            stats.slowest = (seconds, helper)
+
+
+# Code objects of functions that only manage connections or transactions for their callers
+_pass_through = set()
+
+
+def attribute_to_caller(function):
+    """
+    Mark a function whose statements (e.g. BEGIN and COMMIT) belong to whoever called it.
+
+    Registered once at import, so it costs nothing per call.
+    """
+    _pass_through.add(function.__code__)
+    return function
+
+
+def _caller(depth: int = 2) -> str:
+    """'module.function' of the code that called the instrumented method."""
+    frame = sys._getframe(depth)
+    while frame.f_back is not None and (frame.f_code in _pass_through
+                                        or frame.f_globals.get('__name__') == 'contextlib'):
+        frame = frame.f_back
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}.{frame.f_code.co_name}"
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection that times every statement and commit and attributes it to its caller."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        metrics.record_connection()
+        stats = current_request()
+        if stats is not None:
+            stats.connections += 1
+
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            _record(_caller(), sql, time.perf_counter() - start)
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            _record(_caller(), sql, time.perf_counter() - start)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _record(_caller(), 'COMMIT', time.perf_counter() - start)
+
+
+def connection_factory():
+    """The sqlite3 connection class database.get_db_connection should use."""
+    return InstrumentedConnection if enabled else sqlite3.Connection
+
+
+def server_timing(stats: RequestStats) -> str:
+    """A Server-Timing header value summarising a request (shown in browser dev tools)."""
+    elapsed = (time.perf_counter() - stats.start) * 1000
+    parts = [
+        f'app;dur={elapsed:.2f}',
+        f'sql;dur={stats.sql_time * 1000:.2f};desc="{stats.statements} statements, '
+        f'{stats.connections} connections opened"',
+    ]
+    if stats.slowest is not None:
+        parts.append(f'slowest-sql;dur={stats.slowest[0] * 1000:.2f};desc="{stats.slowest[1]}"')
+    return ', '.join(parts)
+
+
+def init_app(app):
+    """
+    Turn instrumentation on for an app when its INSTRUMENTATION setting is true.
+
+    Call before database.init_app, so the connection pool it builds opens instrumented
+    connections and the request timer starts before a connection is checked out. Each
+    response then carries a Server-Timing header for the work done before it was sent, and
+    every request's total (including any streamed body) is added to `metrics`.
+    """
+    from flask import request
+
+    global enabled
+    enabled = bool(app.config.get('INSTRUMENTATION', False))
+    if not enabled:
+        return
+
+    @app.before_request
+    def _start_request_stats():
+        _local.request = RequestStats()
+
+    @app.after_request
+    def _add_server_timing(response):
+        stats = current_request()
+        if stats is not None:
+            response.headers['Server-Timing'] = server_timing(stats)
+        return response
+
+    @app.teardown_request
+    def _finish_request_stats(exception=None):
+        stats = current_request()
+        _local.request = None
+        if stats is not None:
+            metrics.record_request(request.endpoint or 'unknown', time.perf_counter() - stats.start)
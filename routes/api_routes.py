@@ -2,12 +2,56 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
-from database import reset_database
+import csv
+import io
+import json
+from collections.abc import Mapping
+from datetime import datetime
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from services.library_service import (
+    calculate_late_fee_for_book, search_books_in_catalog, get_catalog_page, CATALOG_PAGE_SIZE,
+    get_patron_fee_account, request_late_fee_payment
+)
+from database import reset_database, iter_books, iter_borrow_records, get_payment
+from routes.http_cache import conditional
+import instrumentation
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+BORROW_RECORD_COLUMNS = ['id', 'patron_id', 'book_id', 'borrow_date', 'due_date', 'return_date']
+BOOK_COLUMNS = ['id', 'title', 'author', 'isbn', 'total_copies', 'available_copies']
+PAYMENT_FIELDS = ['id', 'status', 'patron_id', 'amount', 'description', 'attempts', 'transaction_id',
+                  'last_error', 'idempotency_key']
+
+
+def _encode_chunks(chunks, columns, export_format):
+    """Turn chunks of row dicts into CSV (with a header) or NDJSON text, one piece per chunk."""
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        yield buffer.getvalue()
+        for rows in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+    else:
+        for rows in chunks:
+            yield ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def _export_response(chunks, columns, export_format, name):
+    return Response(stream_with_context(_encode_chunks(chunks, columns, export_format)),
+                    mimetype=EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename={name}.{export_format}'})
+
 
 @api_bp.route('/tests/reset-db', methods=['POST'])
 def api_reset_database():
@@ -15,7 +59,20 @@ def api_reset_database():
     return jsonify("Finished"), 200
 
 
+@api_bp.route('/metrics')
+def metrics():
+    """
+    Request and SQL timings for this process in Prometheus text format.
+    Only available when the app was created with INSTRUMENTATION enabled.
+    """
+    if not instrumentation.enabled:
+        return jsonify({'error': 'Instrumentation is disabled'}), 404
+
+    return Response(instrumentation.metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
+@conditional('loans', daily=True)
 def get_late_fee(patron_id, book_id):
     """
     Calculate late fee for a specific book borrowed by a patron.
@@ -24,7 +81,60 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+
+@api_bp.route('/fees/<patron_id>')
+def get_fee_account(patron_id):
+    """
+    Late fee balance of a patron, with the ledger of accruals, payments and refunds behind it.
+    """
+    if not patron_id.isdigit() or len(patron_id) != 6:
+        return jsonify({'error': 'Invalid patron ID. Must be exactly 6 digits.'}), 400
+
+    return jsonify(get_patron_fee_account(patron_id))
+
+@api_bp.route('/payments', methods=['POST'])
+def request_payment():
+    """
+    Queue the payment of a patron's late fees on one book (book_id) or on all their overdue
+    books, answering 202 with the queued payment; poll its Location for the outcome. A request
+    for a payment already made answers 200 with it.
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        data = request.form
+    if not isinstance(data, Mapping):
+        return jsonify({'error': 'Request body must be an object with patron_id and book_id'}), 400
+
+    book_id = data.get('book_id')
+    if book_id is not None and not str(book_id).isdigit():
+        return jsonify({'error': 'book_id must be an integer'}), 400
+
+    success, message, payment = request_late_fee_payment(str(data.get('patron_id', '')),
+                                                         int(book_id) if book_id is not None else None)
+    if not success:
+        return jsonify({'error': message}), 400
+
+    pool = current_app.extensions.get('payment_workers')
+    if pool is not None:
+        pool.notify()
+
+    response = jsonify({'message': message, 'payment': {field: payment[field] for field in PAYMENT_FIELDS}})
+    response.headers['Location'] = f"/api/payments/{payment['id']}"
+    return response, 202 if payment['status'] == 'pending' else 200
+
+
+@api_bp.route('/payments/<int:payment_id>')
+def payment_status(payment_id):
+    """Outcome of a queued late fee payment: pending, succeeded or failed."""
+    payment = get_payment(payment_id)
+    if payment is None:
+        return jsonify({'error': 'Payment not found'}), 404
+
+    return jsonify({field: payment[field] for field in PAYMENT_FIELDS})
+
+
 @api_bp.route('/search')
+@conditional('catalog')
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -45,3 +155,61 @@ def search_books_api():
         'results': books,
         'count': len(books)
     })
+
+
+@api_bp.route('/books')
+@conditional('catalog')
+def list_books_api():
+    """
+    List catalog books one page at a time via API endpoint.
+    JSON interface for R2: Book Catalog Display
+    """
+    cursor = request.args.get('after', '')
+    page_size = request.args.get('page_size', CATALOG_PAGE_SIZE, type=int)
+
+    page = get_catalog_page(cursor, page_size)
+    if page is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return jsonify({
+        'books': page['books'],
+        'count': len(page['books']),
+        'page_size': page['page_size'],
+        'next_cursor': page['next_cursor']
+    })
+
+
+@api_bp.route('/export/borrow_records')
+def export_borrow_records():
+    """
+    Stream borrow records as CSV or NDJSON for audits.
+    Query parameters: format (csv or ndjson), patron_id, from and to (YYYY-MM-DD, borrow date,
+    to is exclusive).
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+
+    try:
+        start = datetime.strptime(request.args['from'], "%Y-%m-%d") if request.args.get('from') else None
+        end = datetime.strptime(request.args['to'], "%Y-%m-%d") if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    patron_id = request.args.get('patron_id', '').strip() or None
+
+    chunks = iter_borrow_records(patron_id=patron_id, start=start, end=end)
+    return _export_response(chunks, BORROW_RECORD_COLUMNS, export_format, 'borrow_records')
+
+
+@api_bp.route('/export/books')
+def export_books():
+    """
+    Stream the whole catalog as CSV or NDJSON.
+    Query parameters: format (csv or ndjson).
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+
+    return _export_response(iter_books(), BOOK_COLUMNS, export_format, 'books')
@@ -5,6 +5,7 @@ Borrowing Routes - Book borrowing and returning endpoints
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from services.library_service import borrow_book_by_patron, return_book_by_patron, get_patron_status_report
 from database import get_patron_borrowed_books, get_borrow_records_by_patron
+from routes.streaming import stream_page
 
 borrowing_bp = Blueprint('borrowing', __name__)
 
@@ -66,9 +67,9 @@ def patron_status():
 
     status_report = get_patron_status_report(patron_id)
 
-    return render_template('patron_status.html',
-                           patron_id=patron_id,
-                           outstanding_books=status_report['outstanding_books'],
-                           num_outstanding=status_report['num_outstanding'],
-                           late_fee=status_report['late_fee'],
-                           records=status_report['records'])
+    return stream_page('patron_status.html',
+                       patron_id=patron_id,
+                       outstanding_books=status_report['outstanding_books'],
+                       num_outstanding=status_report['num_outstanding'],
+                       late_fee=status_report['late_fee'],
+                       records=status_report['records'])
@@ -3,8 +3,10 @@ Catalog Routes - Book catalog related endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
-from services.library_service import add_book_to_catalog
+from services.library_service import add_book_to_catalog, get_catalog_page, CATALOG_PAGE_SIZE
+from routes.http_cache import conditional
+from routes.fragment_cache import cached_catalog_fragment, render_book_rows
+from routes.streaming import stream_page
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -14,13 +16,36 @@ def index():
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@conditional('catalog')
 def catalog():
     """
-    Display all books in the catalog.
+    Display the books in the catalog, one page at a time.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    cursor = request.args.get('after', '')
+    page_size = request.args.get('page_size', CATALOG_PAGE_SIZE, type=int)
+
+    page = _catalog_page(cursor, page_size)
+    if page is None:
+        flash('Invalid catalog page.', 'error')
+        page = _catalog_page('', page_size)
+
+    return stream_page('catalog.html',
+                       books=page['books'],
+                       rows=page['rows'],
+                       page_size=page['page_size'],
+                       next_cursor=page['next_cursor'],
+                       is_first_page=not cursor)
+
+def _catalog_page(cursor, page_size):
+    """A catalog page with its table rows rendered, from the fragment cache when unchanged."""
+    def build():
+        page = get_catalog_page(cursor, page_size)
+        if page is not None:
+            page['rows'] = render_book_rows(page['books'], 'catalog')
+        return page
+
+    return cached_catalog_fragment(('catalog_page', cursor, page_size), build)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
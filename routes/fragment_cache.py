@@ -0,0 +1,76 @@
+"""
+Fragment Cache - Rendered HTML for catalog and search result tables
+"""
+
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from flask import get_template_attribute
+from markupsafe import Markup
+
+from cache import LRUCache
+from database import get_data_versions, transaction
+
+FRAGMENT_CACHE_SIZE = 4096
+FRAGMENT_CACHE_TTL = 300.0
+
+# Each process keeps its own fragments. Entries are keyed by the catalog version and by the
+# content of the row, so they stay correct when another worker changes the database.
+fragment_cache = LRUCache(FRAGMENT_CACHE_SIZE, FRAGMENT_CACHE_TTL)
+
+# Arguments to the book_row macro for each page that lists books
+ROW_STYLES = {
+    'catalog': {'placeholder': 'Patron ID (6 digits)', 'input_width': '120px'},
+    'search': {'placeholder': 'Patron ID', 'input_width': '100px'},
+}
+
+
+def init_app(app):
+    """Apply FRAGMENT_CACHE_SIZE / FRAGMENT_CACHE_TTL from the app config."""
+    fragment_cache.configure(max_size=app.config.get('FRAGMENT_CACHE_SIZE', FRAGMENT_CACHE_SIZE),
+                             ttl=app.config.get('FRAGMENT_CACHE_TTL', FRAGMENT_CACHE_TTL))
+
+
+def render_book_rows(books: List[Dict], style: str) -> Markup:
+    """
+    Render the table rows for a list of books, reusing each book's cached row.
+
+    A row is only re-rendered when the book's columns differ from the ones it was rendered
+    from, e.g. after its availability changed; the other rows come straight from the cache.
+    """
+    book_row = get_template_attribute('_book_row.html', 'book_row')
+    rows = []
+    for book in books:
+        key = ('book_row', style, book['id'])
+        signature = (book['title'], book['author'], book['isbn'],
+                     book['available_copies'], book['total_copies'])
+        token = fragment_cache.token()
+        found, cached = fragment_cache.get(key)
+        if found and cached[0] == signature:
+            rows.append(cached[1])
+            continue
+        row = book_row(book, **ROW_STYLES[style])
+        fragment_cache.set(key, (signature, row), token)
+        rows.append(row)
+    return Markup(''.join(rows))
+
+
+def cached_catalog_fragment(key: Tuple[Hashable, ...], build: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+    """
+    Get a fragment that depends only on the catalog, building and caching it on a miss.
+
+    The key is combined with the current catalog version, so any change to the books table
+    moves readers on to a new entry. The version and build() read one database snapshot,
+    so a fragment is never cached under a version older than the rows it was built from.
+    build() may return None (e.g. for an invalid cursor), which isn't cached.
+    """
+    with transaction(immediate=False):
+        version = get_data_versions('catalog')['catalog'][0]
+        full_key = key + (version,)
+        token = fragment_cache.token()
+        found, fragment = fragment_cache.get(full_key)
+        if found:
+            return fragment
+        fragment = build()
+        if fragment is not None:
+            fragment_cache.set(full_key, fragment, token)
+        return fragment
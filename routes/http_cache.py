@@ -0,0 +1,55 @@
+"""
+HTTP Caching - ETag and Last-Modified headers for read-only endpoints
+"""
+
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+from database import get_data_versions
+
+
+def conditional(*data_sets: str, daily: bool = False):
+    """
+    Answer conditional GETs for a view from the change counters of the data it reads.
+
+    The ETag and Last-Modified headers come from database.get_data_versions, a single-row
+    lookup per data set, so a client that already has the current response gets a 304 without
+    the view running its queries or rendering anything.
+
+    Args:
+        data_sets: names from database.DATA_VERSION_TABLES the view's response depends on
+        daily: the response also depends on today's date (e.g. days overdue)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # pending flash messages are rendered into the page, so it can't come from a cache
+            if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            versions = get_data_versions(*data_sets)
+            tag = '-'.join(f'{name}.{versions[name][0]}' for name in data_sets)
+            updated_at = max(versions[name][1] for name in data_sets)
+            if daily:
+                today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+                tag += f'-{today.date().isoformat()}'
+                updated_at = max(updated_at, int(today.timestamp()))
+            last_modified = datetime.fromtimestamp(updated_at, timezone.utc)
+
+            if is_resource_modified(request.environ, etag=tag, last_modified=last_modified):
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = current_app.response_class(status=304)
+
+            # weak: the same content may be sent with different encodings
+            response.set_etag(tag, weak=True)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
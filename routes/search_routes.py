@@ -4,10 +4,13 @@ Search Routes - Book search functionality
 
 from flask import Blueprint, render_template, request, flash
 from services.library_service import search_books_in_catalog
+from routes.http_cache import conditional
+from routes.fragment_cache import cached_catalog_fragment, render_book_rows
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@conditional('catalog')
 def search_books():
     """
     Search for books in the catalog.
@@ -20,9 +23,14 @@ def search_books():
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    def build():
+        books = search_books_in_catalog(search_term, search_type)
+        return {'books': books, 'rows': render_book_rows(books, 'search')}
+
+    results = cached_catalog_fragment(('search', search_type, search_term), build)
     
-    if not books:
+    if not results['books']:
         flash('Search functionality is not yet implemented.', 'error')
     
-    return render_template('search.html', books=books, search_term=search_term, search_type=search_type)
+    return render_template('search.html', books=results['books'], rows=results['rows'],
+                           search_term=search_term, search_type=search_type)
@@ -0,0 +1,39 @@
+"""
+Streaming - Send large pages while their templates are still rendering
+"""
+
+from typing import Iterable, Iterator
+
+from flask import Response, get_flashed_messages, stream_template
+
+# Characters of rendered output gathered before each write, so the page goes out in a few
+# network-sized pieces rather than one per template statement
+STREAM_CHUNK_SIZE = 8192
+
+
+def _buffered(chunks: Iterable[str], size: int) -> Iterator[str]:
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_page(template_name: str, **context) -> Response:
+    """
+    Render a template as a streamed response, so the first bytes leave before the last row
+    is rendered.
+
+    The headers (and session cookie) are sent before the template runs, so pending flash
+    messages are taken out of the session here; the template's get_flashed_messages() call
+    still sees them.
+    """
+    get_flashed_messages()
+    return Response(_buffered(stream_template(template_name, **context), STREAM_CHUNK_SIZE),
+                    mimetype='text/html')
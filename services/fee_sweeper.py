@@ -0,0 +1,94 @@
+"""
+Fee Sweeper Module - Background late fee tier updates and accruals
+Keeps the late fee state of open loans current, waking only when a loan enters a new fee tier
+or a new day starts, and posts each day's accrued fees to the fee ledger
+"""
+
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from database import day_start, get_next_loan_fee_change, sweep_loan_fees
+from services.billing_service import post_late_fee_accruals
+from services.library_service import late_fee_tier
+
+logger = logging.getLogger(__name__)
+
+# Longest the sweeper sleeps between checks. Loans inserted already overdue (imports, or a
+# changed due date) can change tier before the time the sweeper went to sleep waiting for;
+# until it wakes, calculate_late_fee_for_book computes their fees from the due date instead.
+SWEEP_MAX_INTERVAL = 3600.0  # seconds
+SWEEP_RETRY_INTERVAL = 60.0  # seconds to wait after a failed sweep
+
+
+def sweep(now: Optional[datetime] = None) -> int:
+    """Move every loan that has crossed a fee tier boundary (day 1, 8 or 19 overdue) into its new tier."""
+    return sweep_loan_fees(late_fee_tier, now)
+
+
+class FeeSweeper:
+    """
+    Background thread running sweep() whenever the next loan changes fee tier, and
+    post_late_fee_accruals() once a day.
+
+    The next change comes from the loan_fees next_change index, so between tier boundaries and
+    day starts the thread sleeps (up to max_interval) instead of polling. Several workers can
+    each run one; sweeps and accruals are idempotent and run in BEGIN IMMEDIATE transactions.
+    """
+
+    def __init__(self, max_interval: float = SWEEP_MAX_INTERVAL, retry_interval: float = SWEEP_RETRY_INTERVAL):
+        self.max_interval = max_interval
+        self.retry_interval = retry_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._accrued_on: Optional[date] = None  # the day fees were last posted to the ledger
+
+    def run_once(self) -> float:
+        """Sweep (and post the day's accruals, if not yet done) now, returning how many seconds to sleep."""
+        sweep()
+        today = date.today()
+        if self._accrued_on != today:
+            post_late_fee_accruals()
+            self._accrued_on = today
+
+        wake = day_start(today + timedelta(days=1))
+        next_change = get_next_loan_fee_change()
+        if next_change is not None:
+            wake = min(wake, next_change)
+        return min(max(wake - time.time(), 0.0), self.max_interval)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                wait = self.run_once()
+            except Exception:
+                logger.exception("Late fee sweep failed")
+                wait = self.retry_interval
+            self._stop.wait(wait)
+
+    def start(self):
+        """Start the sweeper thread, if it isn't already running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='fee-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Ask the sweeper thread to stop and wait for it to finish its current sweep."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def init_app(app) -> Optional[FeeSweeper]:
+    """Start a FeeSweeper for an app when its FEE_SWEEPER setting is true, returning it."""
+    if not app.config.get('FEE_SWEEPER', False):
+        return None
+    sweeper = FeeSweeper(app.config.get('FEE_SWEEP_MAX_INTERVAL', SWEEP_MAX_INTERVAL))
+    sweeper.start()
+    app.extensions['fee_sweeper'] = sweeper
+    return sweeper
@@ -0,0 +1,136 @@
+"""
+Import Service Module - Bulk catalog import
+Loads large vendor feeds of books (CSV or JSON Lines) into the catalog
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from database import get_existing_isbns, insert_books, transaction
+from services.library_service import validate_book
+
+IMPORT_CHUNK_SIZE = 5000
+
+
+def _read_feed(stream: TextIO, file_format: str) -> Iterator[Dict]:
+    """Yield feed rows as dicts, one at a time."""
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif file_format == 'jsonl':
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else {}
+    else:
+        raise ValueError(f"Unknown feed format: {file_format}")
+
+
+def _parse_row(row: Dict) -> Tuple[Tuple[str, str, str, int], Optional[str]]:
+    """Normalize a feed row and validate it with the R1 rules, returning (book, error)."""
+    title = str(row.get('title') or '')
+    author = str(row.get('author') or '')
+    isbn = str(row.get('isbn') or '').strip()
+
+    total_copies = row.get('total_copies')
+    try:
+        total_copies = int(str(total_copies).strip())
+    except (TypeError, ValueError):
+        return (title, author, isbn, 0), "Total copies must be a positive integer."
+
+    error = validate_book(title, author, isbn, total_copies)
+    return (title.strip(), author.strip(), isbn, total_copies), error
+
+
+def import_books(stream: TextIO, file_format: str = 'csv', chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """
+    Import a feed of books into the catalog.
+
+    Rows are read and validated in chunks. Each chunk is checked for ISBNs already in the
+    catalog with one query and inserted with executemany, all in one transaction.
+
+    Args:
+        stream: open text file with the feed
+        file_format: 'csv' (with a title,author,isbn,total_copies header) or 'jsonl'
+        chunk_size: rows read, checked and inserted per transaction
+
+    Returns:
+        dict: rows read, inserted count, rejects (row number, isbn and reason for each),
+        elapsed seconds and rows_per_sec
+    """
+    start = time.perf_counter()
+    rows = _read_feed(stream, file_format)
+
+    seen = set()  # ISBNs earlier in the feed
+    rejects: List[Dict] = []
+    inserted = 0
+    row_number = 0
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        candidates = []
+        for row in chunk:
+            row_number += 1
+            book, error = _parse_row(row)
+            isbn = book[2]
+            if not error and isbn in seen:
+                error = "Duplicate ISBN in feed."
+            if error:
+                rejects.append({'row': row_number, 'isbn': isbn, 'reason': error})
+                continue
+            seen.add(isbn)
+            candidates.append((row_number, book))
+
+        with transaction():
+            existing = get_existing_isbns([book[2] for _, book in candidates])
+            books = []
+            for number, (title, author, isbn, total_copies) in candidates:
+                if isbn in existing:
+                    rejects.append({'row': number, 'isbn': isbn, 'reason': "A book with this ISBN already exists."})
+                else:
+                    books.append((title, author, isbn, total_copies, total_copies))
+
+            if books and not insert_books(books):
+                raise RuntimeError(f"Database error while inserting rows up to {row_number}.")
+        inserted += len(books)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': row_number,
+        'inserted': inserted,
+        'rejects': sorted(rejects, key=lambda reject: reject['row']),
+        'elapsed': elapsed,
+        'rows_per_sec': row_number / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import books into the library catalog.")
+    parser.add_argument('feed', help="CSV or JSON Lines file of books")
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help="feed format (default: from file extension)")
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ('jsonl' if args.feed.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(args.feed, newline='', encoding='utf-8') as stream:
+        report = import_books(stream, file_format, args.chunk_size)
+
+    for reject in report['rejects']:
+        print(f"row {reject['row']} ({reject['isbn']}): {reject['reason']}", file=sys.stderr)
+    print(f"{report['inserted']} of {report['rows']} rows imported in {report['elapsed']:.2f}s "
+          f"({report['rows_per_sec']:.0f} rows/sec), {len(report['rejects'])} rejected")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,18 +3,62 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability,
     update_borrow_record_return_date, get_all_books, get_patron_borrowed_book,
     get_books_by_isbn, get_books_by_author, get_books_by_title,
-    get_patron_borrowed_books, get_borrow_records_by_patron
+    get_patron_borrowed_books, get_borrow_records_by_patron, transaction,
+    get_books_page, get_patron_loans, patron_has_open_loan, get_open_loan_fee,
+    post_fee_accruals, insert_fee_payment, insert_fee_refund, get_patron_fee_balance, get_fee_ledger,
+    enqueue_payment, get_open_payments, get_loan_fees_paid, get_refundable_amount
 )
-from services.payment_service import PaymentGateway
+from services.payment_service import PaymentGateway, get_default_gateway
+import base64
+import binascii
+import json
 import math
 
+# Catalog pagination
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 200
+
+# Late fee tiers as (first day overdue, fee owed the day before, daily rate)
+LATE_FEE_TIERS = [
+    (1, 0.00, 0.50),
+    (8, 3.50, 1.00),
+    (19, 15.00, 0.00),  # capped
+]
+
+def validate_book(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    """
+    Check a book's fields against the R1 catalog rules.
+
+    Returns:
+        Optional[str]: the error message for the first rule broken, or None if the book is valid
+    """
+    if not title or not title.strip():
+        return "Title is required."
+    
+    if len(title.strip()) > 200:
+        return "Title must be less than 200 characters."
+    
+    if not author or not author.strip():
+        return "Author is required."
+    
+    if len(author.strip()) > 100:
+        return "Author must be less than 100 characters."
+
+    if len(isbn) != 13 or not isbn.isdigit():
+        return "ISBN must be exactly 13 digits."
+    
+    if not isinstance(total_copies, int) or total_copies <= 0:
+        return "Total copies must be a positive integer."
+
+    return None
+
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
     Add a new book to the catalog.
@@ -30,23 +74,9 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
         tuple: (success: bool, message: str)
     """
     # Input validation
-    if not title or not title.strip():
-        return False, "Title is required."
-    
-    if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
-    
-    if not author or not author.strip():
-        return False, "Author is required."
-    
-    if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
-
-    if len(isbn) != 13 or not isbn.isdigit():
-        return False, "ISBN must be exactly 13 digits."
-    
-    if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+    error = validate_book(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -76,60 +106,68 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-    
-    if book['available_copies'] <= 0:
-        return False, "This book is currently not available."
-    
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed >= 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
+    # Run the checks and the mutation as one transaction, so two patrons can't both take the last copy
+    with transaction():
+        # Check if book exists and is available
+        book = get_book_by_id(book_id)
+        if not book:
+            return False, "Book not found."
+
+        if book['available_copies'] <= 0:
+            return False, "This book is currently not available."
+
+        # Check patron's current borrowed books count
+        current_borrowed = get_patron_borrow_count(patron_id)
+
+        if current_borrowed >= 5:
+            return False, "You have reached the maximum borrowing limit of 5 books."
+
+        if patron_has_open_loan(patron_id, book_id):
+            return False, "You have already borrowed a copy of this book"
+
+        # Create borrow record
+        borrow_date = datetime.now()
+        due_date = borrow_date + timedelta(days=14)
+
+        # Insert borrow record and update availability (a failure in either rolls back both)
+        borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
+        if not borrow_success:
+            return False, "Database error occurred while creating borrow record."
+
+        availability_success = update_book_availability(book_id, -1)
+        if not availability_success:
+            return False, "Database error occurred while updating book availability."
 
-    borrow_record = get_patron_borrowed_book(patron_id, book_id)
-    if len(borrow_record) > 0:
-        return False, "You have already borrowed a copy of this book"
-    
-    # Create borrow record
-    borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
-    
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
-        return False, "Database error occurred while creating borrow record."
-    
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
-    
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
 def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Process book return by a patron.
     """
-    book = get_book_by_id(book_id)
+    with transaction():
+        book = get_book_by_id(book_id)
 
-    if not book:
-        return False, "Entered book does not exist"
+        if not book:
+            return False, "Entered book does not exist"
 
-    borrow_records = get_patron_borrowed_book(patron_id, book_id)
+        borrow_records = get_patron_borrowed_book(patron_id, book_id)
 
-    if len(borrow_records) < 1:
-        return False, "Patron is not currently borrowing this book"
+        if len(borrow_records) < 1:
+            return False, "Patron is not currently borrowing this book"
 
-    late_fee = calculate_late_fee_for_book(patron_id, book_id)
+        # the fee stops growing once the book is back, so bring the ledger up to its final amount
+        late_fee = calculate_late_fee_for_book(patron_id, book_id)
+        if late_fee['fee_amount'] > 0:
+            try:
+                post_fee_accruals([(borrow_records[0]['borrow_id'], patron_id, book_id, late_fee['fee_amount'])])
+            except Exception as e:
+                return False, "Failed to record late fee"
 
-    if not update_book_availability(book_id, 1):
-        return False, "Failed to update book availability"
+        if not update_book_availability(book_id, 1):
+            return False, "Failed to update book availability"
 
-    if not update_borrow_record_return_date(patron_id, book_id, datetime.now()):
-        return False, "Failed to update book availability"
+        if not update_borrow_record_return_date(patron_id, book_id, datetime.now()):
+            return False, "Failed to update book availability"
 
     return True, "Book successfully returned"
 
@@ -137,49 +175,117 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     """calculate late fee for latest book for patron"""
 
-    books = get_patron_borrowed_book(patron_id, book_id)
+    loan_fee = get_open_loan_fee(patron_id, book_id)
 
-    if len(books) < 1:
+    if loan_fee is None:
         return {  # return the calculated values
             'fee_amount': 0.00,
             'days_overdue': -1,
             'status': 'This patron has not borrowed this book'
         }
 
-    borrowed_book = books[0]
-    is_overdue = borrowed_book['is_overdue']
-    due_date = borrowed_book['due_date']
-    access_time = borrowed_book['access_time']
-    days_overdue = (access_time.date() - due_date.date()).days
+    days_overdue = loan_fee['days_overdue']
 
-    if not is_overdue or days_overdue < 1:
+    if days_overdue < 1:
         return {  # return the calculated values
             'fee_amount': 0.00,
             'days_overdue': 0,
             'status': 'This borrowed book is not due yet'
         }
 
-    if days_overdue >= 19:
-        return {  # return the calculated values
-            'fee_amount': 15.00,
-            'days_overdue': days_overdue,
-            'status': 'Overdue fee calculation successful'
-        }
-
-    fee = 0.0
-    if days_overdue > 7:
-        fee += (days_overdue - 7)
-        fee += 7 * 0.5
+    # the fee tier stored by the sweeper, unless the loan has crossed into another since
+    if loan_fee['fee_current']:
+        fee_amount = loan_fee['fee_base'] + loan_fee['fee_rate'] * (days_overdue - loan_fee['tier_start'] + 1)
     else:
-        fee += days_overdue*0.5
-    
+        fee_amount = late_fee_for_days_overdue(days_overdue)
+
     return {  # return the calculated values
-        'fee_amount': fee,
+        'fee_amount': fee_amount,
         'days_overdue': days_overdue,
         'status': 'Overdue fee calculation successful'
     }
 
 
+def late_fee_tier(days_overdue: int) -> Tuple[int, float, float, Optional[int]]:
+    """
+    The late fee tier a book is in on a given day overdue.
+
+    Returns:
+        tuple: (first day of the tier, fee owed the day before it, daily rate, first day of the
+        next tier or None once capped); before the first day overdue this is (0, 0.0, 0.0, 1)
+    """
+    tier = (0, 0.0, 0.0)
+    next_tier = None
+    for first_day, fee_before, rate in LATE_FEE_TIERS:
+        if days_overdue < first_day:
+            next_tier = first_day
+            break
+        tier = (first_day, fee_before, rate)
+    return tier + (next_tier,)
+
+
+def late_fee_for_days_overdue(days_overdue: int) -> float:
+    """
+    Late fee for a book that is a given number of days overdue.
+
+    $0.50/day for the first 7 days, $1.00/day after that, capped at $15.00.
+    """
+    first_day, fee_before, rate, _ = late_fee_tier(days_overdue)
+    return fee_before + rate * (days_overdue - first_day + 1)
+
+
+
+def encode_catalog_cursor(book: Dict) -> str:
+    """Encode the position of a book in catalog order as an opaque, URL-safe cursor."""
+    position = json.dumps([book['title'], book['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(position).decode('ascii')
+
+
+def decode_catalog_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """Decode a cursor from encode_catalog_cursor, returning None if it is malformed."""
+    try:
+        title, book_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError, binascii.Error):
+        return None
+
+    if not isinstance(title, str) or not isinstance(book_id, int):
+        return None
+
+    return title, book_id
+
+
+def get_catalog_page(cursor: str = "", page_size: int = CATALOG_PAGE_SIZE) -> Optional[Dict]:
+    """
+    Get one page of the catalog, ordered by title.
+
+    Args:
+        cursor: next_cursor from the previous page, or "" for the first page
+        page_size: books per page, clamped to 1..CATALOG_MAX_PAGE_SIZE
+
+    Returns:
+        dict: books, page_size and next_cursor (None on the last page), or None if the cursor is invalid
+    """
+    page_size = max(1, min(page_size, CATALOG_MAX_PAGE_SIZE))
+
+    after = None
+    if cursor:
+        after = decode_catalog_cursor(cursor)
+        if after is None:
+            return None
+
+    # fetch one extra row to find out whether there is another page
+    books = get_books_page(after, page_size + 1)
+    next_cursor = None
+    if len(books) > page_size:
+        books = books[:page_size]
+        next_cursor = encode_catalog_cursor(books[-1])
+
+    return {
+        'books': books,
+        'page_size': page_size,
+        'next_cursor': next_cursor,
+    }
+
 
 def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     """
@@ -201,16 +307,39 @@ def get_patron_status_report(patron_id: str) -> Dict:
     Get status report for a patron.
     """
 
-    # get all borrowed books, sorted by earliest due date
-    outstanding_books = get_patron_borrowed_books(patron_id)
+    # one query for the whole history, open and returned, by when borrowed
+    loans = get_patron_loans(patron_id)
+
+    outstanding_books = []
+    records = []
+    first_days_overdue = {}  # book_id -> days overdue of the earliest open loan, which calculate_late_fee_for_book charges
+    for loan in loans:
+        return_date = loan['return_date']
+
+        records.append({
+            'book_id': loan['book_id'],
+            'title': loan['title'],
+            'author': loan['author'],
+            'borrow_date': loan['borrow_date'],
+            'return_date': return_date or "Outstanding",
+            'not_returned': return_date is None
+        })
+
+        if return_date is None:
+            first_days_overdue.setdefault(loan['book_id'], loan['days_overdue'])
+            outstanding_books.append({
+                'book_id': loan['book_id'],
+                'title': loan['title'],
+                'author': loan['author'],
+                'borrow_date': loan['borrow_date'],
+                'due_date': loan['due_date'],
+                'is_overdue': loan['days_overdue'] > 0
+            })
 
     # Calculate total late fees for each
     late_fee = 0.0
     for outstanding_book in outstanding_books:
-        late_fee += calculate_late_fee_for_book(patron_id, outstanding_book['book_id'])['fee_amount']
-
-    # get History of books borrowed by when borrowed
-    records = get_borrow_records_by_patron(patron_id)
+        late_fee += late_fee_for_days_overdue(first_days_overdue[outstanding_book['book_id']])
 
     return {
         'outstanding_books': outstanding_books,
@@ -253,7 +382,10 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
     if not fee_info or 'fee_amount' not in fee_info:
         return False, "Unable to calculate late fees.", None
 
+    # only what is still owed: the fee less whatever has been paid on the loan already
     fee_amount = fee_info.get('fee_amount', 0.0)
+    if fee_amount > 0:
+        fee_amount = round(fee_amount - late_fee_paid(patron_id, book_id), 2)
 
     if fee_amount <= 0:
         return False, "No late fees to pay for this book.", None
@@ -263,9 +395,9 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
     if not book:
         return False, "Book not found.", None
 
-    # Use provided gateway or create new one
+    # Use provided gateway or the shared one
     if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        payment_gateway = get_default_gateway()
 
     # Process payment through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
@@ -277,6 +409,7 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         )
 
         if success:
+            record_late_fee_payment(patron_id, [(book_id, fee_amount)], transaction_id)
             return True, f"Payment successful! {message}", transaction_id
         else:
             return False, f"Payment failed: {message}", None
@@ -286,6 +419,222 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         return False, f"Payment processing error: {str(e)}", None
 
 
+def late_fee_paid(patron_id: str, book_id: int) -> float:
+    """What has been paid (less refunds) towards the late fee on a patron's open loan of a book."""
+    open_loans = get_patron_borrowed_book(patron_id, book_id)
+    if not open_loans:
+        return 0.0
+    borrow_id = open_loans[0]['borrow_id']
+    return get_loan_fees_paid([borrow_id]).get(borrow_id, 0.0)
+
+
+def record_late_fee_payment(patron_id: str, book_fees: List[Tuple[int, float]], transaction_id: str) -> bool:
+    """
+    Record a successful gateway charge in the fee ledger: the fee on each book first accrues
+    (up to the loan's fee so far), then one payment entry per book. A payment of more than the
+    fee leaves the patron in credit, with a negative balance.
+
+    The gateway has already taken the money, so callers report the payment as successful even
+    if recording it fails.
+    """
+    try:
+        with transaction():
+            accruals = []
+            borrow_ids = {}
+            for book_id, fee_amount in book_fees:
+                open_loans = get_patron_borrowed_book(patron_id, book_id)
+                if open_loans:
+                    borrow_ids[book_id] = open_loans[0]['borrow_id']
+                    loan_fee = calculate_late_fee_for_book(patron_id, book_id)['fee_amount']
+                    if loan_fee > 0:
+                        accruals.append((borrow_ids[book_id], patron_id, book_id, loan_fee))
+            post_fee_accruals(accruals)
+            for book_id, fee_amount in book_fees:
+                if not insert_fee_payment(patron_id, book_id, fee_amount, transaction_id, borrow_ids.get(book_id)):
+                    return False
+        return True
+    except Exception as e:
+        return False
+
+
+def late_fee_idempotency_key(patron_id: str, book_fees: List[Tuple[int, float]], day: Optional[date] = None) -> str:
+    """
+    Idempotency key of a late fee payment, from the patron, the books and the amount.
+
+    The day is part of it, so the same fees requested twice in a day (a double submit, a client
+    retrying) are charged once, while a fee that is still owed can be paid again later.
+    """
+    books = ",".join(str(book_id) for book_id, _ in sorted(book_fees))
+    amount = sum(fee_amount for _, fee_amount in book_fees)
+    return f"late-fees:{patron_id}:{books}:{amount:.2f}:{(day or date.today()).isoformat()}"
+
+
+def request_late_fee_payment(patron_id: str, book_id: Optional[int] = None) -> Tuple[bool, str, Optional[Dict]]:
+    """
+    Queue the payment of a patron's late fees on one book (or, without book_id, on all their
+    overdue books) for the payment workers, instead of waiting on the gateway.
+
+    Requesting the same payment again the same day returns the entry already queued (or paid);
+    a payment that was declined is queued again. Fees that another queued payment already
+    charges are left out, so a book is never charged twice, and a payment the gateway charged
+    but that could not be recorded is never queued again.
+
+    Returns:
+        tuple: (success: bool, message: str, payment: the payment outbox entry or None), where
+        the message follows the entry's status
+    """
+    # Validate patron ID
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", None
+
+    # Read what is owed and queue it as one transaction, so two requests can't both queue a fee
+    with transaction():
+        if book_id is None:
+            fees = get_patron_late_fees(patron_id)
+            if not fees:
+                return False, "No late fees to pay.", None
+        else:
+            fee_amount = calculate_late_fee_for_book(patron_id, book_id).get('fee_amount', 0.0)
+            if fee_amount > 0:
+                fee_amount = round(fee_amount - late_fee_paid(patron_id, book_id), 2)
+            if fee_amount <= 0:
+                return False, "No late fees to pay for this book.", None
+            book = get_book_by_id(book_id)
+            if not book:
+                return False, "Book not found.", None
+            fees = [{'book_id': book_id, 'title': book['title'], 'fee_amount': fee_amount}]
+
+        open_payments = get_open_payments(patron_id)
+        key = late_fee_idempotency_key(patron_id, [(fee['book_id'], fee['fee_amount']) for fee in fees])
+        repeated = [payment for payment in open_payments if payment['idempotency_key'].partition('#')[0] == key]
+        if repeated:
+            payment = repeated[-1]
+        else:
+            # the open payments will charge (or have charged) their fees, so leave those out
+            queued = {}
+            for payment in open_payments:
+                for queued_book_id, queued_amount in payment['book_fees']:
+                    queued[queued_book_id] = queued.get(queued_book_id, 0.0) + queued_amount
+            fees = [dict(fee, fee_amount=round(fee['fee_amount'] - queued.get(fee['book_id'], 0.0), 2))
+                    for fee in fees]
+            fees = [fee for fee in fees if fee['fee_amount'] > 0]
+            if not fees:
+                return False, "These late fees are already queued for payment.", None
+
+            book_fees = [(fee['book_id'], fee['fee_amount']) for fee in fees]
+            if book_id is None:
+                items = ", ".join(f"'{fee['title']}' (${fee['fee_amount']:.2f})" for fee in fees)
+                description = f"Late fees for {len(fees)} book(s): {items}"
+            else:
+                description = f"Late fees for '{book['title']}'"
+            amount = sum(fee_amount for _, fee_amount in book_fees)
+            payment = enqueue_payment(late_fee_idempotency_key(patron_id, book_fees), patron_id, book_fees,
+                                      amount, description)
+
+    if payment['status'] == 'succeeded':
+        return True, f"Payment of ${payment['amount']:.2f} already made.", payment
+    if payment['status'] == 'failed':
+        return False, (f"Payment of ${payment['amount']:.2f} was charged ({payment['transaction_id']}) "
+                       f"but not recorded: {payment['last_error']}"), payment
+    if payment['last_error']:
+        return True, f"Payment of ${payment['amount']:.2f} queued, retrying after: {payment['last_error']}", payment
+    return True, f"Payment of ${payment['amount']:.2f} queued.", payment
+
+
+def get_patron_fee_account(patron_id: str) -> Dict:
+    """
+    Get a patron's late fee balance and the ledger entries behind it.
+
+    The balance only includes fees posted to the ledger: on return, on payment and by the
+    daily accrual in the fee sweeper.
+
+    Returns:
+        dict: patron_id, balance and entries (accruals, payments and refunds, oldest first)
+    """
+    return {
+        'patron_id': patron_id,
+        'balance': get_patron_fee_balance(patron_id),
+        'entries': get_fee_ledger(patron_id),
+    }
+
+
+def get_patron_late_fees(patron_id: str) -> List[Dict]:
+    """
+    Get the late fee still owed on each of a patron's overdue books: the fee so far less what
+    the fee ledger shows already paid on the loan.
+
+    Like calculate_late_fee_for_book, each book is charged once, on its earliest open loan.
+
+    Returns:
+        list: dicts with book_id, title, days_overdue and fee_amount, for books with a fee owed
+    """
+    loans = {}
+    for loan in get_patron_loans(patron_id, open_only=True):
+        loans.setdefault(loan['book_id'], loan)
+    paid = get_loan_fees_paid(loan['id'] for loan in loans.values() if loan['days_overdue'] > 0)
+
+    fees = []
+    for loan in loans.values():
+        days_overdue = loan['days_overdue']
+        fee_amount = round(late_fee_for_days_overdue(days_overdue) - paid.get(loan['id'], 0.0), 2)
+        if fee_amount > 0:
+            fees.append({
+                'book_id': loan['book_id'],
+                'title': loan['title'],
+                'days_overdue': days_overdue,
+                'fee_amount': fee_amount
+            })
+
+    return fees
+
+
+def pay_all_late_fees(patron_id: str, payment_gateway: PaymentGateway = None) -> Tuple[
+    bool, str, Optional[str], List[Dict]]:
+    """
+    Pay the late fees on all of a patron's overdue books with a single gateway charge.
+
+    Args:
+        patron_id: 6-digit library card ID
+        payment_gateway: Payment gateway instance (injectable for testing)
+
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str], breakdown: list)
+        where breakdown lists the book_id, title, days_overdue and fee_amount of each book paid for
+    """
+    # Validate patron ID
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", None, []
+
+    breakdown = get_patron_late_fees(patron_id)
+    if not breakdown:
+        return False, "No late fees to pay.", None, []
+
+    total = sum(fee['fee_amount'] for fee in breakdown)
+    items = ", ".join(f"'{fee['title']}' (${fee['fee_amount']:.2f})" for fee in breakdown)
+
+    # Use provided gateway or the shared one
+    if payment_gateway is None:
+        payment_gateway = get_default_gateway()
+
+    try:
+        success, transaction_id, message = payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=total,
+            description=f"Late fees for {len(breakdown)} book(s): {items}"
+        )
+
+        if success:
+            record_late_fee_payment(patron_id, [(fee['book_id'], fee['fee_amount']) for fee in breakdown],
+                                     transaction_id)
+            return True, f"Payment successful! {message}", transaction_id, breakdown
+        else:
+            return False, f"Payment failed: {message}", None, breakdown
+
+    except Exception as e:
+        # Handle payment gateway errors
+        return False, f"Payment processing error: {str(e)}", None, breakdown
+
+
 def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
     """
     Refund a late fee payment (e.g., if book was returned on time but fees were charged in error).
@@ -310,9 +659,15 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     if amount > 15.00:  # Maximum late fee per book
         return False, "Refund amount exceeds maximum late fee."
 
-    # Use provided gateway or create new one
+    # A payment in the fee ledger is refunded by no more than is left of it; payments made
+    # before the ledger existed aren't in it, so only the checks above apply to them
+    refundable = get_refundable_amount(transaction_id)
+    if refundable is not None and round(amount, 2) > round(refundable, 2):
+        return False, f"Refund amount exceeds the ${refundable:.2f} left to refund on this payment."
+
+    # Use provided gateway or the shared one
     if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        payment_gateway = get_default_gateway()
 
     # Process refund through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN YOUR TESTS!
@@ -320,6 +675,7 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         success, message = payment_gateway.refund_payment(transaction_id, amount)
 
         if success:
+            insert_fee_refund(transaction_id, amount)
             return True, message
         else:
             return False, f"Refund failed: {message}"
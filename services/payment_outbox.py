@@ -0,0 +1,175 @@
+"""
+Payment Outbox Module - Durable, retrying late fee payments
+Workers drain the payment_outbox table through the payment gateway, so web requests only enqueue
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from database import claim_payment, get_next_payment_attempt, transaction, update_payment
+from services.library_service import record_late_fee_payment
+from services.payment_service import PaymentGateway, get_default_gateway
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_WORKERS = 4  # gateway calls in flight at once, per process
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 2.0  # seconds before the first retry, doubling after each failed attempt
+BACKOFF_MAX = 300.0  # seconds
+# How long a claimed payment is left to its worker before others may retry it. Longer than a
+# gateway call can take (see AsyncPaymentGateway's timeout), so only a dead worker's lease expires.
+LEASE = 60.0  # seconds
+# Longest an idle worker sleeps without checking the outbox, to pick up payments queued by
+# other processes (those queued in this one wake it straight away)
+POLL_INTERVAL = 30.0  # seconds
+
+
+def backoff_delay(attempts: int, base: float = BACKOFF_BASE, maximum: float = BACKOFF_MAX) -> float:
+    """Seconds to wait before retrying a payment that has failed `attempts` times."""
+    return min(base * 2 ** (attempts - 1), maximum)
+
+
+class PaymentWorkerPool:
+    """
+    Threads draining the payment outbox through the gateway.
+
+    Each worker claims the payment due longest (see database.claim_payment), charges it with
+    its idempotency key and records the outcome:
+
+    - success: the entry is marked succeeded and the payment recorded in the fee ledger, in one
+      transaction
+    - declined by the gateway: the entry is marked failed, without retrying
+    - an exception (network error, timeout), or a charge that could not be recorded: retried
+      after an exponential backoff, up to max_attempts, then marked failed (keeping the
+      transaction id of a charge that was taken, for reconciling by hand)
+
+    A worker that dies mid-call leaves its payment claimed until the lease runs out; the retry
+    reuses the idempotency key, so the gateway won't charge twice. Workers in several
+    processes can drain the same outbox, since claims are BEGIN IMMEDIATE transactions.
+    """
+
+    def __init__(self, workers: int = PAYMENT_WORKERS, gateway: Optional[PaymentGateway] = None,
+                 max_attempts: int = MAX_ATTEMPTS, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX, lease: float = LEASE, poll_interval: float = POLL_INTERVAL):
+        self.workers = workers
+        self.gateway = gateway
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._wake = threading.Condition()
+        self._generation = 0  # bumped by notify(), so a wake-up can't be missed between checks
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+
+    def _retry_or_fail(self, payment: Dict, error: str, transaction_id: Optional[str] = None):
+        """After a failed attempt, schedule the next one with backoff, or give up after max_attempts."""
+        if payment['attempts'] >= self.max_attempts:
+            update_payment(payment['id'], 'failed', transaction_id=transaction_id, last_error=error)
+        else:
+            retry_at = time.time() + backoff_delay(payment['attempts'], self.backoff_base, self.backoff_max)
+            update_payment(payment['id'], 'pending', next_attempt_at=retry_at, transaction_id=transaction_id,
+                           last_error=error)
+
+    def process(self, payment: Dict):
+        """Make one attempt at a claimed payment and record the outcome."""
+        gateway = self.gateway or get_default_gateway()
+        try:
+            success, transaction_id, message = gateway.process_payment(
+                patron_id=payment['patron_id'],
+                amount=payment['amount'],
+                description=payment['description'],
+                idempotency_key=payment['idempotency_key']
+            )
+        except Exception as e:
+            self._retry_or_fail(payment, f"Payment processing error: {str(e)}")
+            return
+
+        if not success:
+            update_payment(payment['id'], 'failed', last_error=f"Payment failed: {message}")
+            return
+
+        try:
+            with transaction():
+                if not record_late_fee_payment(payment['patron_id'], payment['book_fees'], transaction_id):
+                    raise RuntimeError("could not record it in the fee ledger")
+                if not update_payment(payment['id'], 'succeeded', transaction_id=transaction_id):
+                    raise RuntimeError("could not mark it succeeded")
+        except Exception as e:
+            # the gateway has the money; retrying replays the charge for its key and records it again
+            logger.exception("Payment %s was charged (%s) but not recorded", payment['id'], transaction_id)
+            self._retry_or_fail(payment, f"Payment {transaction_id} not recorded: {str(e)}", transaction_id)
+
+    def drain(self) -> int:
+        """Process payments in this thread until none is due, returning how many attempts were made."""
+        attempts = 0
+        while True:
+            payment = claim_payment(self.lease)
+            if payment is None:
+                return attempts
+            self.process(payment)
+            attempts += 1
+
+    def _idle_wait(self) -> float:
+        next_attempt = get_next_payment_attempt()
+        if next_attempt is None:
+            return self.poll_interval
+        return min(max(next_attempt - time.time(), 0.0), self.poll_interval)
+
+    def _run(self):
+        while True:
+            with self._wake:
+                if self._stopping:
+                    return
+                seen = self._generation
+            try:
+                payment = claim_payment(self.lease)
+                if payment is not None:
+                    self.process(payment)
+                    continue
+                wait = self._idle_wait()
+            except Exception:
+                logger.exception("Payment worker failed")
+                wait = self.poll_interval
+            with self._wake:
+                if self._generation == seen and not self._stopping:
+                    self._wake.wait(wait)
+
+    def notify(self):
+        """Wake idle workers, e.g. after a payment was queued."""
+        with self._wake:
+            self._generation += 1
+            self._wake.notify_all()
+
+    def start(self):
+        """Start the worker threads, if they aren't already running."""
+        if self._threads:
+            return
+        self._stopping = False
+        self._threads = [threading.Thread(target=self._run, name=f'payment-worker-{i}', daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Ask the workers to stop and wait for them to finish the payments they hold."""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+def init_app(app) -> Optional[PaymentWorkerPool]:
+    """Start a PaymentWorkerPool of PAYMENT_WORKERS threads for an app (none when 0), returning it."""
+    workers = int(app.config.get('PAYMENT_WORKERS', 0))
+    if workers <= 0:
+        return None
+    pool = PaymentWorkerPool(workers)
+    pool.start()
+    app.extensions['payment_workers'] = pool
+    return pool
@@ -6,11 +6,72 @@ For Assignment 3: You will learn to mock this service in their tests
 since we cannot make actual payment API calls during testing.
 """
 
+import asyncio
+import threading
 import requests
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 import time
 
 
+# The gateway responses below are shared by the blocking and asyncio clients.
+
+# Responses of the simulated charges endpoint by idempotency key, so repeating a charge with
+# the same key returns the original result instead of charging again (as real gateways do)
+_idempotent_charges: Dict[str, Tuple[bool, str, str]] = {}
+_idempotent_charges_lock = threading.Lock()
+
+
+def _simulate_payment(patron_id: str, amount: float, idempotency_key: Optional[str] = None) -> Tuple[bool, str, str]:
+    """Simulated response of the charges endpoint."""
+    if idempotency_key is not None:
+        with _idempotent_charges_lock:
+            if idempotency_key not in _idempotent_charges:
+                _idempotent_charges[idempotency_key] = _simulate_payment(patron_id, amount)
+            return _idempotent_charges[idempotency_key]
+
+    # For this template, we simulate different scenarios based on amount
+    # This allows testing without a real API
+
+    if amount <= 0:
+        return False, "", "Invalid amount: must be greater than 0"
+
+    if amount > 1000:
+        return False, "", "Payment declined: amount exceeds limit"
+
+    if len(patron_id) != 6:
+        return False, "", "Invalid patron ID format"
+
+    # Simulate successful payment
+    transaction_id = f"txn_{patron_id}_{int(time.time())}"
+    return True, transaction_id, f"Payment of ${amount:.2f} processed successfully"
+
+
+def _simulate_refund(transaction_id: str, amount: float) -> Tuple[bool, str]:
+    """Simulated response of the refunds endpoint."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return False, "Invalid transaction ID"
+
+    if amount <= 0:
+        return False, "Invalid refund amount"
+
+    refund_id = f"refund_{transaction_id}_{int(time.time())}"
+    return True, f"Refund of ${amount:.2f} processed successfully. Refund ID: {refund_id}"
+
+
+def _simulate_status(transaction_id: str) -> Dict:
+    """Simulated response of the transaction status endpoint."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return {"status": "not_found", "message": "Transaction not found"}
+
+    # Simulate status check
+    return {
+        "transaction_id": transaction_id,
+        "status": "completed",
+        "amount": 10.50,
+        "timestamp": time.time()
+    }
+
+
 class PaymentGateway:
     """
     Simulates an external payment gateway API.
@@ -22,6 +83,11 @@ class PaymentGateway:
     - Incurring costs or rate limits
     """
 
+    # Simulated network latency of each call, in seconds
+    PROCESS_DELAY = 0.5
+    REFUND_DELAY = 0.5
+    STATUS_DELAY = 0.3
+
     def __init__(self, api_key: str = "test_key_12345"):
         """
         Initialize payment gateway with API credentials.
@@ -32,7 +98,8 @@ class PaymentGateway:
         self.api_key = api_key
         self.base_url = "https://api.payment-gateway.example.com"
 
-    def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+    def process_payment(self, patron_id: str, amount: float, description: str = "",
+                        idempotency_key: Optional[str] = None) -> Tuple[bool, str, str]:
         """
         Process a payment through the external gateway.
 
@@ -43,6 +110,8 @@ class PaymentGateway:
             patron_id: 6-digit patron/customer ID
             amount: Payment amount in dollars
             description: Payment description
+            idempotency_key: sent as the Idempotency-Key header; the gateway answers a repeated
+                key with the original result instead of charging again
 
         Returns:
             tuple: (success: bool, transaction_id: str, message: str)
@@ -52,12 +121,12 @@ class PaymentGateway:
             success, txn_id, msg = gateway.process_payment("123456", 10.50, "Late fees")
         """
         # Simulate API call delay
-        time.sleep(0.5)
+        time.sleep(self.PROCESS_DELAY)
 
         # In a real implementation, this would make an HTTP request:
         # response = requests.post(
         #     f"{self.base_url}/charges",
-        #     headers={"Authorization": f"Bearer {self.api_key}"},
+        #     headers={"Authorization": f"Bearer {self.api_key}", "Idempotency-Key": idempotency_key},
         #     json={
         #         "customer_id": patron_id,
         #         "amount": amount,
@@ -66,21 +135,7 @@ class PaymentGateway:
         #     }
         # )
 
-        # For this template, we simulate different scenarios based on amount
-        # This allows testing without a real API
-
-        if amount <= 0:
-            return False, "", "Invalid amount: must be greater than 0"
-
-        if amount > 1000:
-            return False, "", "Payment declined: amount exceeds limit"
-
-        if len(patron_id) != 6:
-            return False, "", "Invalid patron ID format"
-
-        # Simulate successful payment
-        transaction_id = f"txn_{patron_id}_{int(time.time())}"
-        return True, transaction_id, f"Payment of ${amount:.2f} processed successfully"
+        return _simulate_payment(patron_id, amount, idempotency_key)
 
     def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
         """
@@ -96,16 +151,9 @@ class PaymentGateway:
         Returns:
             tuple: (success: bool, message: str)
         """
-        time.sleep(0.5)
-
-        if not transaction_id or not transaction_id.startswith("txn_"):
-            return False, "Invalid transaction ID"
+        time.sleep(self.REFUND_DELAY)
 
-        if amount <= 0:
-            return False, "Invalid refund amount"
-
-        refund_id = f"refund_{transaction_id}_{int(time.time())}"
-        return True, f"Refund of ${amount:.2f} processed successfully. Refund ID: {refund_id}"
+        return _simulate_refund(transaction_id, amount)
 
     def verify_payment_status(self, transaction_id: str) -> Dict:
         """
@@ -120,15 +168,132 @@ class PaymentGateway:
         Returns:
             dict: Payment status information
         """
-        time.sleep(0.3)
-
-        if not transaction_id or not transaction_id.startswith("txn_"):
-            return {"status": "not_found", "message": "Transaction not found"}
-
-        # Simulate status check
-        return {
-            "transaction_id": transaction_id,
-            "status": "completed",
-            "amount": 10.50,
-            "timestamp": time.time()
-        }
\ No newline at end of file
+        time.sleep(self.STATUS_DELAY)
+
+        return _simulate_status(transaction_id)
+
+
+class AsyncPaymentGateway:
+    """
+    asyncio client for the payment gateway.
+
+    Calls wait on the event loop instead of blocking a thread, so many payments can be in
+    flight at once. Concurrency is bounded by a semaphore shared by all calls on this client,
+    and every call is cancelled if it takes longer than the timeout.
+    """
+
+    PROCESS_DELAY = PaymentGateway.PROCESS_DELAY
+    REFUND_DELAY = PaymentGateway.REFUND_DELAY
+    STATUS_DELAY = PaymentGateway.STATUS_DELAY
+
+    def __init__(self, api_key: str = "test_key_12345", max_concurrency: int = 100, timeout: float = 10.0):
+        """
+        Initialize payment gateway client.
+
+        Args:
+            api_key: API key for authentication (default is test key)
+            max_concurrency: maximum number of calls in flight at once
+            timeout: seconds before a call is abandoned with asyncio.TimeoutError
+        """
+        self.api_key = api_key
+        self.base_url = "https://api.payment-gateway.example.com"
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _limit(self) -> asyncio.Semaphore:
+        # created lazily so it binds to the loop the client is first used on
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _call(self, delay: float, respond, *args):
+        async def request():
+            async with self._limit():
+                await asyncio.sleep(delay)
+                return respond(*args)
+
+        return await asyncio.wait_for(request(), self.timeout)
+
+    async def process_payment(self, patron_id: str, amount: float, description: str = "",
+                              idempotency_key: Optional[str] = None) -> Tuple[bool, str, str]:
+        """Process a payment, see PaymentGateway.process_payment."""
+        return await self._call(self.PROCESS_DELAY, _simulate_payment, patron_id, amount, idempotency_key)
+
+    async def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """Refund a previous payment, see PaymentGateway.refund_payment."""
+        return await self._call(self.REFUND_DELAY, _simulate_refund, transaction_id, amount)
+
+    async def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Check the status of a payment transaction, see PaymentGateway.verify_payment_status."""
+        return await self._call(self.STATUS_DELAY, _simulate_status, transaction_id)
+
+    async def process_payments(self, payments: List[Dict]) -> List[Tuple[bool, str, str]]:
+        """
+        Process many payments concurrently.
+
+        Args:
+            payments: keyword arguments for process_payment, one dict per payment
+
+        Returns:
+            list: process_payment results in the same order, with failures as (False, "", error)
+        """
+        results = await asyncio.gather(*(self.process_payment(**payment) for payment in payments),
+                                       return_exceptions=True)
+        return [result if not isinstance(result, BaseException) else (False, "", f"Payment error: {result!r}")
+                for result in results]
+
+
+class SyncPaymentGateway(PaymentGateway):
+    """
+    Blocking facade over AsyncPaymentGateway, usable wherever a PaymentGateway is expected.
+
+    All instances share one background event loop thread, so calls from many worker threads
+    are multiplexed onto the same loop and the same concurrency limit.
+    """
+
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _loop_lock = threading.Lock()
+
+    def __init__(self, api_key: str = "test_key_12345", max_concurrency: int = 100, timeout: float = 10.0):
+        super().__init__(api_key)
+        self.client = AsyncPaymentGateway(api_key, max_concurrency=max_concurrency, timeout=timeout)
+
+    @classmethod
+    def _event_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls._loop_lock:
+            if cls._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="payment-gateway-loop", daemon=True).start()
+                cls._loop = loop
+            return cls._loop
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._event_loop()).result()
+
+    def process_payment(self, patron_id: str, amount: float, description: str = "",
+                        idempotency_key: Optional[str] = None) -> Tuple[bool, str, str]:
+        return self._run(self.client.process_payment(patron_id, amount, description, idempotency_key))
+
+    def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        return self._run(self.client.refund_payment(transaction_id, amount))
+
+    def verify_payment_status(self, transaction_id: str) -> Dict:
+        return self._run(self.client.verify_payment_status(transaction_id))
+
+    def process_payments(self, payments: List[Dict]) -> List[Tuple[bool, str, str]]:
+        """Process many payments concurrently, see AsyncPaymentGateway.process_payments."""
+        return self._run(self.client.process_payments(payments))
+
+
+_default_gateway: Optional[SyncPaymentGateway] = None
+_default_gateway_lock = threading.Lock()
+
+
+def get_default_gateway() -> PaymentGateway:
+    """Get the shared gateway client used when callers don't inject their own."""
+    global _default_gateway
+    with _default_gateway_lock:
+        if _default_gateway is None:
+            _default_gateway = SyncPaymentGateway()
+        return _default_gateway
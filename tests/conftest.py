@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+
+from database import insert_borrow_record
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture
+def borrow_overdue():
+    """Borrow a book for a patron with a due date the given number of days ago."""
+    def borrow(patron_id, book_id, days_overdue):
+        due_date = datetime.now() - timedelta(days=days_overdue)
+        assert insert_borrow_record(patron_id, book_id, due_date - timedelta(days=14), due_date)
+    return borrow
+
+
+@pytest.fixture
+def payment_gateway():
+    """
+    Build a mock PaymentGateway whose process_payment calls return (or raise) the given results
+    in turn, and whose refunds succeed.
+    """
+    def gateway(*results):
+        mock_payment_gateway = Mock(spec=PaymentGateway)
+        mock_payment_gateway.process_payment.side_effect = list(results)
+        mock_payment_gateway.refund_payment.return_value = (True, "Refund processed successfully")
+        return mock_payment_gateway
+    return gateway
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from services.library_service import pay_late_fees, refund_late_fee_payment
+from services.payment_service import AsyncPaymentGateway, SyncPaymentGateway
+
+
+def fast_gateway(cls, **kwargs):
+    """Create a gateway client with a short simulated network delay."""
+    gateway = cls(**kwargs)
+    client = gateway if isinstance(gateway, AsyncPaymentGateway) else gateway.client
+    client.PROCESS_DELAY = client.REFUND_DELAY = client.STATUS_DELAY = 0.05
+    return gateway
+
+
+def test_async_results_match_blocking_gateway():
+    gateway = fast_gateway(AsyncPaymentGateway)
+
+    success, transaction_id, message = asyncio.run(gateway.process_payment("123456", 10.5, "Late fees"))
+    assert success
+    assert transaction_id.startswith("txn_123456_")
+    assert message == "Payment of $10.50 processed successfully"
+
+    success, transaction_id, message = asyncio.run(gateway.process_payment("123456", 1500))
+    assert not success
+    assert "exceeds limit" in message
+
+    success, message = asyncio.run(gateway.refund_payment("bad_id", 5))
+    assert not success
+
+    status = asyncio.run(gateway.verify_payment_status("txn_123456_1"))
+    assert status['status'] == "completed"
+
+
+def test_payments_run_concurrently():
+    gateway = fast_gateway(AsyncPaymentGateway, max_concurrency=100)
+
+    start = time.perf_counter()
+    results = asyncio.run(gateway.process_payments([{'patron_id': "123456", 'amount': 1.0}] * 100))
+    elapsed = time.perf_counter() - start
+
+    assert all(success for success, _, _ in results)
+    # sequentially this would take 100 * 0.05 = 5 seconds
+    assert elapsed < 1.0
+
+
+def test_concurrency_is_bounded():
+    gateway = fast_gateway(AsyncPaymentGateway, max_concurrency=2)
+
+    start = time.perf_counter()
+    asyncio.run(gateway.process_payments([{'patron_id': "123456", 'amount': 1.0}] * 6))
+    elapsed = time.perf_counter() - start
+
+    # 6 payments, 2 at a time, 0.05 seconds each
+    assert elapsed >= 0.15
+
+
+def test_slow_call_times_out():
+    gateway = fast_gateway(AsyncPaymentGateway, timeout=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(gateway.process_payment("123456", 1.0))
+
+    results = asyncio.run(gateway.process_payments([{'patron_id': "123456", 'amount': 1.0}]))
+    assert results[0][0] is False
+
+
+def test_sync_wrapper_works_with_service_functions(mocker):
+    mocker.patch("services.library_service.calculate_late_fee_for_book",
+                 return_value={'fee_amount': 1.5, 'days_overdue': 3, 'status': 'Overdue fee calculation successful'})
+    gateway = fast_gateway(SyncPaymentGateway)
+
+    success, message, transaction_id = pay_late_fees("123456", 1, gateway)
+    assert success
+    assert "processed successfully" in message
+
+    success, message = refund_late_fee_payment(transaction_id, 1.5, gateway)
+    assert success
+    assert "Refund of $1.50" in message
+
+
+def test_sync_wrapper_times_out_as_payment_error(mocker):
+    mocker.patch("services.library_service.calculate_late_fee_for_book",
+                 return_value={'fee_amount': 1.5, 'days_overdue': 3, 'status': 'Overdue fee calculation successful'})
+    gateway = fast_gateway(SyncPaymentGateway, timeout=0.01)
+
+    success, message, transaction_id = pay_late_fees("123456", 1, gateway)
+    assert not success
+    assert "Payment processing error" in message
+    assert transaction_id is None
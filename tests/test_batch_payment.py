@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import Mock
+
+from services.library_service import pay_all_late_fees, get_patron_late_fees, calculate_late_fee_for_book
+from services.payment_service import PaymentGateway
+from database import (
+    insert_borrow_record,
+    reset_database
+)
+
+from datetime import datetime, timedelta
+
+
+def setup_overdue_books(patron_id):
+    # great gatsby 3 days overdue, mockingbird 10 days overdue, 1984 not due yet
+    for book_id, days_overdue in ((1, 3), (2, 10), (3, -4)):
+        due_date = datetime.now() - timedelta(days=days_overdue)
+        assert insert_borrow_record(patron_id, book_id, due_date - timedelta(days=14), due_date)
+
+
+def test_all_fees_paid_in_one_charge():
+    reset_database()
+    setup_overdue_books("565656")
+
+    mock_payment_gateway = Mock(spec=PaymentGateway)
+    mock_payment_gateway.process_payment.return_value = (True, "txn_565656_1", "Payment of $8.00 processed successfully")
+
+    success, message, tr_id, breakdown = pay_all_late_fees("565656", mock_payment_gateway)
+
+    assert success
+    assert "processed successfully" in message.lower()
+    assert tr_id == "txn_565656_1"
+
+    assert [(fee['title'], fee['fee_amount']) for fee in breakdown] == [
+        ("To Kill a Mockingbird", 6.5), ("The Great Gatsby", 1.5)]  # in borrow order
+
+    mock_payment_gateway.process_payment.assert_called_once_with(
+        patron_id="565656", amount=8.0,
+        description="Late fees for 2 book(s): 'To Kill a Mockingbird' ($6.50), 'The Great Gatsby' ($1.50)")
+
+
+def test_breakdown_matches_per_book_fees():
+    reset_database()
+    setup_overdue_books("565656")
+
+    for fee in get_patron_late_fees("565656"):
+        assert fee['fee_amount'] == calculate_late_fee_for_book("565656", fee['book_id'])['fee_amount']
+
+
+def test_no_fees_does_not_call_gateway():
+    reset_database()
+
+    mock_payment_gateway = Mock(spec=PaymentGateway)
+
+    success, message, tr_id, breakdown = pay_all_late_fees("123456", mock_payment_gateway)
+
+    assert not success
+    assert "no late fees" in message.lower()
+    assert tr_id is None
+    assert breakdown == []
+    mock_payment_gateway.process_payment.assert_not_called()
+
+
+def test_invalid_patron_id_does_not_call_gateway():
+    mock_payment_gateway = Mock(spec=PaymentGateway)
+
+    success, message, tr_id, breakdown = pay_all_late_fees("bad_id", mock_payment_gateway)
+
+    assert not success
+    assert "Invalid patron ID" in message
+    mock_payment_gateway.process_payment.assert_not_called()
+
+
+def test_gateway_error():
+    reset_database()
+    setup_overdue_books("565656")
+
+    mock_payment_gateway = Mock(spec=PaymentGateway)
+    mock_payment_gateway.process_payment.side_effect = Exception("Network error")
+
+    success, message, tr_id, breakdown = pay_all_late_fees("565656", mock_payment_gateway)
+
+    assert not success
+    assert "Network error" in message
+    assert tr_id is None
+    assert len(breakdown) == 2
@@ -0,0 +1,65 @@
+import pytest
+
+import database
+from benchmarks.common import temporary_database
+from benchmarks.datasets import MAX_OPEN_LOANS, generate_dataset
+from benchmarks.suite import compare, load_baseline, run_suite, save_baseline
+
+
+def test_generated_dataset_is_consistent():
+    with temporary_database():
+        counts = generate_dataset(500, 2000)
+
+        assert counts['books'] == 500 and counts['loans'] == 2000
+        assert database.check_patron_counters() == []
+
+        with database.db_connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM books').fetchone()[0] == 500
+            assert conn.execute('''
+                SELECT COUNT(*) FROM borrow_records WHERE return_date IS NULL
+            ''').fetchone()[0] == counts['open_loans']
+            # available copies account for every open loan, and no book is over-lent
+            assert conn.execute('''
+                SELECT COUNT(*) FROM books b
+                WHERE available_copies < 0 OR available_copies != total_copies - (
+                    SELECT COUNT(*) FROM borrow_records r WHERE r.book_id = b.id AND r.return_date IS NULL)
+            ''').fetchone()[0] == 0
+            assert conn.execute('SELECT MAX(open_loans) FROM patrons').fetchone()[0] <= MAX_OPEN_LOANS
+
+
+def test_generated_dataset_is_repeatable():
+    with temporary_database():
+        generate_dataset(50, 100, seed=1)
+        first = [tuple(book.values()) for book in database.get_all_books()]
+    with temporary_database():
+        generate_dataset(50, 100, seed=1)
+        assert [tuple(book.values()) for book in database.get_all_books()] == first
+
+
+def test_run_suite_times_every_operation():
+    results = run_suite(200, 400, iterations=5)
+
+    assert set(results) == {
+        'borrow_book_by_patron', 'return_book_by_patron', 'search_books_in_catalog',
+        'get_patron_status_report', 'calculate_late_fee_for_book',
+    }
+    assert all(stats['p50_ms'] > 0 for stats in results.values())
+
+
+def test_compare_flags_only_slowdowns_past_threshold():
+    baseline = {'fast': {'p50_ms': 1.0}, 'slow': {'p50_ms': 1.0}, 'faster': {'p50_ms': 1.0}}
+    results = {'fast': {'p50_ms': 1.2}, 'slow': {'p50_ms': 1.3}, 'faster': {'p50_ms': 0.5},
+               'new': {'p50_ms': 9.0}}
+
+    assert compare(results, baseline, threshold=0.25) == ['slow']
+
+
+def test_baseline_keeps_other_scales(tmp_path):
+    path = str(tmp_path / "baseline.json")
+
+    save_baseline(path, '10k', {'op': {'p50_ms': 1.0}})
+    save_baseline(path, '100k', {'op': {'p50_ms': 2.0}})
+
+    baseline = load_baseline(path)
+    assert baseline['10k']['results']['op']['p50_ms'] == 1.0
+    assert baseline['100k']['results']['op']['p50_ms'] == 2.0
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from hypothesis import given, settings, HealthCheck, strategies as st
+
+from services.billing_service import assess_late_fees, late_fees_for_days_overdue
+from services.library_service import calculate_late_fee_for_book, late_fee_for_days_overdue
+from database import (
+    insert_borrow_record,
+    update_borrow_record_return_date,
+    reset_database
+)
+
+from datetime import datetime, timedelta
+
+
+@given(st.lists(st.integers(min_value=-1000, max_value=1000), min_size=1, max_size=50))
+def test_vectorized_fees_match_scalar(days):
+    fees = late_fees_for_days_overdue(np.array(days))
+
+    assert fees.tolist() == [late_fee_for_days_overdue(d) for d in days]
+
+
+def test_vectorized_fees_match_scalar_across_tiers():
+    days = np.arange(-5, 60)
+
+    assert late_fees_for_days_overdue(days).tolist() == [late_fee_for_days_overdue(d) for d in days.tolist()]
+
+
+# each loan: (patron number, book id, days overdue, returned)
+loans_strategy = st.lists(
+    st.tuples(st.integers(min_value=0, max_value=3),
+              st.integers(min_value=1, max_value=3),
+              st.integers(min_value=-20, max_value=40),
+              st.booleans()),
+    max_size=12)
+
+
+@settings(max_examples=25, deadline=None, suppress_health_check=[HealthCheck.function_scoped_fixture])
+@given(loans_strategy)
+def test_bulk_assessment_matches_scalar_calculation(loans):
+    reset_database()
+
+    for patron_number, book_id, days_overdue, returned in loans:
+        patron_id = f"{900000 + patron_number}"
+        due_date = datetime.now() - timedelta(days=days_overdue)
+        assert insert_borrow_record(patron_id, book_id, due_date - timedelta(days=14), due_date)
+        if returned:
+            assert update_borrow_record_return_date(patron_id, book_id, datetime.now())
+
+    expected = {}
+    for patron_id in {f"{900000 + patron_number}" for patron_number, _, _, _ in loans} | {"123456"}:
+        total = sum(calculate_late_fee_for_book(patron_id, book_id)['fee_amount'] for book_id in (1, 2, 3))
+        if total > 0:
+            expected[patron_id] = total
+
+    # small chunks so the totals are folded across several chunks
+    assert assess_late_fees(chunk_size=2) == expected
+
+
+def test_no_open_loans():
+    reset_database()
+
+    # the sample loan is not overdue yet
+    assert assess_late_fees() == {}
@@ -0,0 +1,137 @@
+import sqlite3
+import time
+
+import pytest
+
+import database
+from cache import LRUCache
+from services.library_service import (
+    add_book_to_catalog,
+    borrow_book_by_patron,
+    return_book_by_patron
+)
+from database import (
+    book_cache,
+    get_book_by_id,
+    get_book_by_isbn,
+    get_pool,
+    reset_database
+)
+from app import create_app
+
+
+def test_repeated_lookup_is_served_from_cache():
+    reset_database()
+
+    get_book_by_id(1)
+    get_book_by_isbn("9780743273565")
+    checkouts_before = get_pool().checkouts
+    hits_before = book_cache.stats()['hits']
+
+    book = get_book_by_id(1)
+    book_by_isbn = get_book_by_isbn(book['isbn'])
+
+    assert book_by_isbn == book
+    assert book_cache.stats()['hits'] - hits_before >= 2
+    assert get_pool().checkouts == checkouts_before
+
+
+def test_cached_book_cannot_be_modified_by_caller():
+    reset_database()
+
+    book = get_book_by_id(1)
+    book['title'] = "Changed"
+
+    assert get_book_by_id(1)['title'] == "The Great Gatsby"
+
+
+def test_borrow_and_return_invalidate_book():
+    reset_database()
+
+    assert get_book_by_id(1)['available_copies'] == 3
+
+    success, message = borrow_book_by_patron("676767", 1)
+    assert success
+    assert get_book_by_id(1)['available_copies'] == 2
+    assert get_book_by_isbn("9780743273565")['available_copies'] == 2
+
+    success, message = return_book_by_patron("676767", 1)
+    assert success
+    assert get_book_by_id(1)['available_copies'] == 3
+
+
+def test_insert_invalidates_cached_missing_isbn():
+    reset_database()
+
+    assert get_book_by_isbn("1231231231231") is None
+
+    success, message = add_book_to_catalog("Cached Book", "Cache Author", "1231231231231", 1)
+    assert success
+
+    book = get_book_by_isbn("1231231231231")
+    assert book['title'] == "Cached Book"
+    assert get_book_by_id(book['id'])['title'] == "Cached Book"
+
+
+def test_book_inserted_by_another_worker_is_found():
+    reset_database()
+    assert get_book_by_isbn("1231231231231") is None
+
+    # another gunicorn worker's write doesn't invalidate this process's cache
+    conn = sqlite3.connect(database.DATABASE)
+    try:
+        conn.execute('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES ('Other Worker', 'Other Author', '1231231231231', 1, 1)
+        ''')
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert get_book_by_isbn("1231231231231")['title'] == "Other Worker"
+    assert add_book_to_catalog("Cached Book", "Cache Author", "1231231231231", 1) == \
+        (False, "A book with this ISBN already exists.")
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_size=2, ttl=60)
+
+    cache.set('a', 1, cache.token())
+    cache.set('b', 2, cache.token())
+    cache.get('a')  # b is now least recently used
+    cache.set('c', 3, cache.token())
+
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire():
+    cache = LRUCache(max_size=2, ttl=0.01)
+
+    cache.set('a', 1, cache.token())
+    time.sleep(0.02)
+
+    assert cache.get('a') == (False, None)
+
+
+def test_read_racing_an_invalidation_is_not_cached():
+    cache = LRUCache(max_size=2, ttl=60)
+
+    token = cache.token()  # reader starts its database query
+    cache.delete('a')  # a writer changes the row meanwhile
+    cache.set('a', "stale", token)
+
+    assert cache.get('a') == (False, None)
+
+
+def test_cache_size_configured_from_app():
+    create_app()
+    assert book_cache.max_size == database.BOOK_CACHE_SIZE
+
+    create_app({'BOOK_CACHE_SIZE': 5, 'BOOK_CACHE_TTL': 1.0})
+    assert book_cache.max_size == 5
+    assert book_cache.ttl == 1.0
+
+    book_cache.configure(database.BOOK_CACHE_SIZE, database.BOOK_CACHE_TTL)
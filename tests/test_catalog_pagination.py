@@ -0,0 +1,110 @@
+import pytest
+
+from services.library_service import (
+    add_book_to_catalog,
+    get_catalog_page,
+    get_all_books
+)
+from database import reset_database
+
+from app import create_app
+
+app_instance = create_app()
+client = app_instance.test_client()
+
+
+def add_books(count):
+    for i in range(count):
+        success, message = add_book_to_catalog(f"Paged Book {i:03d}", "Paged Author", f"{4000000000000 + i}", 1)
+        assert success
+
+
+def test_pages_cover_catalog_in_order():
+    reset_database()
+    add_books(12)
+
+    titles = []
+    cursor = ""
+    pages = 0
+    while True:
+        page = get_catalog_page(cursor, 5)
+        titles += [book['title'] for book in page['books']]
+        pages += 1
+        if not page['next_cursor']:
+            break
+        cursor = page['next_cursor']
+
+    # 12 added books + 3 sample books in pages of 5
+    assert pages == 3
+    assert titles == [book['title'] for book in get_all_books()]
+
+
+def test_duplicate_titles_are_not_skipped():
+    reset_database()
+
+    # same title, so the id is what orders them
+    for i in range(4):
+        add_book_to_catalog("Same Title", "Author", f"{4100000000000 + i}", 1)
+
+    ids = []
+    cursor = ""
+    while True:
+        page = get_catalog_page(cursor, 2)
+        ids += [book['id'] for book in page['books'] if book['title'] == "Same Title"]
+        if not page['next_cursor']:
+            break
+        cursor = page['next_cursor']
+
+    assert len(ids) == 4
+    assert ids == sorted(ids)
+
+
+def test_page_size_is_clamped():
+    reset_database()
+
+    assert get_catalog_page("", 0)['page_size'] == 1
+    assert get_catalog_page("", 100000)['page_size'] == 200
+
+
+def test_invalid_cursor():
+    reset_database()
+
+    assert get_catalog_page("not a cursor", 5) is None
+
+    response = client.get("/api/books?after=not-a-cursor")
+    assert response.status_code == 400
+
+
+def test_books_api_follows_next_cursor():
+    reset_database()
+    add_books(3)
+
+    response = client.get("/api/books?page_size=4")
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert data['count'] == 4
+    assert data['next_cursor']
+
+    response = client.get(f"/api/books?page_size=4&after={data['next_cursor']}")
+    data = response.get_json()
+
+    assert data['count'] == 2
+    assert data['next_cursor'] is None
+
+
+def test_catalog_page_links_to_next_page():
+    reset_database()
+
+    response = client.get("/catalog?page_size=2")
+    decoded_response = response.data.decode('utf-8')
+
+    assert "Next Page" in decoded_response
+    assert "First Page" not in decoded_response
+
+    page = get_catalog_page("", 2)
+    response = client.get(f"/catalog?page_size=2&after={page['next_cursor']}")
+    decoded_response = response.data.decode('utf-8')
+
+    assert "Next Page" not in decoded_response
+    assert "First Page" in decoded_response
@@ -0,0 +1,82 @@
+import gzip
+import json
+
+import pytest
+
+from database import insert_book, reset_database
+from app import create_app
+
+app_instance = create_app()
+client = app_instance.test_client()
+
+
+def test_streamed_catalog_page_is_gzipped():
+    reset_database()
+
+    plain = client.get("/catalog")
+    compressed = client.get("/catalog", headers={"Accept-Encoding": "gzip"})
+
+    assert plain.is_streamed
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert gzip.decompress(compressed.data) == plain.data
+
+
+def test_large_json_is_gzipped():
+    reset_database()
+    for i in range(20):
+        assert insert_book(f"Search Book {i}", "Search Author", f"{1000000000000 + i}", 1, 1)
+
+    response = client.get("/api/search?q=search&type=title", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.data))["count"] == 20
+
+
+def test_small_response_is_not_compressed():
+    reset_database()
+
+    response = client.get("/api/late_fee/123456/3", headers={"Accept-Encoding": "gzip"})
+
+    assert len(response.data) < 500
+    assert "Content-Encoding" not in response.headers
+    assert json.loads(response.data)["status"]
+
+
+def test_content_type_outside_allowlist_is_not_compressed():
+    reset_database()
+    app = create_app({'COMPRESS_MIN_SIZE': 0, 'COMPRESS_MIMETYPES': {'text/html'}})
+
+    response = app.test_client().get("/api/books", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
+    assert json.loads(response.data)["count"] == 3
+
+
+def test_brotli_preferred_when_available():
+    brotli = pytest.importorskip("brotli")
+    reset_database()
+
+    response = client.get("/catalog", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["Content-Encoding"] == "br"
+    assert b"The Great Gatsby" in brotli.decompress(response.data)
+
+
+def test_streamed_page_shows_flash_message_once():
+    reset_database()
+
+    client.post("/borrow", data={"patron_id": "454545", "book_id": "abc"})
+
+    assert b"Invalid book ID." in client.get("/catalog").data
+    assert b"Invalid book ID." not in client.get("/catalog").data
+
+
+def test_patron_status_page_is_streamed():
+    reset_database()
+
+    response = client.get("/patron_status?patron_id=123456")
+
+    assert response.is_streamed
+    assert b"1984" in response.data
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+import database
+from database import ConnectionPool, db_connection, reset_database, get_book_by_isbn
+from app import create_app
+
+
+def test_nested_checkouts_share_one_connection():
+    pool = ConnectionPool(database.DATABASE, max_size=2)
+
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+
+    assert pool.connects == 1
+    assert pool.checkouts == 1
+
+
+def test_released_connection_is_reused():
+    pool = ConnectionPool(database.DATABASE, max_size=2)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    # the second checkout should be served from the idle list, not a new connect
+    assert second is first
+    assert pool.connects == 1
+    assert pool.checkouts == 2
+
+
+def test_pool_size_is_bounded():
+    pool = ConnectionPool(database.DATABASE, max_size=1, timeout=0.1)
+    pool.acquire()
+
+    errors = []
+
+    def other_thread():
+        try:
+            pool.acquire()
+        except TimeoutError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    thread.join()
+
+    # the only connection is held by this thread, so the other thread times out
+    assert len(errors) == 1
+
+    pool.release()
+
+
+def test_uncommitted_work_is_rolled_back_on_release():
+    reset_database()
+
+    with db_connection() as conn:
+        conn.execute("UPDATE books SET available_copies = 99 WHERE isbn = '9780743273565'")
+        # no commit
+
+    assert get_book_by_isbn("9780743273565")['available_copies'] == 3
+
+
+def test_request_reuses_one_connection():
+    app = create_app()
+    client = app.test_client()
+    reset_database()
+
+    book = get_book_by_isbn("9780743273565")  # great gatsby isbn
+
+    pool = database.get_pool()
+    checkouts_before = pool.checkouts
+
+    response = client.post("/borrow", data={'patron_id': '222222', 'book_id': book['id']})
+    assert response.status_code == 302
+
+    # the whole request ran on one checkout, not one per database helper
+    assert pool.checkouts - checkouts_before == 1
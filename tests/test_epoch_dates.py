@@ -0,0 +1,112 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import database
+from database import (
+    SCHEMA_VERSION,
+    clear_database,
+    db_connection,
+    get_data_versions,
+    get_patron_borrow_count,
+    get_patron_loans,
+    init_database,
+    insert_borrow_record,
+    iter_overdue_loans,
+    migrate_database,
+    reset_database,
+    to_timestamp,
+)
+from services.library_service import calculate_late_fee_for_book, get_patron_status_report
+
+
+@pytest.fixture
+def timezone(monkeypatch):
+    """Run a test in a given local timezone."""
+    def set_timezone(name):
+        monkeypatch.setenv('TZ', name)
+        time.tzset()
+    yield set_timezone
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_migration_converts_iso_dates(monkeypatch):
+    # build a version 5 database holding ISO text dates
+    monkeypatch.setattr(database, 'MIGRATIONS', database.MIGRATIONS[:5])
+    clear_database()
+    init_database()
+    with db_connection() as conn:
+        conn.execute('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES ('565656', 1, '2025-03-01T10:30:00.123456', '2025-03-15T10:30:00.123456',
+                    '2025-03-10T09:00:00')
+        ''')
+        conn.execute('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES ('565656', 2, '2025-03-02T08:00:00', '2025-03-16T08:00:00')
+        ''')
+        conn.commit()
+    monkeypatch.undo()
+
+    assert migrate_database() == SCHEMA_VERSION
+
+    with db_connection() as conn:
+        rows = conn.execute('''
+            SELECT id, borrow_date, due_date, return_date FROM borrow_records ORDER BY id
+        ''').fetchall()
+    assert [tuple(row) for row in rows] == [
+        (1, to_timestamp(datetime(2025, 3, 1, 10, 30)), to_timestamp(datetime(2025, 3, 15, 10, 30)),
+         to_timestamp(datetime(2025, 3, 10, 9, 0))),
+        (2, to_timestamp(datetime(2025, 3, 2, 8, 0)), to_timestamp(datetime(2025, 3, 16, 8, 0)), None),
+    ]
+
+    # the rebuilt table kept its counter and version triggers and its AUTOINCREMENT sequence
+    assert get_patron_borrow_count('565656') == 1
+    version = get_data_versions('loans')['loans'][0]
+    assert insert_borrow_record('565656', 3, datetime.now(), datetime.now() + timedelta(days=14))
+    assert get_patron_borrow_count('565656') == 2
+    assert get_data_versions('loans')['loans'][0] > version
+    with db_connection() as conn:
+        assert conn.execute('SELECT MAX(id) FROM borrow_records').fetchone()[0] == 3
+
+
+def test_overdue_loans_use_due_index():
+    reset_database()
+
+    with db_connection() as conn:
+        plan = [row['detail'] for row in conn.execute('''
+            EXPLAIN QUERY PLAN SELECT patron_id, book_id FROM borrow_records
+            WHERE return_date IS NULL AND due_date < ?
+        ''', (to_timestamp(datetime.now()),))]
+
+    assert any('idx_borrow_records_due' in detail for detail in plan), plan
+
+
+def test_overdue_loans_charge_earliest_open_loan():
+    reset_database()
+    now = datetime.now()
+    assert insert_borrow_record('565656', 1, now - timedelta(days=24), now - timedelta(days=10))
+    assert insert_borrow_record('565656', 1, now - timedelta(days=2), now + timedelta(days=12))
+    assert insert_borrow_record('565656', 2, now - timedelta(days=2), now + timedelta(days=12))
+
+    rows = [(row['patron_id'], row['book_id'], row['days_overdue']) for rows in iter_overdue_loans() for row in rows]
+
+    assert rows == [('565656', 1, 10)]
+
+
+def test_dates_follow_local_calendar(timezone):
+    timezone('America/New_York')
+    reset_database()
+    # due late yesterday evening, local time: one day overdue today, whatever the UTC date
+    due_date = datetime.combine(date.today() - timedelta(days=1), datetime.min.time()) + timedelta(hours=23, minutes=30)
+    assert insert_borrow_record('565656', 1, due_date - timedelta(days=14), due_date)
+
+    [loan] = get_patron_loans('565656')
+    assert loan['due_date'] == (date.today() - timedelta(days=1)).isoformat()
+    assert loan['days_overdue'] == 1
+
+    report = get_patron_status_report('565656')
+    assert report['outstanding_books'][0]['is_overdue']
+    assert report['late_fee'] == calculate_late_fee_for_book('565656', 1)['fee_amount'] == 0.5
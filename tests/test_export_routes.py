@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+
+import pytest
+
+from database import (
+    insert_borrow_record,
+    iter_borrow_records,
+    reset_database
+)
+from app import create_app
+
+from datetime import datetime
+
+app_instance = create_app()
+client = app_instance.test_client()
+
+
+def setup_history():
+    # sample data already has patron 123456 borrowing 1984 five days ago
+    assert insert_borrow_record("343434", 1, datetime(2025, 1, 10), datetime(2025, 1, 24))
+    assert insert_borrow_record("343434", 2, datetime(2025, 2, 10), datetime(2025, 2, 24))
+    assert insert_borrow_record("565656", 1, datetime(2025, 2, 15), datetime(2025, 3, 1))
+
+
+def test_csv_export_of_all_records():
+    reset_database()
+    setup_history()
+
+    response = client.get("/api/export/borrow_records?format=csv")
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+
+    rows = list(csv.DictReader(io.StringIO(response.data.decode('utf-8'))))
+    assert len(rows) == 4
+    assert rows[1]['patron_id'] == "343434"
+    assert rows[1]['borrow_date'].startswith("2025-01-10")
+    assert rows[1]['return_date'] == ""
+
+
+def test_ndjson_export_with_filters():
+    reset_database()
+    setup_history()
+
+    response = client.get("/api/export/borrow_records?format=ndjson&patron_id=343434&from=2025-02-01&to=2025-03-01")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    rows = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+    assert [(row['patron_id'], row['book_id']) for row in rows] == [("343434", 2)]
+
+
+def test_export_is_read_in_chunks():
+    reset_database()
+    setup_history()
+
+    chunks = list(iter_borrow_records(chunk_size=3))
+
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+
+
+def test_books_export():
+    reset_database()
+
+    response = client.get("/api/export/books?format=ndjson")
+    rows = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+
+    assert [row['isbn'] for row in rows] == ["9780743273565", "9780061120084", "9780451524935"]
+
+
+def test_invalid_export_parameters():
+    assert client.get("/api/export/borrow_records?format=xml").status_code == 400
+    assert client.get("/api/export/borrow_records?from=yesterday").status_code == 400
+    assert client.get("/api/export/books?format=xml").status_code == 400
@@ -0,0 +1,243 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import database
+from app import create_app
+from database import (
+    SCHEMA_VERSION,
+    db_connection,
+    get_fee_ledger,
+    get_patron_fee_balance,
+    insert_fee_refund,
+    migrate_database,
+    patron_has_open_loan,
+    reset_database,
+)
+from services.billing_service import post_late_fee_accruals
+from services.library_service import (
+    pay_all_late_fees,
+    pay_late_fees,
+    record_late_fee_payment,
+    refund_late_fee_payment,
+    return_book_by_patron,
+)
+
+
+def paid(transaction_id):
+    return True, transaction_id, "Payment processed successfully"
+
+
+def ledger(patron_id):
+    return [(entry['book_id'], entry['kind'], entry['amount'], entry['transaction_id'])
+            for entry in get_fee_ledger(patron_id)]
+
+
+def test_accruals_post_only_what_has_grown(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 3)
+    borrow_overdue("565656", 2, 10)
+
+    assert post_late_fee_accruals() == 2
+    assert post_late_fee_accruals() == 0  # already up to date
+    assert get_patron_fee_balance("565656") == 1.5 + 6.5
+
+    # a day later each fee has grown by a day's rate
+    assert post_late_fee_accruals(datetime.now() + timedelta(days=1)) == 2
+    assert get_patron_fee_balance("565656") == 2.0 + 7.5
+
+
+def test_return_posts_final_fee(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 3)
+    post_late_fee_accruals()
+
+    success, _ = return_book_by_patron("565656", 1)
+
+    assert success
+    assert ledger("565656") == [(1, 'accrual', 1.5, None)]
+
+
+def test_return_fails_when_fee_cannot_be_posted(borrow_overdue, mocker):
+    reset_database()
+    borrow_overdue("565656", 1, 3)
+    mocker.patch("services.library_service.post_fee_accruals",
+                 side_effect=sqlite3.OperationalError("database is locked"))
+
+    assert return_book_by_patron("565656", 1) == (False, "Failed to record late fee")
+
+    # the book is still out
+    assert patron_has_open_loan("565656", 1)
+
+
+def test_payment_and_refund_are_recorded(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+
+    success, _, transaction_id = pay_late_fees("565656", 1, payment_gateway(paid("txn_565656_1")))
+    assert success
+    assert get_patron_fee_balance("565656") == 0.0
+
+    assert refund_late_fee_payment("txn_565656_1", 2.5, payment_gateway())[0]
+    assert get_patron_fee_balance("565656") == 2.5
+
+    # what was refunded is owed again, and only that is charged
+    mock_payment_gateway = payment_gateway(paid("txn_565656_2"))
+    assert pay_late_fees("565656", 1, mock_payment_gateway)[0]
+    assert mock_payment_gateway.process_payment.call_args.kwargs['amount'] == 2.5
+    assert get_patron_fee_balance("565656") == 0.0
+
+    assert ledger("565656") == [
+        (1, 'accrual', 6.5, None),
+        (1, 'payment', -6.5, "txn_565656_1"),
+        (1, 'refund', 2.5, "txn_565656_1"),
+        (1, 'payment', -2.5, "txn_565656_2"),
+    ]
+
+
+def test_paid_fee_is_not_charged_again(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    borrow_overdue("565656", 2, 3)
+    assert pay_late_fees("565656", 1, payment_gateway(paid("txn_565656_1")))[0]
+
+    mock_payment_gateway = payment_gateway()
+    success, message, _ = pay_late_fees("565656", 1, mock_payment_gateway)
+    assert not success
+    assert message == "No late fees to pay for this book."
+    mock_payment_gateway.process_payment.assert_not_called()
+
+    # paying everything only charges the book not paid for yet
+    success, _, _, breakdown = pay_all_late_fees("565656", payment_gateway(paid("txn_565656_2")))
+    assert success
+    assert [(fee['book_id'], fee['fee_amount']) for fee in breakdown] == [(2, 1.5)]
+    assert not pay_all_late_fees("565656", mock_payment_gateway)[0]
+    assert get_patron_fee_balance("565656") == 0.0
+
+
+def test_overpayment_leaves_credit(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+
+    # the fee accrues to what the loan owes (6.50), not to what was charged
+    assert record_late_fee_payment("565656", [(1, 9.0)], "txn_565656_1")
+    assert ledger("565656") == [(1, 'accrual', 6.5, None), (1, 'payment', -9.0, "txn_565656_1")]
+    assert get_patron_fee_balance("565656") == -2.5
+
+
+def test_refund_is_limited_to_payment(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    assert pay_late_fees("565656", 1, payment_gateway(paid("txn_565656_1")))[0]
+    mock_payment_gateway = payment_gateway()
+
+    assert not refund_late_fee_payment("txn_565656_1", 7.0, mock_payment_gateway)[0]
+    mock_payment_gateway.refund_payment.assert_not_called()
+
+    assert refund_late_fee_payment("txn_565656_1", 6.0, mock_payment_gateway)[0]
+    assert not refund_late_fee_payment("txn_565656_1", 1.0, mock_payment_gateway)[0]
+
+    # the ledger refuses them too
+    assert not insert_fee_refund("txn_000000_1", 1.0)
+    assert not insert_fee_refund("txn_565656_1", 1.0)
+    assert insert_fee_refund("txn_565656_1", 0.5)
+    assert [kind for _, kind, _, _ in ledger("565656")] == ['accrual', 'payment', 'refund', 'refund']
+
+
+def test_refund_of_payment_made_before_ledger(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    mock_payment_gateway = payment_gateway()
+
+    # the ledger has no payment to cap it by, so the gateway decides, and nothing is recorded
+    assert refund_late_fee_payment("txn_000000_1", 10.0, mock_payment_gateway)[0]
+    mock_payment_gateway.refund_payment.assert_called_once_with("txn_000000_1", 10.0)
+    assert not refund_late_fee_payment("txn_000000_1", 16.0, mock_payment_gateway)[0]
+    assert get_fee_ledger("565656") == []
+
+
+def test_failed_payment_is_not_recorded(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+
+    assert not pay_late_fees("565656", 1, payment_gateway((False, "", "Payment declined")))[0]
+
+    assert ledger("565656") == []
+
+
+def test_batch_payment_records_each_book(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 3)
+    borrow_overdue("565656", 2, 10)
+
+    assert pay_all_late_fees("565656", payment_gateway(paid("txn_565656_1")))[0]
+    assert refund_late_fee_payment("txn_565656_1", 8.0, payment_gateway())[0]
+
+    entries = ledger("565656")
+    assert sorted(entries[:2]) == [(1, 'accrual', 1.5, None), (2, 'accrual', 6.5, None)]
+    assert sorted(entries[2:4]) == [(1, 'payment', -1.5, "txn_565656_1"), (2, 'payment', -6.5, "txn_565656_1")]
+    # the refund covers both books, so it is recorded against the patron only
+    assert entries[4:] == [(None, 'refund', 8.0, "txn_565656_1")]
+    assert get_patron_fee_balance("565656") == 8.0
+
+
+def test_migration_links_earlier_payments_to_loans(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    assert pay_late_fees("565656", 1, payment_gateway(paid("txn_565656_1")))[0]
+    assert refund_late_fee_payment("txn_565656_1", 2.5, payment_gateway())[0]
+    with db_connection() as conn:
+        borrow_ids = [row[0] for row in conn.execute("SELECT borrow_id FROM fee_ledger ORDER BY id")]
+        # as recorded before schema version 10
+        conn.execute("UPDATE fee_ledger SET borrow_id = NULL WHERE kind != 'accrual'")
+        conn.execute("PRAGMA user_version = 9")
+
+    assert migrate_database() == SCHEMA_VERSION
+
+    with db_connection() as conn:
+        assert [row[0] for row in conn.execute("SELECT borrow_id FROM fee_ledger ORDER BY id")] == borrow_ids
+    assert pay_late_fees("565656", 1, payment_gateway(paid("txn_565656_2")))[2] == "txn_565656_2"
+    assert get_patron_fee_balance("565656") == 0.0
+
+
+def test_balance_is_index_only_sum():
+    reset_database()
+
+    with db_connection() as conn:
+        plan = [row['detail'] for row in conn.execute('''
+            EXPLAIN QUERY PLAN SELECT IFNULL(SUM(amount), 0.0) FROM fee_ledger WHERE patron_id = ?
+        ''', ("565656",))]
+
+    assert plan == ['SEARCH fee_ledger USING COVERING INDEX idx_fee_ledger_patron (patron_id=?)']
+
+
+def test_fee_account_api(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 3)
+    post_late_fee_accruals()
+    client = create_app().test_client()
+
+    response = client.get('/api/fees/565656')
+
+    assert response.status_code == 200
+    assert response.get_json()['balance'] == 1.5
+    assert [entry['kind'] for entry in response.get_json()['entries']] == ['accrual']
+    assert client.get('/api/fees/56565').status_code == 400
+
+
+def test_accruals_survive_concurrent_commit(borrow_overdue, mocker):
+    reset_database()
+    borrow_overdue("565656", 1, 3)
+    borrow_overdue("565656", 2, 10)
+    post_fee_accruals = database.post_fee_accruals
+
+    def commit_elsewhere_then_post(accruals, as_of):
+        # another worker commits while the sweep is between chunks
+        with sqlite3.connect(database.DATABASE) as other:
+            other.execute("UPDATE books SET available_copies = available_copies WHERE id = 1")
+        other.close()
+        return post_fee_accruals(accruals, as_of)
+
+    mocker.patch("services.billing_service.post_fee_accruals", side_effect=commit_elsewhere_then_post)
+
+    assert post_late_fee_accruals(chunk_size=1) == 2
+    assert get_patron_fee_balance("565656") == 1.5 + 6.5
@@ -0,0 +1,130 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from database import (
+    day_start,
+    db_connection,
+    get_next_loan_fee_change,
+    get_open_loan_fee,
+    get_patron_fee_balance,
+    insert_borrow_record,
+    reset_database,
+    update_borrow_record_return_date,
+)
+from services.fee_sweeper import FeeSweeper, sweep
+from services.library_service import calculate_late_fee_for_book, late_fee_for_days_overdue, late_fee_tier
+
+
+def loan_fee_row(patron_id, book_id):
+    with db_connection() as conn:
+        return conn.execute('''
+            SELECT lf.* FROM loan_fees lf JOIN borrow_records br ON br.id = lf.borrow_id
+            WHERE br.patron_id = ? AND br.book_id = ?
+        ''', (patron_id, book_id)).fetchone()
+
+
+@pytest.mark.parametrize('days_overdue, tier', [
+    (-3, (0, 0.0, 0.0, 1)),
+    (0, (0, 0.0, 0.0, 1)),
+    (1, (1, 0.0, 0.5, 8)),
+    (7, (1, 0.0, 0.5, 8)),
+    (8, (8, 3.5, 1.0, 19)),
+    (18, (8, 3.5, 1.0, 19)),
+    (19, (19, 15.0, 0.0, None)),
+    (100, (19, 15.0, 0.0, None)),
+])
+def test_late_fee_tier(days_overdue, tier):
+    assert late_fee_tier(days_overdue) == tier
+
+
+def test_new_loan_owes_nothing_until_day_one():
+    reset_database()
+    due_date = datetime.now() + timedelta(days=14)
+    assert insert_borrow_record("565656", 1, datetime.now(), due_date)
+
+    row = loan_fee_row("565656", 1)
+    assert (row['tier_start'], row['fee_base'], row['fee_rate']) == (0, 0.0, 0.0)
+    assert row['next_change'] == day_start(due_date.date() + timedelta(days=1))
+    assert get_open_loan_fee("565656", 1)['fee_current']
+
+
+def test_sweep_stores_current_tier(borrow_overdue):
+    reset_database()
+    for book_id, days_overdue in enumerate([3, 10, 25], start=1):
+        borrow_overdue("565656", book_id, days_overdue)
+
+    # before the sweep the stored tiers are out of date, so fees are computed from the due date
+    assert not get_open_loan_fee("565656", 2)['fee_current']
+    assert calculate_late_fee_for_book("565656", 2)['fee_amount'] == late_fee_for_days_overdue(10)
+
+    assert sweep() == 3
+    assert sweep() == 0  # nothing else changes tier until the next boundary
+
+    for book_id, days_overdue in enumerate([3, 10, 25], start=1):
+        assert get_open_loan_fee("565656", book_id)['fee_current']
+        result = calculate_late_fee_for_book("565656", book_id)
+        assert result['days_overdue'] == days_overdue
+        assert result['fee_amount'] == late_fee_for_days_overdue(days_overdue)
+
+    due_day = date.today() - timedelta(days=3)
+    assert loan_fee_row("565656", 1)['next_change'] == day_start(due_day + timedelta(days=8))
+    assert loan_fee_row("565656", 3)['next_change'] is None
+    assert get_next_loan_fee_change() == day_start(due_day + timedelta(days=8))
+
+
+def test_sweep_as_of_later_day_crosses_boundaries(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 6)
+    sweep()
+
+    # two days later the loan is 8 days overdue, in the $1.00/day tier
+    assert sweep(datetime.now() + timedelta(days=2)) == 1
+    row = loan_fee_row("565656", 1)
+    assert (row['tier_start'], row['fee_base'], row['fee_rate']) == (8, 3.5, 1.0)
+
+
+def test_returned_loan_has_no_fee_state(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 5)
+
+    assert update_borrow_record_return_date("565656", 1, datetime.now())
+
+    assert loan_fee_row("565656", 1) is None
+    assert calculate_late_fee_for_book("565656", 1)['days_overdue'] == -1
+
+
+def test_sweeper_thread_sweeps_on_start(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+
+    sweeper = FeeSweeper()
+    sweeper.start()
+    try:
+        for _ in range(100):
+            if get_open_loan_fee("565656", 1)['fee_current']:
+                break
+            time.sleep(0.02)
+    finally:
+        sweeper.stop(timeout=5)
+
+    assert get_open_loan_fee("565656", 1)['fee_current']
+
+
+def test_run_once_posts_accruals_and_sleeps_until_next_day(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 3)
+    sweeper = FeeSweeper(max_interval=10 ** 9)
+
+    wait = sweeper.run_once()
+
+    # the next tier change is 5 days away, but tomorrow's accruals come first
+    next_day = day_start(date.today() + timedelta(days=1))
+    assert abs(wait - (next_day - datetime.now().timestamp())) < 5
+    assert get_patron_fee_balance("565656") == 1.5
+
+    # accruals are posted once a day
+    borrow_overdue("565656", 2, 3)
+    sweeper.run_once()
+    assert get_patron_fee_balance("565656") == 1.5
@@ -0,0 +1,96 @@
+import pytest
+
+from database import (
+    insert_book,
+    reset_database
+)
+from services.library_service import borrow_book_by_patron
+import routes.fragment_cache
+from routes.fragment_cache import fragment_cache
+from app import create_app
+
+app_instance = create_app()
+client = app_instance.test_client()
+
+
+def test_cached_catalog_page_matches_fresh_render():
+    reset_database()
+    fragment_cache.clear()
+
+    fresh = client.get("/catalog").data
+    cached = client.get("/catalog").data
+
+    assert fresh == cached
+    assert b"The Great Gatsby" in cached
+    assert b'placeholder="Patron ID (6 digits)"' in cached
+
+
+def test_catalog_page_is_served_from_cache():
+    reset_database()
+    fragment_cache.clear()
+
+    client.get("/catalog")
+    hits = fragment_cache.stats()['hits']
+    client.get("/catalog")
+
+    assert fragment_cache.stats()['hits'] == hits + 1
+
+
+def test_only_changed_rows_are_rerendered(mocker):
+    reset_database()
+    fragment_cache.clear()
+    client.get("/catalog")
+
+    success, message = borrow_book_by_patron("454545", 2)
+    assert success
+
+    # the catalog version moved, so the page is rebuilt, but only the borrowed book's row renders
+    rendered = []
+    get_template_attribute = routes.fragment_cache.get_template_attribute
+
+    def counting_macro(template, name):
+        macro = get_template_attribute(template, name)
+
+        def render(book, **kwargs):
+            rendered.append(book['id'])
+            return macro(book, **kwargs)
+        return render
+
+    mocker.patch("routes.fragment_cache.get_template_attribute", counting_macro)
+    response = client.get("/catalog")
+
+    assert rendered == [2]
+    assert b"1/2 Available" in response.data
+
+
+def test_new_book_appears_on_cached_page():
+    reset_database()
+    fragment_cache.clear()
+    client.get("/catalog")
+
+    assert insert_book("New Book", "New Author", "1212121212121", 1, 1)
+
+    assert b"New Book" in client.get("/catalog").data
+
+
+def test_unavailable_book_row_has_no_borrow_form():
+    reset_database()
+    fragment_cache.clear()
+
+    response = client.get("/search?q=1984&type=title")
+
+    assert b"Not Available" in response.data
+    assert b'name="book_id" value="3"' not in response.data
+    assert b'placeholder="Patron ID"' not in response.data
+
+
+def test_search_results_are_cached_per_term():
+    reset_database()
+    fragment_cache.clear()
+
+    gatsby = client.get("/search?q=gatsby&type=title").data
+    orwell = client.get("/search?q=orwell&type=author").data
+
+    assert b"The Great Gatsby" in gatsby and b"1984" not in gatsby
+    assert b"1984" in orwell and b"The Great Gatsby" not in orwell
+    assert client.get("/search?q=gatsby&type=title").data == gatsby
@@ -0,0 +1,95 @@
+import pytest
+
+from database import (
+    get_data_versions,
+    insert_book,
+    reset_database
+)
+from services.library_service import borrow_book_by_patron
+from app import create_app
+
+app_instance = create_app()
+client = app_instance.test_client()
+
+
+@pytest.mark.parametrize("url", [
+    "/catalog",
+    "/search?q=gatsby&type=title",
+    "/api/search?q=gatsby&type=title",
+    "/api/books",
+    "/api/late_fee/123456/3",
+])
+def test_unchanged_resource_returns_304(url):
+    reset_database()
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+
+    again = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_new_book_changes_catalog_etag():
+    reset_database()
+    etag = client.get("/api/books").headers["ETag"]
+
+    assert insert_book("New Book", "New Author", "1212121212121", 1, 1)
+
+    response = client.get("/api/books", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "New Book" in [book["title"] for book in response.get_json()["books"]]
+
+
+def test_borrowing_changes_catalog_and_loans_versions():
+    reset_database()
+    before = get_data_versions("catalog", "loans")
+
+    success, message = borrow_book_by_patron("454545", 1)
+    assert success
+
+    after = get_data_versions("catalog", "loans")
+    assert after["catalog"][0] > before["catalog"][0]
+    assert after["loans"][0] > before["loans"][0]
+
+
+def test_late_fee_etag_ignores_catalog_changes():
+    reset_database()
+    etag = client.get("/api/late_fee/123456/3").headers["ETag"]
+
+    assert insert_book("New Book", "New Author", "1212121212121", 1, 1)
+
+    assert client.get("/api/late_fee/123456/3", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_if_modified_since_returns_304():
+    reset_database()
+    first = client.get("/api/search?q=gatsby&type=title")
+
+    response = client.get("/api/search?q=gatsby&type=title",
+                          headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert response.status_code == 304
+
+
+def test_error_responses_are_not_cached():
+    reset_database()
+
+    response = client.get("/api/search?q=")
+    assert response.status_code == 400
+    assert "ETag" not in response.headers
+
+
+def test_page_with_pending_flash_is_not_served_from_cache():
+    reset_database()
+    etag = client.get("/catalog").headers["ETag"]
+
+    # the redirect back to the catalog carries a flash message, which must be shown
+    client.post("/borrow", data={"patron_id": "454545", "book_id": "abc"})
+    response = client.get("/catalog", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert b"Invalid book ID." in response.data
@@ -0,0 +1,77 @@
+import io
+import json
+
+import pytest
+
+from services.import_service import import_books
+from database import get_book_by_isbn, get_all_books, reset_database
+
+
+CSV_FEED = """title,author,isbn,total_copies
+Dune,Frank Herbert,9780441172719,4
+Emma,Jane Austen,9780141439587,2
+,No Title,9780000000001,1
+Bad ISBN,Someone,12345,1
+Zero Copies,Someone,9780000000002,0
+Not A Number,Someone,9780000000003,many
+Dune Again,Frank Herbert,9780441172719,1
+Gatsby Again,F. Scott Fitzgerald,9780743273565,1
+"""
+
+
+def test_csv_import_inserts_valid_rows_and_reports_rejects():
+    reset_database()
+
+    report = import_books(io.StringIO(CSV_FEED), 'csv', chunk_size=3)
+
+    assert report['rows'] == 8
+    assert report['inserted'] == 2
+    assert report['rows_per_sec'] > 0
+
+    reasons = {reject['row']: reject['reason'] for reject in report['rejects']}
+    assert reasons == {
+        3: "Title is required.",
+        4: "ISBN must be exactly 13 digits.",
+        5: "Total copies must be a positive integer.",
+        6: "Total copies must be a positive integer.",
+        7: "Duplicate ISBN in feed.",
+        8: "A book with this ISBN already exists.",
+    }
+
+    dune = get_book_by_isbn("9780441172719")
+    assert dune['title'] == "Dune"
+    assert dune['total_copies'] == 4
+    assert dune['available_copies'] == 4
+    assert len(get_all_books()) == 5
+
+
+def test_jsonl_import():
+    reset_database()
+
+    lines = [
+        json.dumps({'title': "Dune", 'author': "Frank Herbert", 'isbn': "9780441172719", 'total_copies': 4}),
+        "",
+        "not json",
+        json.dumps({'title': "Emma", 'author': "Jane Austen", 'isbn': "9780141439587", 'total_copies': "2"}),
+    ]
+
+    report = import_books(io.StringIO("\n".join(lines)), 'jsonl')
+
+    assert report['inserted'] == 2
+    assert [reject['row'] for reject in report['rejects']] == [2]
+    assert get_book_by_isbn("9780141439587")['total_copies'] == 2
+
+
+def test_import_invalidates_cached_missing_isbn():
+    reset_database()
+
+    assert get_book_by_isbn("9780441172719") is None  # cached as missing
+
+    import_books(io.StringIO(CSV_FEED), 'csv')
+
+    assert get_book_by_isbn("9780441172719")['title'] == "Dune"
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        import_books(io.StringIO(""), 'xml')
@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+import database
+import instrumentation
+from database import reset_database
+from app import create_app
+
+
+@pytest.fixture
+def client():
+    reset_database()
+    app = create_app({'INSTRUMENTATION': True})
+    instrumentation.metrics.reset()
+    yield app.test_client()
+    # back to a plain app, so other tests run with instrumentation off
+    create_app()
+
+
+def test_response_has_server_timing_header(client):
+    response = client.post("/borrow", data={"patron_id": "454545", "book_id": "1"})
+
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("app;dur=")
+    assert "sql;dur=" in timing
+    # BEGIN/COMMIT are charged to the service function that opened the transaction
+    assert 'desc="services.library_service.borrow_book_by_patron"' in timing
+
+
+def test_metrics_endpoint_reports_requests_and_queries(client):
+    client.get("/catalog")
+    client.get("/api/search?q=gatsby&type=title")
+
+    response = client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.data.decode()
+    assert 'library_requests_total{endpoint="catalog.catalog"} 1' in text
+    assert 'library_requests_total{endpoint="api.search_books_api"} 1' in text
+    assert 'library_sql_statements_total{helper="database.get_books_page"} 1' in text
+    assert 'library_sql_max_duration_seconds{helper="database._search_books"}' in text
+    assert 'library_sql_slowest_query_seconds{rank="1",' in text
+
+
+def test_request_counts_statements(client):
+    stats = instrumentation.RequestStats()
+    instrumentation._local.request = stats
+    try:
+        database.get_all_books()
+        database.get_patron_borrow_count("123456")
+    finally:
+        instrumentation._local.request = None
+
+    assert stats.statements == 2
+    assert stats.slowest[1] in ("database.get_all_books", "database.get_patron_borrow_count")
+
+
+def test_connections_opened_are_counted(client):
+    database.get_pool().close_all()
+    database.configure_pool()
+
+    client.get("/api/books")
+
+    assert instrumentation.metrics.connections == 1
+
+
+def test_disabled_by_default():
+    reset_database()
+    app = create_app()
+
+    response = app.test_client().get("/catalog")
+
+    assert "Server-Timing" not in response.headers
+    assert app.test_client().get("/api/metrics").status_code == 404
+    with database.db_connection() as conn:
+        assert type(conn) is sqlite3.Connection
+
+
+def test_prometheus_labels_are_escaped():
+    metrics = instrumentation.Metrics()
+    metrics.record_statement("helper", 'SELECT "quoted" \\ text', 0.5)
+
+    assert 'query="SELECT \\"quoted\\" \\\\ text"' in metrics.render_prometheus()
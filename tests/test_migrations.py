@@ -0,0 +1,100 @@
+import pytest
+
+from database import (
+    SCHEMA_VERSION,
+    db_connection,
+    get_books_by_author,
+    get_books_by_isbn,
+    get_books_by_title,
+    get_open_payments,
+    get_borrow_records_by_patron,
+    get_patron_borrow_count,
+    get_patron_borrowed_book,
+    get_patron_borrowed_books,
+    get_patron_loans,
+    get_schema_version,
+    init_database,
+    migrate_database,
+    reset_database
+)
+
+
+def helper_query_plans(helper, *args):
+    """
+    Run a database helper and return the EXPLAIN QUERY PLAN detail lines of each query it ran,
+    captured with a trace callback so the plans follow the helper's SQL as it changes.
+    """
+    statements = []
+    with db_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            helper(*args)
+        finally:
+            conn.set_trace_callback(None)
+        # statements run inside SQLite (FTS5 shadow tables) are traced as "-- " comments
+        queries = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+        assert queries, f"{helper.__name__} ran no queries"
+        return [[row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)] for sql in queries]
+
+
+def assert_no_full_scan(helper, *args):
+    for plan in helper_query_plans(helper, *args):
+        scans = [detail for detail in plan if detail.startswith('SCAN') and 'VIRTUAL TABLE' not in detail]
+        assert not scans, f"{helper.__name__} query plan has full table scans: {plan}"
+
+
+def test_fresh_database_is_at_latest_version():
+    reset_database()
+
+    assert get_schema_version() == SCHEMA_VERSION
+
+
+def test_migrations_are_idempotent():
+    reset_database()
+
+    # running the migrations again is a no-op
+    assert migrate_database() == SCHEMA_VERSION
+    init_database()
+    assert get_schema_version() == SCHEMA_VERSION
+
+
+def test_patron_borrow_count_uses_index():
+    reset_database()
+
+    assert_no_full_scan(get_patron_borrow_count, "123456")
+
+
+def test_patron_borrowed_book_uses_index():
+    reset_database()
+
+    assert_no_full_scan(get_patron_borrowed_book, "123456", 3)
+
+
+def test_patron_borrowed_books_uses_index():
+    reset_database()
+
+    assert_no_full_scan(get_patron_borrowed_books, "123456")
+
+
+def test_borrow_history_uses_index():
+    reset_database()
+
+    for helper in (get_borrow_records_by_patron, get_patron_loans):
+        assert_no_full_scan(helper, "123456")
+        # the history index already returns rows in borrow_date order
+        for plan in helper_query_plans(helper, "123456"):
+            assert not [detail for detail in plan if 'TEMP B-TREE' in detail]
+
+
+def test_book_lookup_by_author_and_title_uses_index():
+    reset_database()
+
+    assert_no_full_scan(get_books_by_author, "George Orwell")
+    assert_no_full_scan(get_books_by_title, "1984")
+    assert_no_full_scan(get_books_by_isbn, "9780451524935")
+
+
+def test_open_payments_use_index():
+    reset_database()
+
+    assert_no_full_scan(get_open_payments, "123456")
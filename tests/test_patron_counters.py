@@ -0,0 +1,88 @@
+import pytest
+
+from services.library_service import (
+    borrow_book_by_patron,
+    return_book_by_patron
+)
+from database import (
+    check_patron_counters,
+    db_connection,
+    get_patron_borrow_count,
+    insert_borrow_record,
+    patron_has_open_loan,
+    rebuild_patron_counters,
+    reset_database
+)
+
+from datetime import datetime, timedelta
+
+
+def test_counters_follow_borrow_and_return():
+    reset_database()
+
+    assert get_patron_borrow_count("123456") == 1  # sample data: 1984
+    assert patron_has_open_loan("123456", 3)
+    assert not patron_has_open_loan("123456", 1)
+
+    success, message = borrow_book_by_patron("123456", 1)
+    assert success
+    assert get_patron_borrow_count("123456") == 2
+    assert patron_has_open_loan("123456", 1)
+
+    success, message = return_book_by_patron("123456", 1)
+    assert success
+    assert get_patron_borrow_count("123456") == 1
+    assert not patron_has_open_loan("123456", 1)
+
+    assert check_patron_counters() == []
+
+
+def test_counters_are_primary_key_lookups():
+    reset_database()
+
+    with db_connection() as conn:
+        plan = conn.execute('''
+            EXPLAIN QUERY PLAN SELECT open_loans FROM patrons WHERE patron_id = ?
+        ''', ("123456",)).fetchall()
+
+    assert [row['detail'] for row in plan] == ['SEARCH patrons USING PRIMARY KEY (patron_id=?)']
+
+
+def test_rolled_back_borrow_does_not_change_counters():
+    reset_database()
+
+    with db_connection() as conn:
+        conn.execute('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES ('787878', 1, '2025-01-01', '2025-01-15')
+        ''')
+        conn.rollback()
+
+    assert get_patron_borrow_count("787878") == 0
+    assert check_patron_counters() == []
+
+
+def test_checker_finds_and_rebuild_repairs_drift():
+    reset_database()
+
+    due_date = datetime.now() + timedelta(days=14)
+    assert insert_borrow_record("787878", 1, datetime.now(), due_date)
+    assert insert_borrow_record("787878", 2, datetime.now(), due_date)
+
+    # simulate drift, e.g. a manual edit with the triggers missing
+    with db_connection() as conn:
+        conn.execute("UPDATE patrons SET open_loans = 7 WHERE patron_id = '787878'")
+        conn.execute("DELETE FROM patron_open_books WHERE patron_id = '787878' AND book_id = 2")
+        conn.commit()
+
+    assert check_patron_counters() == [
+        {'patron_id': "787878", 'book_id': None, 'counter': 7, 'actual': 2},
+        {'patron_id': "787878", 'book_id': 2, 'counter': 0, 'actual': 1},
+    ]
+
+    repaired = rebuild_patron_counters()
+
+    assert len(repaired) == 2
+    assert check_patron_counters() == []
+    assert get_patron_borrow_count("787878") == 2
+    assert patron_has_open_loan("787878", 2)
@@ -0,0 +1,60 @@
+import pytest
+from services.library_service import (
+    calculate_late_fee_for_book,
+    get_patron_status_report
+)
+from database import (
+    get_borrow_records_by_patron,
+    get_patron_borrowed_books,
+    get_pool,
+    insert_borrow_record,
+    update_borrow_record_return_date,
+    reset_database
+)
+
+from datetime import datetime, timedelta
+
+
+def setup_long_history(patron_id):
+    # returned loans of book 1, then open loans of books 1-3 at different stages of lateness
+    for days_ago in (90, 60, 30):
+        borrow_date = datetime.now() - timedelta(days=days_ago)
+        assert insert_borrow_record(patron_id, 1, borrow_date, borrow_date + timedelta(days=14))
+        assert update_borrow_record_return_date(patron_id, 1, borrow_date + timedelta(days=10))
+
+    for book_id, days_overdue in ((1, 3), (2, 10), (3, 40)):
+        due_date = datetime.now() - timedelta(days=days_overdue)
+        assert insert_borrow_record(patron_id, book_id, due_date - timedelta(days=14), due_date)
+
+
+def test_report_matches_per_book_queries():
+    reset_database()
+    patron_id = "818181"
+    setup_long_history(patron_id)
+
+    result = get_patron_status_report(patron_id)
+
+    # same content as the per-book helpers the report used to be built from
+    assert result['outstanding_books'] == get_patron_borrowed_books(patron_id)
+    assert result['records'] == get_borrow_records_by_patron(patron_id)
+    assert result['num_outstanding'] == 3
+
+    late_fee = 0.0
+    for outstanding_book in result['outstanding_books']:
+        late_fee += calculate_late_fee_for_book(patron_id, outstanding_book['book_id'])['fee_amount']
+
+    assert result['late_fee'] == late_fee
+    assert result['late_fee'] == 1.5 + 6.5 + 15.0
+
+
+def test_report_uses_one_database_checkout():
+    reset_database()
+    patron_id = "818181"
+    setup_long_history(patron_id)
+
+    pool = get_pool()
+    checkouts_before = pool.checkouts
+
+    get_patron_status_report(patron_id)
+
+    assert pool.checkouts - checkouts_before == 1
@@ -0,0 +1,213 @@
+import time
+
+from app import create_app
+from database import claim_payment, get_fee_ledger, get_payment, reset_database
+from services.library_service import request_late_fee_payment
+from services.payment_outbox import PaymentWorkerPool, backoff_delay
+from services.payment_service import SyncPaymentGateway
+
+
+def queue_payment(patron_id, book_id=None):
+    success, _, payment = request_late_fee_payment(patron_id, book_id)
+    assert success
+    return payment
+
+
+def test_same_payment_is_queued_once(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+
+    first = queue_payment("565656", 1)
+    second = queue_payment("565656", 1)
+
+    assert first['id'] == second['id']
+    assert request_late_fee_payment("565656", 1)[1] == "Payment of $6.50 queued."
+    assert (first['status'], first['amount'], first['book_fees']) == ('pending', 6.5, [(1, 6.5)])
+    assert not request_late_fee_payment("565656", 2)[0]  # no fee owed on that book
+
+
+def test_successful_payment_is_recorded_in_ledger(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 3)
+    borrow_overdue("565656", 2, 10)
+    payment = queue_payment("565656")
+    mock_payment_gateway = payment_gateway((True, "txn_565656_1", "Payment processed successfully"))
+
+    assert PaymentWorkerPool(gateway=mock_payment_gateway).drain() == 1
+
+    mock_payment_gateway.process_payment.assert_called_once_with(
+        patron_id="565656", amount=8.0, description=payment['description'],
+        idempotency_key=payment['idempotency_key'])
+    payment = get_payment(payment['id'])
+    assert (payment['status'], payment['transaction_id'], payment['attempts']) == ('succeeded', "txn_565656_1", 1)
+    assert sorted((entry['book_id'], entry['kind'], entry['amount']) for entry in get_fee_ledger("565656")) == [
+        (1, 'accrual', 1.5), (1, 'payment', -1.5), (2, 'accrual', 6.5), (2, 'payment', -6.5)]
+
+
+def test_declined_payment_is_not_retried(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    payment = queue_payment("565656", 1)
+
+    assert PaymentWorkerPool(gateway=payment_gateway((False, "", "Payment declined"))).drain() == 1
+
+    payment = get_payment(payment['id'])
+    assert (payment['status'], payment['last_error']) == ('failed', "Payment failed: Payment declined")
+    assert get_fee_ledger("565656") == []
+
+
+def test_declined_payment_can_be_requested_again(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    declined = queue_payment("565656", 1)
+    PaymentWorkerPool(gateway=payment_gateway((False, "", "Payment declined"))).drain()
+
+    success, message, retry = request_late_fee_payment("565656", 1)
+
+    # a new entry, with a key the gateway hasn't answered yet
+    assert (success, message) == (True, "Payment of $6.50 queued.")
+    assert retry['id'] != declined['id']
+    assert (retry['status'], retry['idempotency_key']) == ('pending', declined['idempotency_key'] + "#2")
+    assert get_payment(declined['id'])['status'] == 'failed'
+
+    mock_payment_gateway = payment_gateway((True, "txn_565656_1", "Payment processed successfully"))
+    PaymentWorkerPool(gateway=mock_payment_gateway).drain()
+    assert mock_payment_gateway.process_payment.call_args.kwargs['idempotency_key'] == retry['idempotency_key']
+    assert get_payment(retry['id'])['status'] == 'succeeded'
+
+    # nothing is owed any more
+    assert request_late_fee_payment("565656", 1) == (False, "No late fees to pay for this book.", None)
+
+
+def test_queued_fees_are_not_charged_twice(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 3)
+    borrow_overdue("565656", 2, 10)
+    first = queue_payment("565656", 1)
+
+    # paying all of them leaves out the book already queued
+    rest = queue_payment("565656")
+    assert (rest['amount'], rest['book_fees']) == (6.5, [(2, 6.5)])
+    assert request_late_fee_payment("565656") == (False, "These late fees are already queued for payment.", None)
+    assert [queue_payment("565656", book_id)['id'] for book_id in (1, 2)] == [first['id'], rest['id']]
+
+    mock_payment_gateway = payment_gateway((True, "txn_565656_1", "Payment processed successfully"),
+                                           (True, "txn_565656_2", "Payment processed successfully"))
+    assert PaymentWorkerPool(gateway=mock_payment_gateway).drain() == 2
+    assert [call.kwargs['amount'] for call in mock_payment_gateway.process_payment.call_args_list] == [1.5, 6.5]
+    assert request_late_fee_payment("565656") == (False, "No late fees to pay.", None)
+
+
+def test_errors_are_retried_with_backoff(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    payment = queue_payment("565656", 1)
+    pool = PaymentWorkerPool(gateway=payment_gateway(TimeoutError("timed out"), TimeoutError("timed out")),
+                             max_attempts=2)
+
+    before = time.time()
+    assert pool.drain() == 1
+    payment = get_payment(payment['id'])
+    assert payment['status'] == 'pending'
+    assert payment['last_error'] == "Payment processing error: timed out"
+    assert payment['next_attempt_at'] >= before + backoff_delay(1)
+    assert request_late_fee_payment("565656", 1)[1] == \
+        "Payment of $6.50 queued, retrying after: Payment processing error: timed out"
+    assert pool.drain() == 0  # not due again yet
+
+    # the second attempt is the last one
+    pool.process(claim_payment(pool.lease, now=payment['next_attempt_at']))
+    assert get_payment(payment['id'])['status'] == 'failed'
+
+
+def test_charge_not_recorded_is_retried_then_failed(borrow_overdue, payment_gateway, mocker, caplog):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    payment = queue_payment("565656", 1)
+    charged = (True, "txn_565656_1", "Payment processed successfully")
+    pool = PaymentWorkerPool(gateway=payment_gateway(charged, charged), max_attempts=2)
+    mocker.patch("services.payment_outbox.record_late_fee_payment", return_value=False)
+
+    assert pool.drain() == 1
+
+    payment = get_payment(payment['id'])
+    assert (payment['status'], payment['transaction_id']) == ('pending', "txn_565656_1")
+    assert payment['last_error'] == "Payment txn_565656_1 not recorded: could not record it in the fee ledger"
+    assert "was charged (txn_565656_1) but not recorded" in caplog.text
+
+    # the second attempt is the last one
+    pool.process(claim_payment(pool.lease, now=payment['next_attempt_at']))
+    payment = get_payment(payment['id'])
+    assert (payment['status'], payment['transaction_id']) == ('failed', "txn_565656_1")
+    assert get_fee_ledger("565656") == []
+
+    # it was charged, so it isn't queued (and charged) again
+    success, message, failed = request_late_fee_payment("565656", 1)
+    assert (success, failed['id']) == (False, payment['id'])
+    assert message.startswith("Payment of $6.50 was charged (txn_565656_1) but not recorded")
+
+
+def test_backoff_doubles_up_to_maximum():
+    assert [backoff_delay(attempts, 2.0, 10.0) for attempts in range(1, 5)] == [2.0, 4.0, 8.0, 10.0]
+
+
+def test_claimed_payment_is_retried_after_lease_expires(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    payment = queue_payment("565656", 1)
+    now = time.time()
+
+    assert claim_payment(60, now)['id'] == payment['id']
+    assert claim_payment(60, now + 30) is None  # another worker holds it
+
+    reclaimed = claim_payment(60, now + 61)
+    assert (reclaimed['id'], reclaimed['attempts']) == (payment['id'], 2)
+
+
+def test_gateway_charges_idempotency_key_once():
+    payment_gateway = SyncPaymentGateway()
+
+    first = payment_gateway.process_payment("565656", 6.5, "Late fees", idempotency_key="late-fees:test-key")
+    second = payment_gateway.process_payment("565656", 6.5, "Late fees", idempotency_key="late-fees:test-key")
+
+    assert first[0] and first == second
+
+
+def test_worker_thread_processes_queued_payment(borrow_overdue, payment_gateway):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    pool = PaymentWorkerPool(workers=2, gateway=payment_gateway((True, "txn_565656_1", "Payment processed successfully")))
+    pool.start()
+    try:
+        payment = queue_payment("565656", 1)
+        pool.notify()
+        for _ in range(250):
+            if get_payment(payment['id'])['status'] != 'pending':
+                break
+            time.sleep(0.02)
+    finally:
+        pool.stop(timeout=5)
+
+    assert get_payment(payment['id'])['status'] == 'succeeded'
+
+
+def test_payments_api(borrow_overdue):
+    reset_database()
+    borrow_overdue("565656", 1, 10)
+    client = create_app().test_client()
+
+    response = client.post('/api/payments', json={'patron_id': "565656", 'book_id': 1})
+
+    assert response.status_code == 202
+    payment = response.get_json()['payment']
+    assert response.headers['Location'].endswith(f"/api/payments/{payment['id']}")
+    status = client.get(f"/api/payments/{payment['id']}")
+    assert status.status_code == 200
+    assert (status.get_json()['status'], status.get_json()['amount']) == ('pending', 6.5)
+
+    assert client.post('/api/payments', json={'patron_id': "56565"}).status_code == 400
+    assert client.post('/api/payments', json={'patron_id': "565656", 'book_id': "x"}).status_code == 400
+    assert client.get('/api/payments/999').status_code == 404
+    assert client.post('/api/payments', json=[1]).status_code == 400
+    assert client.post('/api/payments', json="565656").status_code == 400
+    assert client.post('/api/payments', data={'patron_id': "565656", 'book_id': "1"}).status_code == 202
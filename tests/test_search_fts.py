@@ -0,0 +1,95 @@
+import pytest
+
+from services.library_service import (
+    add_book_to_catalog,
+    search_books_in_catalog
+)
+from database import (
+    db_connection,
+    reset_database
+)
+
+
+def fts_available():
+    with db_connection() as conn:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'").fetchone() is not None
+
+
+def test_new_book_is_searchable():
+    reset_database()
+
+    success, message = add_book_to_catalog("Brave New World", "Aldous Huxley", "9780060850524", 2)
+    assert success
+
+    result = search_books_in_catalog("new wor", "title")
+    assert [book['title'] for book in result] == ["Brave New World"]
+
+    result = search_books_in_catalog("huxley", "author")
+    assert [book['title'] for book in result] == ["Brave New World"]
+
+
+def test_updated_book_is_reindexed():
+    reset_database()
+
+    with db_connection() as conn:
+        conn.execute("UPDATE books SET title = 'Nineteen Eighty-Four' WHERE isbn = '9780451524935'")
+        conn.commit()
+
+    assert search_books_in_catalog("1984", "title") == []
+    assert len(search_books_in_catalog("eighty", "title")) == 1
+
+
+def test_title_search_does_not_match_author():
+    reset_database()
+
+    # "Lee" is only in an author name
+    assert search_books_in_catalog("Lee", "title") == []
+    assert len(search_books_in_catalog("Lee", "author")) == 1
+
+
+def test_best_match_is_ranked_first():
+    reset_database()
+
+    add_book_to_catalog("Orwell: A Life", "Bernard Crick", "9780140058567", 1)
+    add_book_to_catalog("Orwell and Orwell's Orwell", "Some Critic", "9780140058568", 1)
+
+    result = search_books_in_catalog("orwell", "title")
+
+    assert len(result) == 2
+    assert result[0]['title'] == "Orwell and Orwell's Orwell"
+
+
+def test_search_falls_back_without_fts_index():
+    reset_database()
+
+    with db_connection() as conn:
+        conn.execute("DROP TABLE IF EXISTS books_fts")
+        conn.execute("DROP TRIGGER IF EXISTS books_fts_insert")
+        conn.execute("DROP TRIGGER IF EXISTS books_fts_delete")
+        conn.execute("DROP TRIGGER IF EXISTS books_fts_update")
+        conn.commit()
+
+    result = search_books_in_catalog("Great", "title")
+    assert [book['title'] for book in result] == ["The Great Gatsby"]
+
+    reset_database()
+
+
+def test_search_uses_fts_index():
+    reset_database()
+
+    if not fts_available():
+        pytest.skip("SQLite build has no FTS5")
+
+    with db_connection() as conn:
+        plan = conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT b.* FROM books_fts f
+            JOIN books b ON b.id = f.rowid
+            WHERE books_fts MATCH ?
+            ORDER BY bm25(books_fts)
+        ''', ('title : "gatsby"',)).fetchall()
+
+    details = [row['detail'] for row in plan]
+    assert any('VIRTUAL TABLE' in detail for detail in details)
+    assert not any(detail == 'SCAN b' for detail in details)
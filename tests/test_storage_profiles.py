@@ -0,0 +1,34 @@
+import pytest
+
+from database import db_connection, configure_pool, STORAGE_PROFILES
+from app import create_app
+
+
+def pragma(name):
+    with db_connection() as conn:
+        return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+def test_app_uses_wal_profile_by_default():
+    create_app()
+
+    assert pragma('journal_mode') == 'wal'
+    assert pragma('synchronous') == 1  # NORMAL
+    assert pragma('busy_timeout') == STORAGE_PROFILES['wal']['busy_timeout']
+    assert pragma('cache_size') == STORAGE_PROFILES['wal']['cache_size']
+
+
+def test_profile_selected_from_app_config():
+    create_app({'DB_STORAGE_PROFILE': 'default'})
+
+    assert pragma('journal_mode') == 'delete'
+    assert pragma('synchronous') == 2  # FULL
+
+    create_app({'DB_STORAGE_PROFILE': 'wal'})
+
+    assert pragma('journal_mode') == 'wal'
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        configure_pool(storage_profile='turbo')
@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from services.library_service import (
+    add_book_to_catalog,
+    borrow_book_by_patron,
+    return_book_by_patron,
+)
+from database import (
+    get_book_by_isbn,
+    get_patron_borrow_count,
+    insert_borrow_record,
+    transaction,
+    reset_database
+)
+
+from datetime import datetime, timedelta
+
+
+def run_concurrently(target, args_list):
+    """
+    Start one thread per args tuple, release them together, and wait for all to finish.
+
+    An exception (e.g. a failed assert) in any thread is raised again here, so it fails the test.
+    """
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+    errors = []
+
+    def worker(index, args):
+        barrier.wait()
+        try:
+            results[index] = target(*args)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i, args)) for i, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+def test_failed_step_rolls_back_whole_unit_of_work():
+    reset_database()
+
+    with pytest.raises(RuntimeError):
+        with transaction():
+            insert_borrow_record("333333", 1, datetime.now(), datetime.now() + timedelta(days=14))
+            raise RuntimeError("abort")
+
+    # the borrow record inserted before the failure must not have been committed
+    assert get_patron_borrow_count("333333") == 0
+
+
+def test_concurrent_borrowers_never_oversell():
+    reset_database()
+
+    success, message = add_book_to_catalog("Stress Book", "Stress Author", "5555555555555", 3)
+    assert success
+    book_id = get_book_by_isbn("5555555555555")['id']
+
+    # 20 different patrons race for 3 copies
+    results = run_concurrently(borrow_book_by_patron, [(f"{700000 + i}", book_id) for i in range(20)])
+
+    successes = [message for success, message in results if success]
+    failures = [message for success, message in results if not success]
+
+    assert len(successes) == 3
+    assert all("not available" in message.lower() for message in failures)
+    assert get_book_by_isbn("5555555555555")['available_copies'] == 0
+
+
+def test_concurrent_borrows_and_returns_keep_availability_consistent():
+    reset_database()
+
+    success, message = add_book_to_catalog("Stress Book", "Stress Author", "5555555555555", 2)
+    assert success
+    book_id = get_book_by_isbn("5555555555555")['id']
+
+    patrons = [f"{710000 + i}" for i in range(10)]
+
+    def borrow_and_return(patron_id):
+        for _ in range(5):
+            borrowed, _ = borrow_book_by_patron(patron_id, book_id)
+            available = get_book_by_isbn("5555555555555")['available_copies']
+            assert 0 <= available <= 2
+            if borrowed:
+                returned, _ = return_book_by_patron(patron_id, book_id)
+                assert returned
+
+    run_concurrently(borrow_and_return, [(patron_id,) for patron_id in patrons])
+
+    # every borrow was matched by a return, so both copies are back on the shelf
+    assert get_book_by_isbn("5555555555555")['available_copies'] == 2
+    for patron_id in patrons:
+        assert get_patron_borrow_count(patron_id) == 0
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import database
+from app import create_app, warm_up
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_concurrent_worker_startup_initializes_database_once(tmp_path):
+    """Several workers importing wsgi.py at once must migrate and seed the database exactly once."""
+    db_path = str(tmp_path / "workers.db")
+    env = dict(os.environ, LIBRARY_DATABASE=db_path, LIBRARY_SEED_SAMPLE_DATA="1")
+
+    workers = [
+        subprocess.Popen([sys.executable, "-c", "import wsgi"], cwd=PROJECT_ROOT, env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        for _ in range(6)
+    ]
+    for worker in workers:
+        _, stderr = worker.communicate(timeout=60)
+        assert worker.returncode == 0, stderr.decode()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 3
+        assert conn.execute("SELECT COUNT(*) FROM borrow_records").fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def wsgi_background_threads(tmp_path, **env):
+    """Import wsgi.py in a fresh interpreter and return the background services it started."""
+    base_env = {name: value for name, value in os.environ.items()
+                if name not in ("LIBRARY_FEE_SWEEPER", "LIBRARY_PAYMENT_WORKERS")}
+    env = dict(base_env, LIBRARY_DATABASE=str(tmp_path / "wsgi.db"), **env)
+    worker = subprocess.run(
+        [sys.executable, "-c",
+         "import wsgi; print(' '.join(sorted(set(wsgi.app.extensions) & {'fee_sweeper', 'payment_workers'})))"],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, timeout=60)
+    assert worker.returncode == 0, worker.stderr.decode()
+    return worker.stdout.decode().split()
+
+
+def test_wsgi_background_threads_follow_environment(tmp_path):
+    assert wsgi_background_threads(tmp_path) == ['fee_sweeper', 'payment_workers']
+    assert wsgi_background_threads(tmp_path, LIBRARY_FEE_SWEEPER="0", LIBRARY_PAYMENT_WORKERS="0") == []
+
+
+def test_startup_does_not_seed_without_dev_flag(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "fresh.db"))
+    monkeypatch.delenv("LIBRARY_SEED_SAMPLE_DATA", raising=False)
+
+    create_app()
+
+    assert database.get_schema_version() == database.SCHEMA_VERSION
+    assert database.get_all_books() == []
+
+    create_app({'SEED_SAMPLE_DATA': True})
+    assert len(database.get_all_books()) == 3
+
+
+def test_startup_on_current_schema_skips_migrations(tmp_path, monkeypatch, mocker):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "current.db"))
+    database.init_database()
+
+    migrate = mocker.patch("database.migrate_database")
+    create_app()
+
+    migrate.assert_not_called()
+
+
+def test_warm_up_compiles_templates():
+    app = create_app()
+
+    warm_up(app)
+
+    assert "catalog.html" in {name for _, name in app.jinja_env.cache.keys()}
@@ -0,0 +1,20 @@
+"""
+WSGI entry point for production servers.
+
+Serve with gunicorn using the settings in gunicorn.conf.py:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Sample data is only added when LIBRARY_SEED_SAMPLE_DATA=1 is set.
+"""
+
+import os
+
+from app import create_app
+
+# Templates compile and the first database connection opens in the background, off the boot
+# path; each worker also keeps the late fee tiers of open loans current (unless
+# LIBRARY_FEE_SWEEPER=0) and charges queued payments (PAYMENT_WORKERS threads, from
+# LIBRARY_PAYMENT_WORKERS, default 4)
+app = create_app({'WARM_UP': True, 'FEE_SWEEPER': os.environ.get('LIBRARY_FEE_SWEEPER', '1') == '1',
+                  'PAYMENT_WORKERS': int(os.environ.get('LIBRARY_PAYMENT_WORKERS', '4'))})